@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from generate_data import SIZES, write_dataset
+
+# ================================
+# ⏱️ BENCHMARK DE RERUNS POR VISTA
+# ================================
+# Ejecuta la aplicación sin navegador con AppTest de Streamlit sobre datos
+# sintéticos (generate_data.py) y mide, para cada vista y cada interacción de
+# filtro, el tiempo del primer render, la mediana de los reruns y el pico de
+# memoria. El pico se mide en un proceso nuevo por escenario y tamaño
+# (tracemalloc arranca antes de la primera carga de datos, con las cachés
+# vacías), para no falsear los tiempos ni medir cachés ya calientes.
+# Cada resultado se añade a RESULTS_FILE (una línea JSON por medida) y se
+# compara con la medida anterior del mismo escenario y tamaño.
+#   python benchmark.py --sizes 1k 100k --reruns 5
+RESULTS_FILE = "bench_results.jsonl"
+APP_FILE = "ppa_tracker.py"
+TIMEOUT = 600
+REGRESSION_PCT = 20
+
+# (nombre, vista, interacciones); cada interacción es (tipo de widget, key o etiqueta, valor)
+SCENARIOS = [
+    ("clientes", "👥 Clientes / Contrapartes", []),
+    ("clientes_busqueda", "👥 Clientes / Contrapartes",
+     [("text_input", "Filtrar por nombre o CIF/NIF de cliente:", "energias")]),
+    ("añadir_lead", "➕ Añadir Lead", []),
+    ("añadir_oferta", "➕ Añadir Oferta", []),
+    ("editar_lead", "✏️ Editar Lead", []),
+    ("editar_oferta", "✏️ Editar Oferta", []),
+    ("ver_leads", "📁 Ver Leads", []),
+    ("ver_leads_estado", "📁 Ver Leads", [("selectbox", "filtro_estado_leads", "En curso")]),
+    ("ver_leads_busqueda", "📁 Ver Leads", [("text_input", "filtro_cliente_leads", "solar")]),
+    ("ver_ofertas", "💼 Ver Ofertas", []),
+    ("ver_ofertas_estado", "💼 Ver Ofertas", [("selectbox", "filtro_estado_offer", "Aprobada")]),
+    ("dashboard", "📈 Dashboard", []),
+    ("dashboard_estado", "📈 Dashboard", [("selectbox", "Estado Lead", "Negociación")]),
+    ("dashboard_montecarlo", "📈 Dashboard", [("checkbox", "mc_calcular", True)]),
+    ("importar", "📥 Importar", []),
+]
+
+
+def _widget(at, kind, ident):
+    for widget in getattr(at, kind):
+        if widget.key == ident or widget.label == ident:
+            return widget
+    raise LookupError(f"No se encuentra el widget {kind} {ident!r}")
+
+
+def _session(app_path, vista):
+    from streamlit import logger
+    from streamlit.testing.v1 import AppTest
+
+    logger.set_log_level("error")  # avisos de "missing ScriptRunContext" al preparar la sesión
+    at = AppTest.from_file(app_path, default_timeout=TIMEOUT)
+    at.session_state["logged_in"] = True
+    at.session_state["vista"] = vista
+    return at
+
+
+def _check(at, nombre):
+    if at.exception:
+        raise RuntimeError(f"{nombre}: {at.exception[0].message}")
+
+
+def _timed(run):
+    inicio = time.perf_counter()
+    run()
+    return (time.perf_counter() - inicio) * 1000
+
+
+def _interact(at, acciones):
+    for kind, ident, valor in acciones:
+        _widget(at, kind, ident).set_value(valor)
+    at.run()
+
+
+def measure(app_path, nombre, vista, acciones, reruns):
+    # Primer render de una sesión nueva (las cachés del proceso ya pueden estar
+    # calientes, como en un servidor con más usuarios) y reruns sin cambios
+    at = _session(app_path, vista)
+    if acciones:
+        at.run()
+        _check(at, nombre)
+        primero = _timed(lambda: _interact(at, acciones))
+    else:
+        primero = _timed(at.run)
+    _check(at, nombre)
+    tiempos = [_timed(at.run) for _ in range(reruns)]
+    return {"primer_render_ms": round(primero, 1), "rerun_ms": round(statistics.median(tiempos), 1),
+            "pico_mb": round(measure_peak(app_path, nombre) / 2 ** 20, 1)}
+
+
+def _peak(app_path, nombre, vista, acciones):
+    # Pico de memoria de una sesión en frío: carga de los datos, render e interacciones
+    tracemalloc.start()
+    at = _session(app_path, vista)
+    at.run()
+    _check(at, nombre)
+    if acciones:
+        _interact(at, acciones)
+        _check(at, nombre)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return pico
+
+
+def measure_peak(app_path, nombre):
+    # _peak en un subproceso con la copia de la aplicación: las cachés del proceso empiezan vacías
+    work = os.path.dirname(app_path)
+    proc = subprocess.run([sys.executable, os.path.join(work, "benchmark.py"), "--pico", nombre],
+                          cwd=work, capture_output=True, text=True, timeout=TIMEOUT)
+    if proc.returncode:
+        error = proc.stderr.strip().splitlines()
+        raise RuntimeError(f"{nombre}: {error[-1] if error else f'código {proc.returncode}'}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])["pico"]
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(path):
+    # Última medida guardada de cada (escenario, filas)
+    previas = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    previas[(rec["escenario"], rec["filas"])] = rec
+    return previas
+
+
+def _delta(actual, anterior):
+    if not anterior:
+        return ""
+    pct = (actual - anterior) / anterior * 100
+    marca = "  ⚠️ REGRESIÓN" if pct > REGRESSION_PCT else ""
+    return f" ({pct:+.0f}%){marca}"
+
+
+def run_benchmark(sizes, reruns, results_file, scenarios=SCENARIOS, seed=0):
+    src = os.path.dirname(os.path.abspath(__file__))
+    results_file = os.path.abspath(results_file)
+    previas = previous_results(results_file)
+    base = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": _commit(),
+            "python": platform.python_version(), "backend": os.environ.get("PPA_STORAGE", "csv")}
+    resultados = []
+    cwd = os.getcwd()
+    for filas in sizes:
+        # La aplicación usa rutas relativas: se copia a un directorio con los datos generados
+        work = tempfile.mkdtemp(prefix=f"ppa_bench_{filas}_")
+        try:
+            for f in os.listdir(src):
+                if f.endswith(".py"):
+                    shutil.copy(os.path.join(src, f), work)
+            write_dataset(work, filas, seed)
+            os.chdir(work)
+            sys.path.insert(0, work)
+            app_path = os.path.join(work, APP_FILE)
+            # Carga en frío: primera sesión del proceso con las cachés vacías
+            carga = _timed(lambda: _session(app_path, SCENARIOS[0][1]).run())
+            print(f"\n== {filas:,} leads (carga inicial {carga:,.0f} ms)")
+            for nombre, vista, acciones in scenarios:
+                medida = measure(app_path, nombre, vista, acciones, reruns)
+                rec = dict(base, escenario=nombre, filas=filas, carga_inicial_ms=round(carga, 1), **medida)
+                resultados.append(rec)
+                previa = previas.get((nombre, filas), {})
+                print(f"{nombre:22} primer render {medida['primer_render_ms']:9,.1f} ms"
+                      f"{_delta(medida['primer_render_ms'], previa.get('primer_render_ms'))}"
+                      f" | rerun {medida['rerun_ms']:9,.1f} ms{_delta(medida['rerun_ms'], previa.get('rerun_ms'))}"
+                      f" | pico {medida['pico_mb']:7,.1f} MB{_delta(medida['pico_mb'], previa.get('pico_mb'))}")
+        finally:
+            os.chdir(cwd)
+            sys.path.remove(work)
+            # Los módulos de la app se reimportan con el siguiente tamaño (cachés vacías)
+            for mod in [m for m, v in sys.modules.items() if os.path.dirname(getattr(v, "__file__", "") or "") == work]:
+                del sys.modules[mod]
+            shutil.rmtree(work, ignore_errors=True)
+
+    with open(results_file, "a", encoding="utf-8") as f:
+        for rec in resultados:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return resultados
+
+
+def _rows(value):
+    return SIZES[value] if value in SIZES else int(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de tiempos de rerun y memoria por vista.")
+    parser.add_argument("--sizes", nargs="+", type=_rows, default=[SIZES["1k"], SIZES["100k"]],
+                        help="tamaños en leads (1k, 100k, 1M o un número)")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="escenarios a medir (por defecto todos)")
+    parser.add_argument("--results", default=RESULTS_FILE, help="fichero JSONL de resultados")
+    parser.add_argument("--pico", help=argparse.SUPPRESS)  # uso interno: medida de memoria en frío
+    args = parser.parse_args()
+    if args.pico:
+        nombre, vista, acciones = next(s for s in SCENARIOS if s[0] == args.pico)
+        print(json.dumps({"pico": _peak(os.path.abspath(APP_FILE), nombre, vista, acciones)}))
+        sys.exit(0)
+    escenarios = [s for s in SCENARIOS if not args.only or s[0] in args.only]
+    run_benchmark(args.sizes, args.reruns, args.results, escenarios)
@@ -0,0 +1,155 @@
+import pandas as pd
+
+from schema import columns, validate_frame
+from storage import insert_rows, load_data, next_id
+
+# ================================
+# 📥 IMPORTACIÓN MASIVA (CSV / Excel)
+# ================================
+# El fichero se lee por bloques de CHUNK_ROWS filas y cada bloque se valida de
+# forma vectorizada (tipos, enumerados y rangos del esquema, IDs repetidos e
+# integridad referencial). Las filas válidas se escriben de una vez con
+# insert_rows y las erróneas se devuelven en un informe por fila. Al confirmar
+# se vuelve a comprobar la integridad referencial: entre la validación y la
+# importación pueden haberse borrado registros de la tabla referenciada o
+# dado de alta los mismos IDs.
+CHUNK_ROWS = 5000
+KEYS = {"clients": "ID Cliente", "leads": "ID Lead", "offers": "ID Oferta"}
+REFERENCES = {"leads": ("ID Cliente", "clients"), "offers": ("ID Lead", "leads")}
+REQUIRED = {"clients": ["Nombre"], "offers": ["ID Lead"]}
+# Primer ID cuando la tabla está vacía (el mismo que usan las altas de la app)
+ID_START = {"offers": 101}
+ERROR_COLS = ["Fila", "Columna", "Valor", "Error"]
+
+
+def _csv_chunks(uploaded_file, chunk_rows):
+    # Separador "," o ";" (CSV exportado desde Excel en español)
+    head = uploaded_file.read(4096).decode("utf-8-sig", errors="ignore").splitlines()[:1]
+    uploaded_file.seek(0)
+    sep = ";" if head and head[0].count(";") > head[0].count(",") else ","
+    yield from pd.read_csv(uploaded_file, sep=sep, dtype=str, keep_default_na=False,
+                           encoding="utf-8-sig", chunksize=chunk_rows)
+
+
+def _excel_chunks(uploaded_file, chunk_rows):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Para importar ficheros Excel instala openpyxl (pip install openpyxl).") from None
+    # Modo read_only: las filas se leen en streaming, sin cargar la hoja entera
+    wb = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = ["" if c is None else str(c) for c in next(rows, ())]
+        bloque = []
+        for row in rows:
+            bloque.append(row)
+            if len(bloque) == chunk_rows:
+                yield pd.DataFrame(bloque, columns=header, dtype=object)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=header, dtype=object)
+    finally:
+        wb.close()
+
+
+def read_chunks(uploaded_file, chunk_rows=CHUNK_ROWS):
+    # Bloques con el índice igual al número de fila del fichero (1 = cabecera)
+    uploaded_file.seek(0)
+    reader = _excel_chunks if uploaded_file.name.lower().endswith((".xlsx", ".xlsm")) else _csv_chunks
+    fila = 2
+    for chunk in reader(uploaded_file, chunk_rows):
+        chunk.columns = [str(c).strip() for c in chunk.columns]
+        chunk.index = range(fila, fila + len(chunk))
+        fila += len(chunk)
+        yield chunk
+
+
+def _errores(mask, col, valores, mensaje):
+    return pd.DataFrame({"Fila": valores.index[mask], "Columna": col,
+                         "Valor": valores[mask].astype(str), "Error": mensaje})
+
+
+def validate_file(uploaded_file, table, files, chunk_rows=CHUNK_ROWS):
+    # files: {"clients": "clients.csv", ...}. Devuelve (filas válidas tipadas,
+    # informe de errores, columnas del fichero que no existen en la tabla)
+    key = KEYS[table]
+    existentes = set(load_data(files[table], columns(table))[key].dropna())
+    referencia = REFERENCES.get(table)
+    if referencia:
+        ref_col, ref_table = referencia
+        ref_ids = set(load_data(files[ref_table], columns(ref_table))[KEYS[ref_table]].dropna())
+
+    validas, errores, vistos, ignoradas = [], [], set(), set()
+    for chunk in read_chunks(uploaded_file, chunk_rows):
+        ignoradas |= set(chunk.columns) - set(columns(table))
+        typed, errs = validate_frame(table, chunk)
+        errs = [errs] if not errs.empty else []
+
+        for col in REQUIRED.get(table, []):
+            faltan = typed[col].isna() if col in typed else pd.Series(True, index=typed.index)
+            if faltan.any():
+                valores = chunk[col] if col in chunk else pd.Series("", index=chunk.index)
+                errs.append(_errores(faltan, col, valores, "campo obligatorio"))
+        if key in typed:
+            ids = typed[key]
+            repetidos = ids.notna() & (ids.isin(existentes) | ids.isin(vistos) | ids.duplicated())
+            if repetidos.any():
+                errs.append(_errores(repetidos, key, ids, "el ID ya existe o está repetido en el fichero"))
+            vistos.update(ids.dropna())
+        if referencia and ref_col in typed:
+            huerfanas = typed[ref_col].notna() & ~typed[ref_col].isin(ref_ids)
+            if huerfanas.any():
+                errs.append(_errores(huerfanas, ref_col, typed[ref_col], f"no existe en la tabla {ref_table}"))
+
+        if errs:
+            errs = pd.concat(errs, ignore_index=True)
+            errores.append(errs)
+            typed = typed[~typed.index.isin(errs["Fila"])]
+        validas.append(typed)
+
+    validas = pd.concat(validas) if validas else pd.DataFrame(columns=columns(table))
+    errores = pd.concat(errores, ignore_index=True).sort_values("Fila", kind="stable") if errores else \
+        pd.DataFrame(columns=ERROR_COLS)
+    return validas, errores, sorted(ignoradas)
+
+
+def commit_import(validas, table, files):
+    # Asigna IDs a las filas que no lo traen y escribe todas en un único lote.
+    # Devuelve (filas importadas, informe de las filas rechazadas)
+    key = KEYS[table]
+    validas = validas.reindex(columns=columns(table)).copy()
+    errores = []
+    # Desde la validación otra sesión puede haber dado de alta esos mismos IDs
+    existentes = load_data(files[table], columns(table))[key].dropna()
+    repetidos = validas[key].notna() & validas[key].isin(existentes)
+    if repetidos.any():
+        errores.append(_errores(repetidos, key, validas[key], "el ID ya existe"))
+        validas = validas[~repetidos]
+    referencia = REFERENCES.get(table)
+    if referencia:
+        ref_col, ref_table = referencia
+        ref_ids = load_data(files[ref_table], columns(ref_table))[KEYS[ref_table]].dropna()
+        huerfanas = validas[ref_col].notna() & ~validas[ref_col].isin(ref_ids)
+        if huerfanas.any():
+            errores.append(_errores(huerfanas, ref_col, validas[ref_col], f"no existe en la tabla {ref_table}"))
+            validas = validas[~huerfanas]
+    errores = pd.concat(errores, ignore_index=True).sort_values("Fila", kind="stable", ignore_index=True) \
+        if errores else pd.DataFrame(columns=ERROR_COLS)
+    if validas.empty:
+        return 0, errores
+
+    sin_id = validas[key].isna()
+    dados = validas.loc[~sin_id, key]
+    # La secuencia avanza por encima de los IDs importados para no reutilizarlos
+    inicio = ID_START.get(table, 1)
+    primero = next_id(files[table], key, start=max(inicio, int(dados.max()) + 1) if not dados.empty else inicio,
+                      count=max(int(sin_id.sum()), 1))
+    validas.loc[sin_id, key] = range(primero, primero + int(sin_id.sum()))
+
+    for col in validas.columns:
+        if pd.api.types.is_datetime64_any_dtype(validas[col]):
+            validas[col] = validas[col].dt.date
+    validas = validas.astype(object)
+    rows = validas.where(validas.notna(), None).to_dict("records")
+    return insert_rows(files[table], rows), errores
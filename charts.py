@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+# ================================
+# 📊 GRÁFICOS DEL DASHBOARD: CACHÉ Y PREAGREGADOS
+# ================================
+# Las figuras se guardan en una caché LRU del proceso por clave (versión de
+# los datos + filtros): un rerun sin cambios reutiliza la figura ya construida.
+# Los boxplots y los histogramas se calculan en el servidor (cuartiles,
+# bigotes y conteos por intervalo con NumPy) y la figura solo lleva esos
+# valores, así que el JSON que recibe el navegador no crece con el número de
+# ofertas. Los bigotes siguen la regla de plotly (1,5 × IQR acotado a los
+# datos); los valores atípicos no se dibujan uno a uno.
+FIGURES_KEPT = 64
+TEMPLATE = "plotly_white"
+
+
+def box_stats(df, group_col, value_col):
+    # Cuartiles, media y bigotes de value_col por cada valor de group_col
+    datos = pd.DataFrame({"grupo": df[group_col].astype(object),
+                          "valor": pd.to_numeric(df[value_col], errors="coerce")}).dropna()
+    filas = []
+    for grupo, valores in datos.groupby("grupo", sort=False)["valor"]:
+        v = np.sort(valores.to_numpy(dtype=float))
+        q1, mediana, q3 = np.percentile(v, [25, 50, 75])
+        iqr = q3 - q1
+        dentro = v[(v >= q1 - 1.5 * iqr) & (v <= q3 + 1.5 * iqr)]
+        filas.append({group_col: grupo, "q1": q1, "median": mediana, "q3": q3, "mean": v.mean(),
+                      "lowerfence": dentro.min(), "upperfence": dentro.max(), "n": len(v)})
+    return pd.DataFrame(filas, columns=[group_col, "q1", "median", "q3", "mean", "lowerfence", "upperfence", "n"])
+
+
+def box_figure(stats, group_col, value_col, title, colors):
+    fig = go.Figure()
+    for i, fila in enumerate(stats.itertuples(index=False)):
+        fila = dict(zip(stats.columns, fila))
+        fig.add_trace(go.Box(
+            name=str(fila[group_col]), x=[fila[group_col]],
+            q1=[fila["q1"]], median=[fila["median"]], q3=[fila["q3"]], mean=[fila["mean"]],
+            lowerfence=[fila["lowerfence"]], upperfence=[fila["upperfence"]],
+            marker_color=colors[i % len(colors)], hovertext=[f"{fila['n']:,} ofertas"],
+        ))
+    fig.update_layout(title=title, xaxis_title=group_col, yaxis_title=value_col, legend_title_text=group_col,
+                      template=TEMPLATE)
+    return fig
+
+
+def histogram_bins(values, nbins, value_range=None):
+    values = pd.to_numeric(pd.Series(values), errors="coerce").dropna().to_numpy(dtype=float)
+    if value_range is None:
+        value_range = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+    conteos, bordes = np.histogram(values, bins=nbins, range=value_range)
+    return pd.DataFrame({"desde": bordes[:-1], "hasta": bordes[1:], "Cantidad": conteos})
+
+
+def histogram_figure(bins, value_col, title, color):
+    fig = go.Figure(go.Bar(
+        x=(bins["desde"] + bins["hasta"]) / 2, y=bins["Cantidad"], width=bins["hasta"] - bins["desde"],
+        marker_color=color, customdata=bins[["desde", "hasta"]].to_numpy(),
+        hovertemplate="%{customdata[0]:.0f}–%{customdata[1]:.0f}: %{y:,}<extra></extra>",
+    ))
+    fig.update_layout(title=title, xaxis_title=value_col, yaxis_title="Cantidad", bargap=0, template=TEMPLATE)
+    return fig
+
+
+# Figuras compartidas por todas las sesiones del proceso
+_lock = threading.Lock()
+_figures = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_figure(key, build):
+    # build() -> figura; solo se llama si key no está en la caché
+    with _lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+            _stats["hits"] += 1
+            return fig
+        _stats["misses"] += 1
+    fig = build()
+    with _lock:
+        _figures[key] = fig
+        while len(_figures) > FIGURES_KEPT:
+            _figures.popitem(last=False)
+    return fig
+
+
+def figure_cache_stats():
+    with _lock:
+        return dict(_stats, figuras=len(_figures))
+
@@ -0,0 +1,76 @@
+import pytest
+
+import cube
+import history
+import offer_view
+import search
+import storage
+from schema import columns
+
+# ================================
+# 🧪 ENTORNO DE LAS PRUEBAS
+# ================================
+# Cada prueba trabaja en un directorio temporal (las tablas usan rutas
+# relativas) y con las cachés compartidas del proceso vacías: la de storage y
+# las estructuras derivadas (cubo, vista de ofertas, índices de búsqueda,
+# resultados del histórico).
+LEADS_FILE = "leads.csv"
+OFFERS_FILE = "offers.csv"
+CLIENTS_FILE = "clients.csv"
+
+
+def _reset():
+    storage.invalidate_cache()
+    with storage._lock:
+        storage._changes.clear()
+    cube._state.update(cube=None, versions=None, view=None)
+    offer_view._state.update(joined=None, versions=None, view=None)
+    with search._lock:
+        search._indexes.clear()
+        search._building.clear()
+    with history._lock:
+        history._results.clear()
+        history._series.clear()
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "BACKEND", "csv")
+    _reset()
+    yield tmp_path
+    _reset()
+
+
+def lead(lead_id, cliente, **values):
+    return dict({"ID Lead": lead_id, "ID Cliente": lead_id, "Cliente": cliente, "Estado": "Nuevo",
+                 "Tecnologia": "Solar", "Tipo PPA": "Pay-as-Produced", "Duracion": 10, "Capacidad": 10.0,
+                 "Produccion": 20.0, "Responsable": "Ana"}, **values)
+
+
+def offer(offer_id, lead_id, **values):
+    return dict({"ID Oferta": offer_id, "ID Lead": lead_id, "Fecha Oferta": "2025-07-01", "Precio EUR/MWh": 45.0,
+                 "Volumen MWh": 1000.0, "Probabilidad (%)": 50, "Estado": "Enviada"}, **values)
+
+
+def tables():
+    return storage.load_data(LEADS_FILE, columns("leads")), storage.load_data(OFFERS_FILE, columns("offers"))
+
+
+def seed_pipeline():
+    storage.insert_rows(LEADS_FILE, [lead(1, "Alfa"), lead(2, "Beta", Responsable="Luis"),
+                                     lead(3, "Kabel Energía", Tecnologia="Eólica")])
+    storage.insert_rows(OFFERS_FILE, [offer(101, 1), offer(102, 1, Estado="Aprobada"), offer(103, 2),
+                                      offer(104, 3, **{"Precio EUR/MWh": None})])
+
+
+def pipeline_changes():
+    # Altas, ediciones de dimensiones y medidas, cambio de lead de una oferta y borrados
+    storage.insert_row(LEADS_FILE, lead(4, "Delta", Estado="En curso"))
+    storage.insert_row(OFFERS_FILE, offer(105, 4, **{"Volumen MWh": 250.0}))
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Responsable": "Luis", "Capacidad": 30.0})
+    storage.update_row(LEADS_FILE, "ID Lead", 2, {"Cliente": "Beta Solar"})
+    storage.update_row(OFFERS_FILE, "ID Oferta", 101, {"Estado": "Rechazada", "Probabilidad (%)": 0})
+    storage.update_row(OFFERS_FILE, "ID Oferta", 103, {"ID Lead": 4})
+    storage.delete_row(OFFERS_FILE, "ID Oferta", 102)
+    storage.delete_row(LEADS_FILE, "ID Lead", 3)
@@ -0,0 +1,281 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import changes_since, versioned_load
+
+# ================================
+# 🧊 CUBO DE AGREGADOS DEL DASHBOARD
+# ================================
+# Agregados precalculados por Responsable × Cliente × Estado Lead ×
+# Estado Oferta × Tecnologia. El cubo se comparte entre sesiones y se
+# actualiza con los registros de journal de cada alta/edición, de modo que
+# cualquier combinación de filtros del Dashboard se resuelve sumando celdas
+# en lugar de recorrer las filas de leads y ofertas.
+LEAD_DIMS = ["Responsable", "Cliente", "Estado", "Tecnologia"]
+LEAD_MEASURES = ["Cantidad", "Capacidad", "Produccion"]
+OFFER_DIMS = ["Responsable", "Cliente", "Estado Lead", "Estado Oferta", "Tecnologia"]
+OFFER_MEASURES = ["Cantidad", "Volumen MWh", "Suma Precio", "Con Precio", "Pipeline"]
+OFFER_FIELDS = ["ID Lead", "Estado", "Precio EUR/MWh", "Volumen MWh", "Probabilidad (%)"]
+
+_NO_LEAD = ("", "", "", "")
+
+
+def _dim(value):
+    # Las celdas se indexan por tupla: los valores vacíos se normalizan a ""
+    return "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+def _lead_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _num(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if np.isnan(value) else value
+
+
+class _Facts:
+    # Última versión de cada fila que aporta al cubo (para restar su
+    # contribución al editarla). Los cambios recientes viven en un dict y se
+    # pliegan al DataFrame base cada FOLD_EVERY cambios.
+    FOLD_EVERY = 1000
+
+    def __init__(self, df, key, cols):
+        self.cols = cols
+        self.base = df.drop_duplicates(key, keep="last").set_index(key)[cols] if not df.empty else \
+            pd.DataFrame(columns=cols)
+        self.delta = {}
+
+    def get(self, key):
+        if key in self.delta:
+            return self.delta[key]
+        try:
+            return self.base.loc[key].to_dict()
+        except KeyError:
+            return None
+
+    def set(self, key, row):
+        # row=None marca la fila como borrada
+        self.delta[key] = row
+        if len(self.delta) >= self.FOLD_EVERY:
+            keys = [k for k in self.delta if k in self.base.index]
+            base = self.base.drop(index=keys)
+            rows = {k: r for k, r in self.delta.items() if r is not None}
+            if rows:
+                base = pd.concat([base, pd.DataFrame.from_dict(rows, orient="index")[self.cols]])
+            self.base, self.delta = base, {}
+
+
+class PipelineCube:
+    def __init__(self, leads, offers):
+        leads = leads.assign(**{c: leads[c].astype(object).map(_dim) for c in LEAD_DIMS})
+        leads = leads.assign(**{c: pd.to_numeric(leads[c], errors="coerce").fillna(0.0) for c in LEAD_MEASURES[1:]})
+        self.leads = _Facts(leads, "ID Lead", LEAD_DIMS + LEAD_MEASURES[1:])
+        self.offers = _Facts(offers, "ID Oferta", OFFER_FIELDS)
+
+        lead_cells = leads.assign(Cantidad=1).groupby(LEAD_DIMS)[LEAD_MEASURES].sum()
+        self.lead_cells = {k: v for k, v in zip(lead_cells.index, lead_cells.to_numpy(dtype=float))}
+
+        # Contribución de las ofertas de cada lead, por estado de oferta
+        measures = self._offer_measures(offers)
+        measures["ID Lead"] = offers["ID Lead"].map(_lead_id).to_numpy()
+        measures["Estado Oferta"] = offers["Estado"].astype(object).map(_dim).to_numpy()
+        partials = measures.groupby(["ID Lead", "Estado Oferta"], dropna=False)[OFFER_MEASURES].sum()
+        self.partials = {}
+        for (lead_id, estado), vals in zip(partials.index, partials.to_numpy(dtype=float)):
+            self.partials.setdefault(_lead_id(lead_id), {})[estado] = vals
+
+        lead_dims = leads.drop_duplicates("ID Lead", keep="last")
+        lead_dims = lead_dims.assign(**{"ID Lead": lead_dims["ID Lead"].map(_lead_id)}).set_index("ID Lead")
+        measures = measures.join(lead_dims[LEAD_DIMS], on="ID Lead").rename(columns={"Estado": "Estado Lead"})
+        measures[LEAD_DIMS[:2] + ["Estado Lead", "Tecnologia"]] = \
+            measures[LEAD_DIMS[:2] + ["Estado Lead", "Tecnologia"]].fillna("")
+        offer_cells = measures.groupby(OFFER_DIMS)[OFFER_MEASURES].sum()
+        self.offer_cells = {k: v for k, v in zip(offer_cells.index, offer_cells.to_numpy(dtype=float))}
+
+    @staticmethod
+    def _offer_measures(offers):
+        precio = pd.to_numeric(offers["Precio EUR/MWh"], errors="coerce")
+        volumen = pd.to_numeric(offers["Volumen MWh"], errors="coerce").fillna(0.0)
+        prob = pd.to_numeric(offers["Probabilidad (%)"], errors="coerce").fillna(0.0)
+        return pd.DataFrame({
+            "Cantidad": 1.0,
+            "Volumen MWh": volumen,
+            "Suma Precio": precio.fillna(0.0),
+            "Con Precio": precio.notna().astype(float),
+            "Pipeline": precio.fillna(0.0) * volumen * prob / 100,
+        }, index=offers.index)
+
+    @staticmethod
+    def _offer_vals(row):
+        precio, volumen, prob = (_num(row.get(c)) for c in ["Precio EUR/MWh", "Volumen MWh", "Probabilidad (%)"])
+        con_precio = 0.0 if pd.isna(pd.to_numeric(row.get("Precio EUR/MWh"), errors="coerce")) else 1.0
+        return np.array([1.0, volumen, precio, con_precio, precio * volumen * prob / 100])
+
+    @staticmethod
+    def _offer_key(lead_key, estado_oferta):
+        responsable, cliente, estado, tecnologia = lead_key
+        return (responsable, cliente, estado, estado_oferta, tecnologia)
+
+    @staticmethod
+    def _add(cells, key, vals, sign=1):
+        total = cells.get(key, 0) + sign * vals
+        if total[0] <= 0:
+            cells.pop(key, None)
+        else:
+            cells[key] = total
+
+    def _lead_key(self, lead_id):
+        row = None if lead_id is None else self.leads.get(lead_id)
+        return _NO_LEAD if row is None else tuple(row[c] for c in LEAD_DIMS)
+
+    # --- Actualización incremental ---
+    def apply(self, lead_records, offer_records):
+        for rec in lead_records:
+            self._apply_lead(rec)
+        for rec in offer_records:
+            self._apply_offer(rec)
+
+    def _apply_lead(self, rec):
+        lead_id = int(rec["row"]["ID Lead"] if rec["op"] == "insert" else rec["id"])
+        old = self.leads.get(lead_id)
+        if old is not None:
+            self._add(self.lead_cells, tuple(old[c] for c in LEAD_DIMS),
+                      np.array([1.0, old["Capacidad"], old["Produccion"]]), -1)
+        if rec["op"] == "delete":
+            new = None
+        else:
+            values = rec["row"] if rec["op"] == "insert" else rec["values"]
+            new = dict(old) if old is not None else dict({c: "" for c in LEAD_DIMS}, Capacidad=0.0, Produccion=0.0)
+            for col in LEAD_DIMS:
+                if col in values:
+                    new[col] = _dim(values[col])
+            for col in LEAD_MEASURES[1:]:
+                if col in values:
+                    new[col] = _num(values[col])
+            self._add(self.lead_cells, tuple(new[c] for c in LEAD_DIMS),
+                      np.array([1.0, new["Capacidad"], new["Produccion"]]))
+        self.leads.set(lead_id, new)
+
+        # Las ofertas del lead cambian de celda si cambian sus dimensiones
+        old_key = _NO_LEAD if old is None else tuple(old[c] for c in LEAD_DIMS)
+        new_key = _NO_LEAD if new is None else tuple(new[c] for c in LEAD_DIMS)
+        if old_key != new_key:
+            for estado, vals in self.partials.get(lead_id, {}).items():
+                self._add(self.offer_cells, self._offer_key(old_key, estado), vals, -1)
+                self._add(self.offer_cells, self._offer_key(new_key, estado), vals)
+
+    def _apply_offer(self, rec):
+        offer_id = int(rec["row"]["ID Oferta"] if rec["op"] == "insert" else rec["id"])
+        old = self.offers.get(offer_id)
+        if old is not None:
+            self._move_offer(old, -1)
+        if rec["op"] == "delete":
+            new = None
+        else:
+            values = rec["row"] if rec["op"] == "insert" else rec["values"]
+            new = dict(old) if old is not None else {c: None for c in OFFER_FIELDS}
+            new.update({c: values[c] for c in OFFER_FIELDS if c in values})
+            self._move_offer(new, 1)
+        self.offers.set(offer_id, new)
+
+    def _move_offer(self, row, sign):
+        lead_id = _lead_id(row["ID Lead"])
+        estado = _dim(row["Estado"])
+        vals = self._offer_vals(row)
+        por_estado = self.partials.setdefault(lead_id, {})
+        self._add(por_estado, estado, vals, sign)
+        self._add(self.offer_cells, self._offer_key(self._lead_key(lead_id), estado), vals, sign)
+
+    # --- Consultas ---
+    def frames(self):
+        lead_frame = pd.DataFrame(
+            [k + tuple(v) for k, v in self.lead_cells.items()], columns=LEAD_DIMS + LEAD_MEASURES
+        )
+        offer_frame = pd.DataFrame(
+            [k + tuple(v) for k, v in self.offer_cells.items()], columns=OFFER_DIMS + OFFER_MEASURES
+        )
+        return CubeView(lead_frame, offer_frame)
+
+
+class CubeView:
+    # Instantánea inmutable de las celdas del cubo: cada sesión la consulta sin bloqueos
+    def __init__(self, lead_cells, offer_cells):
+        self.lead_cells = lead_cells
+        self.offer_cells = offer_cells
+
+    def leads(self, equals=None):
+        cells = self.lead_cells
+        for col, value in (equals or {}).items():
+            cells = cells[cells[col] == value]
+        return cells
+
+    def offers(self, estado=None, cliente=None, lead_equals=None):
+        cells = self.offer_cells
+        if estado:
+            cells = cells[cells["Estado Oferta"] == estado]
+        if cliente:
+            cells = cells[cells["Cliente"] == cliente]
+        for col, value in (lead_equals or {}).items():
+            cells = cells[cells["Estado Lead" if col == "Estado" else col] == value]
+        return cells
+
+    @staticmethod
+    def lead_kpis(cells):
+        return {
+            "total": int(cells["Cantidad"].sum()),
+            "capacidad": cells["Capacidad"].sum(),
+            "produccion": cells["Produccion"].sum(),
+            "responsables": cells.loc[cells["Responsable"] != "", "Responsable"].nunique(),
+        }
+
+    @staticmethod
+    def offer_kpis(cells):
+        con_precio = cells["Con Precio"].sum()
+        return {
+            "total": int(cells["Cantidad"].sum()),
+            "volumen": cells["Volumen MWh"].sum(),
+            "precio_medio": cells["Suma Precio"].sum() / con_precio if con_precio else 0,
+            "pipeline": cells["Pipeline"].sum(),
+        }
+
+    @staticmethod
+    def breakdown(cells, dim):
+        # Equivalente a df.groupby(dim).size() sobre las filas originales
+        counts = cells[cells[dim] != ""].groupby(dim)["Cantidad"].sum().astype(int)
+        return counts.reset_index(name="Cantidad")
+
+
+# Cubo compartido por todas las sesiones del proceso
+_lock = threading.Lock()
+_state = {"cube": None, "versions": None, "view": None}
+
+
+def get_cube_view(leads_file, offers_file, load):
+    # load() -> (leads, offers) leídos de storage en ese momento; solo se llama
+    # si hay que reconstruir el cubo
+    with _lock:
+        cube, versions = _state["cube"], _state["versions"]
+        if cube is not None:
+            lead_records, lead_version = changes_since(leads_file, versions[0])
+            offer_records, offer_version = changes_since(offers_file, versions[1])
+            if (lead_version, offer_version) == versions:
+                return _state["view"]
+            if lead_records is None or offer_records is None:
+                cube = None
+            else:
+                cube.apply(lead_records, offer_records)
+                versions = (lead_version, offer_version)
+        if cube is None:
+            versions, (leads, offers) = versioned_load((leads_file, offers_file), load)
+            cube = PipelineCube(leads, offers)
+        _state.update(cube=cube, versions=versions, view=cube.frames())
+        return _state["view"]
@@ -0,0 +1,213 @@
+import io
+import json
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from documents import DOCS_DIR, blob_path, store_upload
+
+# ================================
+# ⚙️ PROCESADO DE ADJUNTOS EN SEGUNDO PLANO
+# ================================
+# Al guardar un lead u oferta con un documento nuevo, submit_upload guarda el
+# blob y la fila del índice (documents.store_upload, que copia por bloques sin
+# duplicar el contenido en memoria) y solo encola su hash; un pool de WORKERS
+# hilos compartido por todas las sesiones del proceso extrae después páginas,
+# texto y vista previa leyendo el blob. El rerun del usuario no espera a esto.
+# Los resultados se guardan junto al blob, por hash, en docs/derived/<ab>/:
+# <hash>.json (páginas, caracteres, vista previa), <hash>.txt (texto) y, si el
+# documento trae miniatura y Pillow está instalado, <hash>.png. Un contenido
+# ya procesado no se vuelve a procesar.
+# La cola está acotada (MAX_PENDING): con la cola llena el documento se
+# procesa en el propio rerun, como antes. El estado de los últimos JOBS_KEPT
+# trabajos se consulta con job_status() desde las vistas.
+DERIVED_DIR = os.path.join(DOCS_DIR, "derived")
+WORKERS = 2
+MAX_PENDING = 16
+JOBS_KEPT = 200
+PREVIEW_CHARS = 600
+THUMBNAIL_SIZE = (240, 240)
+EN_COLA, PROCESANDO, COMPLETADO, ERROR = "⏳ En cola", "⚙️ Procesando", "✅ Completado", "❌ Error"
+STATUS_COLS = ["ID Trabajo", "ID Entidad", "Archivo", "Estado", "Detalle", "Fecha"]
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def derived_path(digest, ext):
+    return os.path.join(DERIVED_DIR, digest[:2], digest + ext)
+
+
+# -----------------------------
+# Extracción por tipo de fichero
+# -----------------------------
+def _pdf(data):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        # Sin pypdf solo se cuentan las páginas (objetos /Type /Page); el texto queda vacío
+        return len(_PDF_PAGE.findall(data)), ""
+    reader = PdfReader(io.BytesIO(data))
+    return len(reader.pages), "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def _docx(zf):
+    root = ElementTree.fromstring(zf.read("word/document.xml"))
+    parrafos = ["".join(t.text or "" for t in p.iter(_W + "t")) for p in root.iter(_W + "p")]
+    paginas = None
+    if "docProps/app.xml" in zf.namelist():
+        match = re.search(rb"<Pages>(\d+)</Pages>", zf.read("docProps/app.xml"))
+        paginas = int(match.group(1)) if match else None
+    return paginas, "\n".join(p for p in parrafos if p)
+
+
+def _xlsx(zf):
+    # Para hojas de cálculo, "páginas" = número de hojas; el texto son las cadenas compartidas
+    hojas = len(ElementTree.fromstring(zf.read("xl/workbook.xml")).findall(f"{_S}sheets/{_S}sheet"))
+    textos = []
+    if "xl/sharedStrings.xml" in zf.namelist():
+        root = ElementTree.fromstring(zf.read("xl/sharedStrings.xml"))
+        textos = ["".join(t.text or "" for t in si.iter(_S + "t")) for si in root.iter(_S + "si")]
+    return hojas, "\n".join(textos)
+
+
+def _thumbnail(zf, dest):
+    # Los documentos de Office pueden incluir una miniatura en docProps/
+    nombres = [n for n in zf.namelist() if n.lower().startswith("docprops/thumbnail")]
+    if not nombres:
+        return None
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(zf.read(nombres[0]))) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        img.convert("RGB").save(dest, "PNG")
+    return dest
+
+
+def analyze(digest, name):
+    # Páginas, texto y vista previa de un blob; devuelve los metadatos guardados
+    meta_path = derived_path(digest, ".json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+    with open(blob_path(digest), "rb") as f:
+        data = f.read()
+
+    paginas, texto, miniatura = None, "", None
+    ext = os.path.splitext(name)[1].lower()
+    if ext == ".pdf" or data[:5] == b"%PDF-":
+        paginas, texto = _pdf(data)
+    elif zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            nombres = set(zf.namelist())
+            if "word/document.xml" in nombres:
+                paginas, texto = _docx(zf)
+            elif "xl/workbook.xml" in nombres:
+                paginas, texto = _xlsx(zf)
+            miniatura = _thumbnail(zf, derived_path(digest, ".png"))
+
+    with open(derived_path(digest, ".txt"), "w", encoding="utf-8") as f:
+        f.write(texto)
+    meta = {
+        "paginas": paginas,
+        "caracteres": len(texto),
+        "vista_previa": re.sub(r"\s+", " ", texto[:PREVIEW_CHARS * 2]).strip()[:PREVIEW_CHARS],
+        "miniatura": miniatura,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+    }
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp, meta_path)  # el .json marca el procesado como terminado
+    return meta
+
+
+def document_info(digest):
+    # Metadatos del procesado, o None si todavía no ha terminado
+    try:
+        with open(derived_path(digest, ".json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# -----------------------------
+# Pool de trabajos compartido por el proceso
+# -----------------------------
+_lock = threading.Lock()
+_jobs = OrderedDict()
+_state = {"pool": None, "pendientes": 0, "ultimo_id": 0}
+
+
+def _pool():
+    # Llamar con _lock tomado; el pool sobrevive a los reruns y a las sesiones
+    if _state["pool"] is None:
+        _state["pool"] = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="ppa-docs")
+    return _state["pool"]
+
+
+def _set(job_id, **values):
+    with _lock:
+        if job_id in _jobs:
+            _jobs[job_id].update(values, Fecha=datetime.now().isoformat(timespec="seconds"))
+
+
+def _run(job_id, digest, name):
+    _set(job_id, Estado=PROCESANDO, Detalle="Extrayendo texto y vista previa")
+    try:
+        meta = analyze(digest, name)
+    except Exception as exc:  # el error se muestra en el estado del trabajo
+        _set(job_id, Estado=ERROR, Detalle=str(exc))
+    else:
+        paginas = f"{meta['paginas']} pág. · " if meta["paginas"] is not None else ""
+        _set(job_id, Estado=COMPLETADO, Detalle=f"{paginas}{meta['caracteres']:,} caracteres")
+    finally:
+        with _lock:
+            _state["pendientes"] -= 1
+
+
+def submit_upload(uploaded_file, entity, entity_id):
+    # Guarda el documento y encola su procesado; devuelve el ID del trabajo.
+    # La cola solo guarda el hash: el contenido ya está en el blob
+    digest = store_upload(uploaded_file, entity, entity_id)["Hash"]
+    with _lock:
+        _state["ultimo_id"] += 1
+        job_id = _state["ultimo_id"]
+        _jobs[job_id] = {"ID Trabajo": job_id, "Entidad": entity, "ID Entidad": entity_id,
+                         "Archivo": uploaded_file.name, "Estado": EN_COLA, "Detalle": "",
+                         "Fecha": datetime.now().isoformat(timespec="seconds")}
+        while len(_jobs) > JOBS_KEPT:
+            _jobs.popitem(last=False)
+        _state["pendientes"] += 1
+        lleno = _state["pendientes"] > MAX_PENDING
+        if not lleno:
+            _pool().submit(_run, job_id, digest, uploaded_file.name)
+    if lleno:
+        _run(job_id, digest, uploaded_file.name)
+    return job_id
+
+
+def job_status(entity, entity_ids=None):
+    # Trabajos recientes de una entidad (opcionalmente de ciertos IDs), más recientes primero
+    with _lock:
+        filas = [dict(job) for job in reversed(_jobs.values()) if job["Entidad"] == entity]
+    df = pd.DataFrame(filas, columns=STATUS_COLS)
+    if entity_ids is not None:
+        df = df[df["ID Entidad"].isin(entity_ids)]
+    return df.reset_index(drop=True)
+
+
+def pending_jobs():
+    with _lock:
+        return _state["pendientes"]
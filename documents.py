@@ -0,0 +1,121 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from storage import delete_row, insert_row, load_data, next_id
+
+# ================================
+# 📎 DOCUMENTOS ADJUNTOS
+# ================================
+# Los ficheros se guardan una sola vez por contenido (SHA-256) en
+# docs/blobs/<ab>/<hash>: el mismo contrato adjuntado a un lead y a una oferta
+# comparte blob. El índice docs/documents.csv (una fila por adjunto, con
+# entidad, tamaño, tipo MIME y fecha) permite listar sin tocar el disco; el
+# contenido se lee únicamente cuando el usuario pide descargarlo.
+DOCS_DIR = "docs"
+BLOBS_DIR = os.path.join(DOCS_DIR, "blobs")
+INDEX_FILE = os.path.join(DOCS_DIR, "documents.csv")
+INDEX_COLS = ["ID Doc", "Hash", "Entidad", "ID Entidad", "Archivo", "Tamaño", "Mime", "Fecha Subida"]
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(digest):
+    return os.path.join(BLOBS_DIR, digest[:2], digest)
+
+
+def store_upload(uploaded_file, entity, entity_id):
+    # Se copia por bloques a un temporal mientras se calcula el hash
+    os.makedirs(BLOBS_DIR, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=BLOBS_DIR, suffix=".tmp")
+    with os.fdopen(fd, "wb") as out:
+        uploaded_file.seek(0)
+        while True:
+            chunk = uploaded_file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+
+    digest = sha.hexdigest()
+    dest = blob_path(digest)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest):
+        os.remove(tmp)  # contenido ya almacenado: se reutiliza el blob
+    else:
+        os.replace(tmp, dest)
+
+    row = {
+        "ID Doc": next_id(INDEX_FILE, "ID Doc"),
+        "Hash": digest,
+        "Entidad": entity,
+        "ID Entidad": entity_id,
+        "Archivo": uploaded_file.name,
+        "Tamaño": size,
+        "Mime": getattr(uploaded_file, "type", None) or mimetypes.guess_type(uploaded_file.name)[0]
+                or "application/octet-stream",
+        "Fecha Subida": datetime.now().isoformat(timespec="seconds"),
+    }
+    insert_row(INDEX_FILE, row)
+    return row
+
+
+def load_index():
+    return load_data(INDEX_FILE, INDEX_COLS)
+
+
+def delete_document(doc_id):
+    index = load_index()
+    digest = index.loc[index["ID Doc"] == doc_id, "Hash"]
+    delete_row(INDEX_FILE, "ID Doc", doc_id)
+    # El blob solo se borra cuando ningún otro adjunto lo referencia
+    if not digest.empty and (index["Hash"] == digest.iat[0]).sum() <= 1:
+        path = blob_path(digest.iat[0])
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def list_attachments(df, cols, entity, id_col, index=None):
+    # Una fila por documento con las columnas de metadatos indicadas: adjuntos
+    # del índice y rutas antiguas guardadas en la columna "Docs"
+    index = load_index() if index is None else index
+    meta_cols = ["ID Doc", "Archivo", "Ruta", "Tamaño", "Mime", "Fecha Subida"]
+    stored = index[(index["Entidad"] == entity) & index["ID Entidad"].isin(df[id_col])]
+    if stored.empty:
+        stored = pd.DataFrame(columns=list(cols) + meta_cols)
+    else:
+        stored = stored.rename(columns={"ID Entidad": id_col}).merge(df[list(cols)], on=id_col, how="inner")
+        stored = stored.assign(Ruta=stored["Hash"].map(blob_path))
+
+    legacy = df[list(cols) + ["Docs"]]
+    legacy = legacy[legacy["Docs"].notna() & ~legacy["Docs"].astype(str).isin(["", "nan"])]
+    legacy = legacy.assign(Ruta=legacy["Docs"].astype(str).str.split(";")).explode("Ruta")
+    legacy = legacy[legacy["Ruta"] != ""].drop(columns="Docs")
+    legacy["Archivo"] = legacy["Ruta"].map(os.path.basename)
+
+    partes = [p for p in (stored[list(cols) + meta_cols], legacy) if not p.empty]
+    if not partes:
+        return pd.DataFrame(columns=list(cols) + meta_cols)
+    # Las rutas antiguas no tienen ID Doc ni metadatos: se completan las columnas
+    return pd.concat(partes, ignore_index=True).reindex(columns=list(cols) + meta_cols)
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def read_document(path, chunk_size=CHUNK_SIZE):
+    # st.download_button necesita el contenido completo en bytes, así que solo
+    # se llama para el documento que el usuario ha pedido descargar
+    return b"".join(iter_chunks(path, chunk_size))
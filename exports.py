@@ -0,0 +1,127 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# ================================
+# ⬇️ EXPORTACIONES BAJO DEMANDA
+# ================================
+# Los ficheros de descarga solo se generan cuando el usuario los pide. Se
+# escriben por bloques de CHUNK_ROWS filas en un temporal de EXPORT_DIR (sin
+# construir el fichero completo en memoria) y se reutilizan mientras no cambie
+# la clave: tabla + filtros + versión de los datos + formato. Las últimas
+# MAX_EXPORTS exportaciones se conservan en disco y se comparten entre sesiones.
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "ppa_exports")
+CHUNK_ROWS = 50_000
+MAX_EXPORTS = 32
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+    "Excel (XLSX)": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+# Dependencias opcionales de cada formato
+REQUIRES = {"Parquet": "pyarrow", "Excel (XLSX)": "openpyxl"}
+
+
+def _available(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt not in REQUIRES or _available(REQUIRES[fmt])]
+
+
+def _chunks(df):
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+
+def _write_csv(df, path):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        df.head(0).to_csv(f, index=False)
+        for chunk in _chunks(df):
+            chunk.to_csv(f, index=False, header=False)
+
+
+def _write_parquet(df, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Un row group por bloque; el esquema se fija con el primer bloque
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _cell(value):
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def _write_xlsx(df, path):
+    from openpyxl import Workbook
+
+    # Modo write_only: las filas se vuelcan al fichero a medida que se añaden
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([str(c) for c in df.columns])
+    for chunk in _chunks(df):
+        for row in chunk.astype(object).itertuples(index=False):
+            ws.append([_cell(v) for v in row])
+    wb.save(path)
+
+
+WRITERS = {"CSV": _write_csv, "Parquet": _write_parquet, "Excel (XLSX)": _write_xlsx}
+
+# Exportaciones generadas, compartidas por todas las sesiones del proceso. El
+# fichero se escribe fuera del lock: si otra sesión ya genera la misma clave,
+# se espera a su fichero (_pending) y las demás exportaciones no se bloquean
+_lock = threading.Lock()
+_exports = OrderedDict()
+_pending = {}
+
+
+def export_file(df, fmt, key):
+    # key identifica el contenido (tabla, filtros, versión de datos): si ya se
+    # exportó con el mismo formato se devuelve la ruta sin regenerar el fichero
+    cache_key = (key, fmt)
+    while True:
+        with _lock:
+            path = _exports.get(cache_key)
+            if path is not None and os.path.exists(path):
+                _exports.move_to_end(cache_key)
+                return path
+            evento = _pending.get(cache_key)
+            if evento is None:
+                evento = _pending[cache_key] = threading.Event()
+                break
+        # Otra sesión lo está escribiendo; si falla, se reintenta aquí
+        evento.wait()
+    try:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=EXPORT_DIR, suffix=FORMATS[fmt][0])
+        os.close(fd)
+        try:
+            WRITERS[fmt](df, path)
+        except BaseException:
+            os.remove(path)
+            raise
+        with _lock:
+            _exports[cache_key] = path
+            while len(_exports) > MAX_EXPORTS:
+                _, old = _exports.popitem(last=False)
+                if os.path.exists(old):
+                    os.remove(old)
+        return path
+    finally:
+        with _lock:
+            _pending.pop(cache_key, None)
+        evento.set()
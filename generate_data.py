@@ -0,0 +1,179 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import ESTADOS_LEAD, ESTADOS_OFERTA, TECNOLOGIAS, TIPOS_CLIENTE, TIPOS_PPA, columns
+
+# ================================
+# 🧪 GENERADOR DE DATOS SINTÉTICOS
+# ================================
+# Genera clients.csv, leads.csv y offers.csv con el formato de la aplicación
+# (columnas y enumerados de schema.py, nombres y direcciones españoles con
+# tildes, claves ajenas coherentes) para pruebas de carga y benchmarks.
+#   python generate_data.py --rows 100000 --out /tmp/ppa_100k
+# --rows es el número de leads; se generan ROWS_PER_CLIENT leads por cliente
+# y OFFERS_PER_LEAD ofertas por lead de media.
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+ROWS_PER_CLIENT = 10
+OFFERS_PER_LEAD = 1.5
+# Ficheros de la aplicación que no se pisan (journal, secuencias, historial, SQLite)
+APP_DATA_SUFFIXES = (".journal", ".seq", ".history", ".db")
+
+PREFIJOS = ["Energías", "Renovables", "Solar", "Eólica", "Generación", "Parque Solar", "Hidroeléctrica", "Comercializadora",
+            "Fotovoltaica", "Industrias", "Cerámica", "Aceros", "Papelera", "Logística"]
+NUCLEOS = ["Ibérica", "del Sur", "Andaluza", "Castellana", "Gallega", "del Cantábrico", "de Levante", "Peñalara",
+           "Aragonesa", "Manchega", "Extremeña", "Navarra", "del Ebro", "Mediterránea", "Atlántica", "Montaña Palentina",
+           "Guadalquivir", "Alcántara", "Tajo", "Peñíscola"]
+SUFIJOS = ["S.L.", "S.A.", "S.L.U.", "S.A.U.", "S.Coop."]
+NOMBRES = ["José", "María", "Íñigo", "Begoña", "Núria", "Álvaro", "Lucía", "Jesús", "Inés", "Ramón", "Sofía", "Joaquín",
+           "Ángela", "Rubén", "Mónica", "Óscar", "Marta", "Andrés", "Raúl", "Elena"]
+APELLIDOS = ["García", "Fernández", "González", "Rodríguez", "López", "Martínez", "Sánchez", "Pérez", "Gómez", "Martín",
+             "Jiménez", "Ruiz", "Hernández", "Díaz", "Muñoz", "Álvarez", "Romero", "Alonso", "Gutiérrez", "Navarro",
+             "Ibáñez", "Peña", "Castaño", "Ordóñez"]
+LUGARES = [("Madrid", "Madrid"), ("Barcelona", "Barcelona"), ("Sevilla", "Sevilla"), ("Málaga", "Málaga"),
+           ("Antequera", "Málaga"), ("Córdoba", "Córdoba"), ("Jaén", "Jaén"), ("Almería", "Almería"),
+           ("Valladolid", "Valladolid"), ("Zaratán", "Valladolid"), ("Zaragoza", "Zaragoza"), ("Bilbao", "Vizcaya"),
+           ("A Coruña", "A Coruña"), ("León", "León"), ("Cáceres", "Cáceres"), ("Badajoz", "Badajoz"),
+           ("Ciudad Real", "Ciudad Real"), ("Albacete", "Albacete"), ("Castellón de la Plana", "Castellón"),
+           ("Logroño", "La Rioja"), ("Pamplona", "Navarra"), ("Teruel", "Teruel"), ("Cuenca", "Cuenca"),
+           ("Ávila", "Ávila"), ("Segovia", "Segovia")]
+VIAS = ["Calle", "Avenida", "Paseo", "Plaza", "Camino", "Polígono Industrial"]
+SECTORES = ["Energía", "Industria", "Alimentación", "Automoción", "Química", "Distribución", "Telecomunicaciones",
+            "Siderurgia", "Papel", "Cerámica"]
+RESPONSABLES = ["Marta Pérez", "Luis Blanco", "Íñigo Ruiz", "Begoña Castaño", "Álvaro Ordóñez", "Núria Puig",
+                "Jesús Peña", "Ana Muñoz"]
+# Pesos de los enumerados (mismo orden que en schema.py)
+PESOS_ESTADO_LEAD = [0.30, 0.30, 0.15, 0.10, 0.15]
+PESOS_TECNOLOGIA = [0.55, 0.25, 0.15, 0.05]
+PESOS_ESTADO_OFERTA = [0.40, 0.25, 0.10, 0.15, 0.10]
+FECHA_INICIO = np.datetime64("2022-01-01")
+DIAS = 4 * 365
+
+
+def _pick(rng, values, n, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p)]
+
+
+def _join(*parts):
+    # Concatenación vectorizada de columnas de texto
+    n = max(np.size(part) for part in parts)
+    out = pd.Series("", index=range(n), dtype=object)
+    for part in parts:
+        out = out + (pd.Series(part, index=range(n), dtype=object).astype(str) if np.ndim(part) else str(part))
+    return out.to_numpy()
+
+
+def _ascii(values):
+    # Parte local de un email: sin tildes ni espacios
+    s = pd.Series(values, dtype=object).str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+    return s.str.lower().str.replace(" ", "", regex=False).to_numpy()
+
+
+def _fechas(rng, n):
+    return (FECHA_INICIO + rng.integers(0, DIAS, size=n).astype("timedelta64[D]")).astype("datetime64[D]")
+
+
+def generate_clients(n, rng):
+    lugares = rng.integers(0, len(LUGARES), size=n)
+    nombres = _join(_pick(rng, PREFIJOS, n), " ", _pick(rng, NUCLEOS, n), " ", np.arange(1, n + 1), ", ",
+                    _pick(rng, SUFIJOS, n))
+    return pd.DataFrame({
+        "ID Cliente": np.arange(1, n + 1),
+        "Nombre": nombres,
+        "CIF/NIF": _join(_pick(rng, list("ABG"), n), pd.Series(rng.integers(0, 10 ** 8, size=n)).astype(str).str.zfill(8)),
+        "Dirección": _join(_pick(rng, VIAS, n), " ", _pick(rng, APELLIDOS, n), " ", rng.integers(1, 200, size=n)),
+        "Ciudad": np.array([c for c, _ in LUGARES], dtype=object)[lugares],
+        "Provincia": np.array([p for _, p in LUGARES], dtype=object)[lugares],
+        "País": "España",
+        "Tipo": _pick(rng, TIPOS_CLIENTE, n, p=[0.45, 0.40, 0.10, 0.05]),
+        "Sector": _pick(rng, SECTORES, n),
+        "Notas": "",
+        "Docs": "",
+    }, columns=columns("clients"))
+
+
+def generate_leads(n, clients, rng):
+    cliente = rng.integers(0, len(clients), size=n)
+    capacidad = np.round(rng.gamma(2.0, 25.0, size=n) + 1, 2)
+    nombre, apellido = _pick(rng, NOMBRES, n), _pick(rng, APELLIDOS, n)
+    lugares = rng.integers(0, len(LUGARES), size=n)
+    return pd.DataFrame({
+        "ID Lead": np.arange(1, n + 1),
+        "ID Cliente": clients["ID Cliente"].to_numpy()[cliente],
+        "Cliente": clients["Nombre"].to_numpy()[cliente],
+        "Contacto": _join(_ascii(nombre), ".", _ascii(apellido), "@", _ascii(clients["Nombre"].str.split().str[0]
+                                                                              .to_numpy()[cliente]), ".es"),
+        "Estado": _pick(rng, ESTADOS_LEAD, n, p=PESOS_ESTADO_LEAD),
+        "Tecnologia": _pick(rng, TECNOLOGIAS, n, p=PESOS_TECNOLOGIA),
+        "Tipo PPA": _pick(rng, TIPOS_PPA, n),
+        "Duracion": rng.integers(5, 16, size=n),
+        "Fecha Alta": _fechas(rng, n),
+        "Capacidad": capacidad,
+        "Ubicacion": _join(np.array([c for c, _ in LUGARES], dtype=object)[lugares], " (",
+                           np.array([p for _, p in LUGARES], dtype=object)[lugares], ")"),
+        # GWh/año: horas equivalentes entre 1.600 y 2.400
+        "Produccion": np.round(capacidad * rng.uniform(1.6, 2.4, size=n), 2),
+        "Responsable": _pick(rng, RESPONSABLES, n),
+        "Notas": "",
+        "Docs": "",
+    }, columns=columns("leads"))
+
+
+def generate_offers(n, leads, rng):
+    lead = rng.integers(0, len(leads), size=n)
+    return pd.DataFrame({
+        "ID Oferta": np.arange(101, 101 + n),
+        "ID Lead": leads["ID Lead"].to_numpy()[lead],
+        "Fecha Oferta": _fechas(rng, n),
+        "Precio EUR/MWh": np.round(rng.uniform(20, 60, size=n), 2),
+        "Volumen MWh": np.round(leads["Produccion"].to_numpy()[lead] * 1000, 1),
+        "Probabilidad (%)": rng.integers(0, 101, size=n),
+        "Estado": _pick(rng, ESTADOS_OFERTA, n, p=PESOS_ESTADO_OFERTA),
+        "Notas": "",
+        "Docs": "",
+    }, columns=columns("offers"))
+
+
+def generate(rows, seed=0):
+    # Devuelve (clients, leads, offers) con rows leads
+    rng = np.random.default_rng(seed)
+    clients = generate_clients(max(1, rows // ROWS_PER_CLIENT), rng)
+    leads = generate_leads(rows, clients, rng)
+    offers = generate_offers(int(rows * OFFERS_PER_LEAD), leads, rng)
+    return clients, leads, offers
+
+
+def write_dataset(out_dir, rows, seed=0):
+    # Nunca sobre los datos de la aplicación: un directorio con tablas, journal,
+    # secuencias o historial a medias dejaría los CSV nuevos mezclados con ellos
+    tablas = ["clients", "leads", "offers"]
+    if os.path.isdir(out_dir):
+        ocupados = sorted(f for f in os.listdir(out_dir)
+                          if f in [f"{t}.csv" for t in tablas] or f.endswith(APP_DATA_SUFFIXES))
+        if ocupados:
+            raise FileExistsError(f"{out_dir} ya contiene datos de la aplicación: {', '.join(ocupados)}")
+    os.makedirs(out_dir, exist_ok=True)
+    tablas = dict(zip(tablas, generate(rows, seed)))
+    for nombre, df in tablas.items():
+        df.to_csv(os.path.join(out_dir, f"{nombre}.csv"), index=False)
+    return {nombre: len(df) for nombre, df in tablas.items()}
+
+
+def _rows(value):
+    return SIZES[value] if value in SIZES else int(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de clientes, leads y ofertas.")
+    parser.add_argument("--rows", type=_rows, default="1k", help="número de leads o tamaño (1k, 100k, 1M)")
+    parser.add_argument("--out", required=True, help="directorio de salida (nuevo o sin datos de la aplicación)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        escritas = write_dataset(args.out, args.rows, args.seed)
+    except FileExistsError as e:
+        parser.error(str(e))
+    for nombre, n in escritas.items():
+        print(f"{nombre}.csv: {n:,} filas")
@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from storage import apply_changes, history_path, load_data, write_lock
+
+# ================================
+# 🕰️ SNAPSHOTS E HISTÓRICO A FECHA
+# ================================
+# storage.py añade cada alta, edición y borrado con su fecha al historial
+# "<tabla>.csv.history" (que no se compacta). Aquí se guardan snapshots
+# periódicos de cada tabla en HISTORY_DIR/<tabla>/, con la posición del
+# historial a la que corresponden; la tabla a una fecha se reconstruye
+# cargando el último snapshot anterior a esa fecha y aplicando solo los
+# eventos que lo siguen hasta la fecha pedida.
+# maybe_snapshot crea un snapshot nuevo cuando el historial ha crecido
+# SNAPSHOT_BYTES desde el último, así que el tramo a reproducir está acotado.
+# El primer snapshot de una tabla es su estado actual: antes de él no hay
+# historial y as_of devuelve ese primer estado (con desde = su fecha).
+HISTORY_DIR = "history"
+SNAPSHOT_BYTES = 2_000_000
+RESULTS_KEPT = 16
+FECHA_FICHERO = "%Y%m%dT%H%M%S%f"
+
+_lock = threading.Lock()
+_results = OrderedDict()
+_series = {}
+
+
+def _table(file):
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def _dir(file):
+    return os.path.join(HISTORY_DIR, _table(file))
+
+
+def _history_size(file):
+    try:
+        return os.path.getsize(history_path(file))
+    except FileNotFoundError:
+        return 0
+
+
+def snapshots(file):
+    # [(fecha, posición en el historial, ruta)] ordenados por fecha
+    try:
+        nombres = os.listdir(_dir(file))
+    except FileNotFoundError:
+        return []
+    lista = []
+    for nombre in nombres:
+        if nombre.endswith(".pkl"):
+            offset, fecha = nombre[:-4].split("_")
+            lista.append((datetime.strptime(fecha, FECHA_FICHERO), int(offset), os.path.join(_dir(file), nombre)))
+    return sorted(lista)
+
+
+def snapshot(file, cols):
+    # Estado actual de la tabla con el bloqueo de escritura: el snapshot
+    # corresponde exactamente al final del historial en ese momento
+    os.makedirs(_dir(file), exist_ok=True)
+    with write_lock(file):
+        df = load_data(file, cols)
+        offset = _history_size(file)
+        ruta = os.path.join(_dir(file), f"{offset:012d}_{datetime.now().strftime(FECHA_FICHERO)}.pkl")
+        tmp = ruta + ".tmp"
+        df.to_pickle(tmp)
+        os.replace(tmp, ruta)
+    return ruta
+
+
+def maybe_snapshot(file, cols):
+    # Barato en cada rerun: solo compara el tamaño del historial con el último snapshot
+    ultimos = snapshots(file)
+    if not ultimos or _history_size(file) - ultimos[-1][1] >= SNAPSHOT_BYTES:
+        return snapshot(file, cols)
+    return None
+
+
+def _events(file, offset, until=None):
+    # Eventos desde la posición offset (hasta la fecha until, incluida)
+    eventos = []
+    try:
+        with open(history_path(file), "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # escritura a medias
+                event = json.loads(line)
+                if until is not None and datetime.fromisoformat(event["ts"]) > until:
+                    break
+                eventos.append(event)
+    except FileNotFoundError:
+        pass
+    return eventos
+
+
+def as_of(file, cols, when):
+    # (DataFrame de la tabla a la fecha when, fecha desde la que hay historial)
+    lista = snapshots(file)
+    if not lista:
+        snapshot(file, cols)
+        lista = snapshots(file)
+    anteriores = [s for s in lista if s[0] <= when] or lista[:1]
+    fecha, offset, ruta = anteriores[-1]
+    clave = (file, ruta, when)
+    with _lock:
+        if clave in _results:
+            _results.move_to_end(clave)
+            return _results[clave], lista[0][0]
+    df = pd.read_pickle(ruta)
+    if when >= fecha:
+        df = apply_changes(df, _events(file, offset, when), _table(file))
+    with _lock:
+        _results[clave] = df
+        while len(_results) > RESULTS_KEPT:
+            _results.popitem(last=False)
+    return df, lista[0][0]
+
+
+def field_history(file, key_col, key, fields):
+    # Cambios de unos campos de un registro (alta y ediciones) en orden. Un
+    # índice id -> posiciones del historial, compartido y actualizado solo con
+    # las líneas nuevas, evita recorrer todo el historial en cada consulta.
+    with _lock:
+        entry = _series.setdefault(file, {"offset": 0, "posiciones": {}})
+        try:
+            with open(history_path(file), "rb") as f:
+                f.seek(entry["offset"])
+                pos = entry["offset"]
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    event = json.loads(line)
+                    filas = event["rows"] if event["op"] == "insert_many" else \
+                        [event["row"]] if event["op"] == "insert" else [{key_col: event.get("id")}]
+                    for fila in filas:
+                        entry["posiciones"].setdefault(str(fila.get(key_col)), []).append(pos)
+                    pos += len(line)
+                entry["offset"] = pos
+        except FileNotFoundError:
+            pass
+        posiciones = list(entry["posiciones"].get(str(key), []))
+        lista = snapshots(file)
+        if lista and entry.get("inicial", (None,))[0] != lista[0][2]:
+            entry["inicial"] = (lista[0][2], lista[0][0], pd.read_pickle(lista[0][2]), lista[0][1])
+        inicial = entry.get("inicial")
+    # Los eventos anteriores al primer snapshot ya están en su estado
+    if inicial is not None:
+        posiciones = [pos for pos in posiciones if pos >= inicial[3]]
+
+    # Punto de partida: el registro en el primer snapshot (si ya existía)
+    filas = []
+    if inicial is not None:
+        previa = inicial[2][inicial[2][key_col].astype(str) == str(key)]
+        if not previa.empty:
+            filas.append(dict({"Fecha": inicial[1].isoformat(), "Cambio": "snapshot"},
+                              **{c: previa[c].iat[-1] for c in fields}))
+    with open(history_path(file), "rb") if posiciones else open(os.devnull, "rb") as f:
+        for pos in posiciones:
+            f.seek(pos)
+            event = json.loads(f.readline())
+            if event["op"] == "update":
+                valores = event["values"]
+            elif event["op"] == "delete":
+                valores = {}
+            else:
+                rows = event["rows"] if event["op"] == "insert_many" else [event["row"]]
+                valores = next(r for r in rows if str(r.get(key_col)) == str(key))
+            filas.append(dict({"Fecha": event["ts"], "Cambio": event["op"]},
+                              **{c: valores[c] for c in fields if c in valores}))
+    df = pd.DataFrame(filas, columns=["Fecha", "Cambio"] + list(fields))
+    df["Fecha"] = pd.to_datetime(df["Fecha"])
+    # Los campos que no cambian en un evento mantienen el valor anterior
+    df[list(fields)] = df[list(fields)].ffill()
+    return df
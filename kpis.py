@@ -0,0 +1,57 @@
+import pandas as pd
+
+# ================================
+# 📐 KPIs DEL PIPELINE
+# ================================
+# Cálculo de los indicadores del Dashboard sobre DataFrames de leads y
+# ofertas ya filtrados, sin Streamlit: lo usan storage (backend CSV), el
+# pipeline a fecha del Dashboard y los informes por lotes (reports.py).
+# Los valores numéricos se convierten con errors="coerce" para que los
+# snapshots antiguos o las columnas object se traten igual que las tipadas.
+LEAD_KPIS = {"total": "Total Leads", "capacidad": "Capacidad Total (MWp)",
+             "produccion": "Producción Total (GWh)", "responsables": "Responsables"}
+OFFER_KPIS = {"total": "Total Ofertas", "volumen": "Volumen Total (MWh)",
+              "precio_medio": "Precio Medio (€/MWh)", "pipeline": "Pipeline Ponderado (€)"}
+
+
+def _num(df, col):
+    return pd.to_numeric(df[col], errors="coerce")
+
+
+def pipeline_value(offers):
+    # Valor ponderado de cada oferta: precio × volumen × probabilidad
+    return _num(offers, "Precio EUR/MWh") * _num(offers, "Volumen MWh") * _num(offers, "Probabilidad (%)") / 100
+
+
+def lead_kpis(leads):
+    return {
+        "total": len(leads),
+        "capacidad": float(_num(leads, "Capacidad").sum()),
+        "produccion": float(_num(leads, "Produccion").sum()),
+        "responsables": int(leads["Responsable"].nunique()),
+    }
+
+
+def offer_kpis(offers):
+    if offers.empty:
+        return {"total": 0, "volumen": 0, "precio_medio": 0, "pipeline": 0}
+    precio_medio = _num(offers, "Precio EUR/MWh").mean()
+    return {
+        "total": len(offers),
+        "volumen": float(_num(offers, "Volumen MWh").sum()),
+        "precio_medio": 0 if pd.isna(precio_medio) else float(precio_medio),
+        "pipeline": float(pipeline_value(offers).sum()),
+    }
+
+
+def breakdown(df, col):
+    # Número de filas por valor de col (sin vacíos), como los gráficos del Dashboard
+    counts = df[col].value_counts(sort=False)
+    counts = counts[(counts > 0) & (counts.index.astype(str) != "")].sort_index()
+    return counts.rename_axis(col).reset_index(name="Cantidad")
+
+
+def pipeline_by(offers, col):
+    # Ofertas y pipeline ponderado por valor de col
+    resumen = pipeline_value(offers).groupby(offers[col], observed=True).agg(["size", "sum"])
+    return resumen.rename(columns={"size": "Ofertas", "sum": "Pipeline Ponderado (€)"}).rename_axis(col)
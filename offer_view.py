@@ -0,0 +1,108 @@
+import threading
+from collections import Counter
+
+from schema import assign_values
+from storage import apply_changes, changes_since, versioned_load
+
+# ================================
+# 🔗 VISTA MATERIALIZADA OFERTAS ⋈ LEADS
+# ================================
+# Ver Ofertas y el Dashboard filtran las ofertas por datos del lead (cliente,
+# responsable, estado). En lugar de hacer el merge en cada rerun, la vista
+# unida se construye una vez por versión de datos y se comparte entre
+# sesiones: un alta o edición solo rehace las filas de las ofertas afectadas.
+# Para cada columna de filtro se mantiene el recuento de valores distintos.
+LEAD_COLS = {"Cliente": "Cliente", "Responsable": "Responsable", "Estado": "Estado Lead"}
+DISTINCT_COLS = ["Estado", "Cliente", "Responsable", "Estado Lead"]
+
+
+def _counts(df):
+    return {col: Counter(df[col].dropna().tolist()) for col in DISTINCT_COLS}
+
+
+class OfferView:
+    # Instantánea inmutable: las sesiones filtran frame pero no lo modifican
+    def __init__(self, frame, distinct):
+        self.frame = frame
+        self._distinct = distinct
+
+    def distinct(self, col):
+        return sorted(v for v, n in self._distinct[col].items() if n > 0)
+
+
+class _JoinedOffers:
+    def __init__(self, leads, offers):
+        self.leads = leads[["ID Lead"] + list(LEAD_COLS)].rename(columns=LEAD_COLS)
+        frame = offers.merge(self.leads, on="ID Lead", how="left")
+        self.frame = frame
+        self.counts = _counts(frame)
+
+    def _lead_lookup(self):
+        return self.leads.drop_duplicates("ID Lead", keep="last").set_index("ID Lead")
+
+    def apply(self, lead_records, offer_records):
+        # Copia al escribir: las sesiones que leen la vista anterior no se ven afectadas
+        lead_records = [self._lead_record(rec) for rec in lead_records]
+        lead_records = [rec for rec in lead_records if rec is not None]
+        if lead_records:
+            self.leads = apply_changes(self.leads.copy(deep=False), lead_records)
+
+        changed_leads = {rec["row"]["ID Lead"] if rec["op"] == "insert" else rec["id"] for rec in lead_records}
+        changed_offers = {rec["row"]["ID Oferta"] if rec["op"] == "insert" else rec["id"] for rec in offer_records}
+        if not changed_leads and not changed_offers:
+            return
+
+        antes = self.frame[self._affected(self.frame, changed_leads, changed_offers)]
+        frame = apply_changes(self.frame.copy(deep=False), offer_records, "offers")
+        afectadas = self._affected(frame, changed_leads, changed_offers)
+        if afectadas.any():
+            lookup = self._lead_lookup().reindex(frame.loc[afectadas, "ID Lead"])
+            assign_values(frame, afectadas, {col: lookup[col].to_numpy() for col in LEAD_COLS.values()})
+
+        for col in DISTINCT_COLS:
+            self.counts[col].subtract(antes[col].dropna().tolist())
+            self.counts[col].update(frame.loc[afectadas, col].dropna().tolist())
+        self.frame = frame
+
+    @staticmethod
+    def _affected(frame, changed_leads, changed_offers):
+        return frame["ID Lead"].isin(changed_leads) | frame["ID Oferta"].isin(changed_offers)
+
+    @staticmethod
+    def _lead_record(rec):
+        # Solo interesan las columnas del lead que aparecen en la vista
+        if rec["op"] == "insert":
+            row = {LEAD_COLS.get(k, k): v for k, v in rec["row"].items() if k == "ID Lead" or k in LEAD_COLS}
+            return dict(rec, row=row)
+        if rec["op"] == "update":
+            values = {LEAD_COLS[k]: v for k, v in rec["values"].items() if k in LEAD_COLS}
+            return dict(rec, values=values) if values else None
+        return rec
+
+
+# Vista compartida por todas las sesiones del proceso
+_lock = threading.Lock()
+_state = {"joined": None, "versions": None, "view": None}
+
+
+def get_offer_view(leads_file, offers_file, load):
+    # load() -> (leads, offers) leídos de storage en ese momento; solo se llama
+    # si hay que reconstruir la vista
+    with _lock:
+        joined, versions = _state["joined"], _state["versions"]
+        if joined is not None:
+            lead_records, lead_version = changes_since(leads_file, versions[0])
+            offer_records, offer_version = changes_since(offers_file, versions[1])
+            if (lead_version, offer_version) == versions:
+                return _state["view"]
+            if lead_records is None or offer_records is None:
+                joined = None
+            else:
+                joined.apply(lead_records, offer_records)
+                versions = (lead_version, offer_version)
+        if joined is None:
+            versions, frames = versioned_load((leads_file, offers_file), load)
+            joined = _JoinedOffers(*frames)
+        view = OfferView(joined.frame, {col: +counts for col, counts in joined.counts.items()})
+        _state.update(joined=joined, versions=versions, view=view)
+        return view
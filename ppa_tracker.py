@@ -1,754 +1,1288 @@
-import os
-from datetime import date
-import pandas as pd
-import plotly.express as px
-import streamlit as st
-
-# --- Configuración de página ---
-st.set_page_config(page_title="Seguimiento PPA", layout="wide")
-
-# ================================
-# 🧩 SISTEMA DE LOGIN BÁSICO
-# ================================
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
-
-if not st.session_state.logged_in:
-    st.title("🔐 Iniciar sesión")
-    user = st.text_input("Usuario")
-    pwd = st.text_input("Contraseña", type="password")
-
-    if st.button("Entrar"):
-        if user == "admin" and pwd == "1234":
-            st.session_state.logged_in = True
-            try:
-                st.rerun()
-            except AttributeError:
-                st.experimental_rerun()
-        else:
-            st.error("Usuario o contraseña incorrectos.")
-    st.stop()
-
-# ================================
-# 🚪 BOTÓN CERRAR SESIÓN
-# ================================
-col_logout = st.columns([9, 1])[1]
-with col_logout:
-    if st.button("🚪 Cerrar sesión"):
-        for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        st.success("✅ Sesión cerrada correctamente.")
-        st.stop()
-
-# ================================
-# 📊 APLICACIÓN PRINCIPAL
-# ================================
-LEADS_FILE = "leads.csv"
-OFFERS_FILE = "offers.csv"
-CLIENTS_FILE = "clients.csv"
-DOCS_DIR = "docs"
-os.makedirs(DOCS_DIR, exist_ok=True)
-
-def load_data(file, cols):
-    if os.path.exists(file):
-        df = pd.read_csv(file)
-        for col in cols:
-            if col not in df.columns:
-                df[col] = ""
-        return df
-    else:
-        return pd.DataFrame(columns=cols)
-
-def save_uploaded_file(uploaded_file, entity, entity_id):
-    file_path = os.path.join(DOCS_DIR, f"{entity}_{entity_id}_{uploaded_file.name}")
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return file_path
-
-def convert_df(df):
-    return df.to_csv(index=False).encode("utf-8")
-
-# --- Cargar datos ---
-leads = load_data(LEADS_FILE, ["ID Lead", "ID Cliente", "Cliente", "Contacto", "Estado","Tecnologia", "Tipo PPA","Duracion",
-                               "Fecha Alta", "Capacidad","Ubicacion","Produccion","Responsable", "Notas", "Docs"])
-offers = load_data(OFFERS_FILE, ["ID Oferta", "ID Lead", "Fecha Oferta", "Precio EUR/MWh",
-                                 "Volumen MWh", "Probabilidad (%)", "Estado", "Notas", "Docs"])
-clients = load_data(CLIENTS_FILE, ["ID Cliente", "Nombre", "CIF/NIF", "Dirección", "Ciudad", "Provincia",
-                                   "País", "Tipo", "Sector", "Notas", "Docs"])
-
-st.title("📊 PPA Tracker")
-
-# ================================
-# 🗂️ PESTAÑAS PRINCIPALES
-# ================================
-tabs = st.tabs([
-    "👥 Clientes / Contrapartes",
-    "➕ Añadir Lead",
-    "➕ Añadir Oferta",
-    "✏️ Editar Lead",
-    "✏️ Editar Oferta",
-    "📁 Ver Leads",
-    "💼 Ver Ofertas",
-    "📈 Dashboard"
-])
-
-# =======================
-# TAB 1: CLIENTES / CONTRAPARTES
-# =======================
-with tabs[0]:
-    st.header("👥 Gestión de Clientes / Contrapartes")
-
-    # Inicializar flag si no existe
-    if "reset_client_form" not in st.session_state:
-        st.session_state.reset_client_form = False
-
-    # Variables vacías si hay que resetear el formulario
-    default_values = {
-        "nombre": "",
-        "cif": "",
-        "direccion": "",
-        "ciudad": "",
-        "provincia": "",
-        "tipo_cliente": "Productor",
-        "sector": "",
-        "notas_cliente": ""
-    }
-
-    # Si hay que limpiar, asignamos valores vacíos
-    if st.session_state.reset_client_form:
-        for k, v in default_values.items():
-            st.session_state[k] = v
-        st.session_state.reset_client_form = False  # desactivar flag
-
-    with st.form("form_client"):
-        nombre = st.text_input("Nombre o Razón Social", key="nombre")
-        cif = st.text_input("CIF / NIF", key="cif")
-        direccion = st.text_input("Dirección", key="direccion")
-        ciudad = st.text_input("Ciudad", key="ciudad")
-        provincia = st.text_input("Provincia", key="provincia")
-        pais = "España"
-        tipo = st.selectbox(
-            "Tipo de Cliente",
-            ["Productor", "Consumidor", "Trader", "Otro"],
-            key="tipo_cliente"
-        )
-        sector = st.text_input("Sector", key="sector")
-        notas = st.text_area("Notas adicionales", key="notas_cliente")
-
-        submit_client = st.form_submit_button("Guardar Cliente")
-
-        if submit_client:
-            new_id = len(clients) + 1
-            clients.loc[len(clients)] = [
-                new_id, nombre, cif, direccion, ciudad, provincia, pais, tipo, sector, notas, ""
-            ]
-            clients.to_csv(CLIENTS_FILE, index=False)
-            st.success(f"✅ Cliente '{nombre}' añadido correctamente.")
-
-            # ✅ Activamos el reset para limpiar los campos en esta misma vista
-            st.session_state.reset_client_form = True
-            st.experimental_set_query_params(_="refresh")  # pequeño truco para forzar redibujo
-            st.rerun()
-
-    st.subheader("📋 Clientes Registrados (España)")
-    filtro_nombre = st.text_input("Filtrar por nombre de cliente:")
-    filtro_tipo = st.selectbox("Filtrar por tipo:", ["Todos"] + clients["Tipo"].dropna().unique().tolist())
-
-    df = clients.copy()
-    if filtro_nombre:
-        df = df[df["Nombre"].str.contains(filtro_nombre, case=False, na=False)]
-    if filtro_tipo != "Todos":
-        df = df[df["Tipo"] == filtro_tipo]
-    st.dataframe(df, use_container_width=True)
-
-    st.download_button(
-        "⬇️ Descargar Clientes (CSV)",
-        data=convert_df(df),
-        file_name="clientes.csv",
-        mime="text/csv"
-    )
-
-
-
-# =======================
-# TAB 2: Añadir Lead
-# =======================
-with tabs[1]:
-    st.header("➕ Añadir Lead")
-    with st.form("form_lead"):
-        cliente = st.selectbox("Cliente / Contraparte", clients["Nombre"]) if not clients.empty else st.text_input(
-            "Cliente (no hay clientes aún)")
-        cliente_id = clients.loc[clients["Nombre"] == cliente, "ID Cliente"].values[0] if not clients.empty else ""
-        contacto = st.text_input("Contacto / Email")
-        estado = st.selectbox("Estado", ["Nuevo", "En curso", "Negociación", "Cerrado Ganado", "Cerrado Perdido"])
-        tecnologia = st.selectbox("Tecnología", ["Solar", "Eólica", "Solar+BESS", "Otro"])
-        tipo = st.selectbox("Tipo PPA", ["Pay-as-Produced", "Solar Profile", "Baseload Solar", "Otro"])
-        duracion = st.number_input("Duración (años)", min_value=5, max_value=15, value=10, step=1)
-        fecha = st.date_input("Fecha Alta", value=date.today())
-        capacidad = st.number_input("Capacidad nominal (MWp)", min_value=0.0, step=0.1)
-        ubicacion = st.text_input("Ubicación del proyecto")
-        produccion = st.number_input("Producción anual (GWh/año)", min_value=0.0, step=0.1)
-        resp = st.text_input("Responsable")
-        notas = st.text_area("Notas")
-        submit_lead = st.form_submit_button("Guardar Lead")
-
-        if submit_lead:
-            new_id = len(leads) + 1
-            leads.loc[len(leads)] = [new_id, cliente_id, cliente, contacto, estado,tecnologia,tipo,duracion, fecha,capacidad,ubicacion,produccion, resp, notas, ""]
-            leads.to_csv(LEADS_FILE, index=False)
-            st.success(f"✅ Lead {new_id} añadido con éxito")
-
-# =======================
-# TAB 3: Añadir Oferta
-# =======================
-with tabs[2]:
-    st.header("➕ Añadir Oferta")
-    with st.form("form_offer"):
-        id_lead = st.number_input("ID Lead asociado", min_value=1, step=1)
-        fecha = st.date_input("Fecha Oferta", value=date.today())
-        precio = st.number_input("Precio (EUR/MWh)", min_value=0.0, step=0.1)
-        volumen = st.number_input("Volumen (MWh)", min_value=0.0, step=100.0)
-        prob = st.slider("Probabilidad (%)", 0, 100, 50)
-        estado = st.selectbox("Estado Oferta", ["Enviada", "En negociación", "Aprobada", "Rechazada", "Cerrada"])
-        notas = st.text_area("Notas")
-        submit_offer = st.form_submit_button("Guardar Oferta")
-
-        if submit_offer:
-            new_id = 100 + len(offers) + 1
-            offers.loc[len(offers)] = [new_id, id_lead, fecha, precio, volumen, prob, estado, notas, ""]
-            offers.to_csv(OFFERS_FILE, index=False)
-            st.success(f"✅ Oferta {new_id} añadida con éxito")
-
-# =======================
-# TAB 4: Editar Lead
-# =======================
-with tabs[3]:
-    st.header("✏️ Editar Lead")
-    if not leads.empty:
-        lead_id = st.selectbox("Selecciona Lead por ID", leads["ID Lead"])
-        lead_row = leads[leads["ID Lead"] == lead_id].iloc[0]
-
-        cliente = st.text_input("Cliente", value=lead_row["Cliente"], key=f"edit_cliente_{lead_id}")
-        contacto = st.text_input("Contacto", value=lead_row["Contacto"], key=f"edit_contacto_{lead_id}")
-        estado = st.selectbox(
-            "Estado",
-            ["Nuevo", "En curso", "Negociación", "Cerrado Ganado", "Cerrado Perdido"],
-            index=["Nuevo", "En curso", "Negociación", "Cerrado Ganado", "Cerrado Perdido"].index(lead_row["Estado"]),
-            key=f"edit_estado_{lead_id}"
-        )
-
-        tecnologia = st.selectbox(
-            "Tecnología",
-            ["Solar", "Eólica", "Solar+BESS", "Otro"],
-            index=["Solar", "Eólica", "Solar+BESS", "Otro"].index(lead_row.get("Tecnologia", "Solar"))
-        )
-
-        tipo = st.selectbox(
-            "Tipo PPA",
-            ["Pay-as-Produced", "Solar Profile", "Baseload Solar", "Otro"],
-            index=["Pay-as-Produced", "Solar Profile", "Baseload Solar", "Otro"].index(lead_row["Tipo PPA"]),
-            key=f"edit_tipo_{lead_id}"
-        )
-
-        duracion = st.number_input(
-            "Duración (años)",
-            min_value=5,
-            max_value=15,
-            value=int(lead_row.get("Duracion", 10)),
-            step=1,
-            key=f"edit_duracion_{lead_id}"
-        )
-
-        # 🆕 Campos añadidos
-        capacidad = st.number_input(
-            "Capacidad nominal (MWp)",
-            min_value=0.0,
-            step=0.1,
-            value=float(lead_row.get("Capacidad", 0.0) or 0.0),
-            key=f"edit_capacidad_{lead_id}"
-        )
-
-        ubicacion = st.text_input(
-            "Ubicación del proyecto",
-            value=lead_row.get("Ubicacion", ""),
-            key=f"edit_ubicacion_{lead_id}"
-        )
-
-        produccion = st.number_input(
-            "Producción anual (GWh/año)",
-            min_value=0.0,
-            step=0.1,
-            value=float(lead_row.get("Produccion", 0.0) or 0.0),
-            key=f"edit_produccion_{lead_id}"
-        )
-
-        resp = st.text_input("Responsable", value=lead_row["Responsable"], key=f"edit_resp_{lead_id}")
-        notas = st.text_area("Notas", value=lead_row["Notas"], key=f"edit_notas_{lead_id}")
-
-        # Adjuntar nuevo documento
-        uploaded = st.file_uploader(
-            "Adjuntar documento (Contrato/KYC/etc)",
-            type=["pdf", "docx", "xlsx"],
-            key=f"upload_lead_{lead_id}"
-        )
-
-        # Lista de documentos existentes
-        current_docs_list = [doc for doc in str(lead_row.get("Docs", "")).split(";") if doc]
-        if current_docs_list:
-            docs_to_delete = st.multiselect(
-                "Borrar documentos existentes",
-                options=current_docs_list,
-                key=f"delete_docs_lead_{lead_id}"
-            )
-        else:
-            docs_to_delete = []
-
-        if st.button("💾 Guardar cambios Lead", key=f"save_lead_{lead_id}"):
-            # Eliminar archivos seleccionados
-            for doc in docs_to_delete:
-                if os.path.exists(doc):
-                    os.remove(doc)
-            # Actualizar columna Docs
-            remaining_docs = [d for d in current_docs_list if d not in docs_to_delete]
-
-            # Agregar nuevo archivo si se sube
-            if uploaded:
-                file_path = save_uploaded_file(uploaded, "lead", lead_id)
-                remaining_docs.append(file_path)
-
-            leads.loc[
-                leads["ID Lead"] == lead_id,
-                ["Cliente", "Contacto", "Estado", "Tipo PPA","Duracion","Tecnologia","Capacidad","Ubicacion","Produccion",  "Responsable", "Notas", "Docs"]
-            ] = [cliente, contacto, estado, tipo, duracion,tecnologia,capacidad,ubicacion,produccion, resp, notas, ";".join(remaining_docs)]
-
-            leads.to_csv(LEADS_FILE, index=False)
-            st.success("✅ Lead actualizado")
-
-
-# =======================
-# TAB 5: Editar Oferta
-# =======================
-with tabs[4]:
-    st.header("✏️ Editar Oferta")
-    if not offers.empty:
-        offer_id = st.selectbox("Selecciona Oferta por ID", offers["ID Oferta"])
-        offer_row = offers[offers["ID Oferta"] == offer_id].iloc[0]
-
-        precio = st.number_input(
-            "Precio EUR/MWh",
-            value=float(offer_row["Precio EUR/MWh"]),
-            key=f"edit_precio_{offer_id}"
-        )
-        volumen = st.number_input(
-            "Volumen MWh",
-            value=float(offer_row["Volumen MWh"]),
-            key=f"edit_volumen_{offer_id}"
-        )
-        prob = st.slider(
-            "Probabilidad (%)",
-            0, 100,
-            int(offer_row["Probabilidad (%)"]),
-            key=f"edit_prob_{offer_id}"
-        )
-        estado = st.selectbox(
-            "Estado",
-            ["Enviada", "En negociación", "Aprobada", "Rechazada", "Cerrada"],
-            index=["Enviada", "En negociación", "Aprobada", "Rechazada", "Cerrada"].index(offer_row["Estado"]),
-            key=f"edit_estado_offer_{offer_id}"
-        )
-        notas = st.text_area("Notas", value=offer_row["Notas"], key=f"edit_notas_offer_{offer_id}")
-
-        # Adjuntar nuevo documento
-        uploaded_offer = st.file_uploader(
-            "Adjuntar documento Oferta (Contrato, etc)",
-            type=["pdf", "docx", "xlsx"],
-            key=f"upload_offer_{offer_id}"
-        )
-
-        # Lista de documentos existentes
-        current_docs_list = [doc for doc in str(offer_row.get("Docs", "")).split(";") if doc]
-        if current_docs_list:
-            docs_to_delete = st.multiselect(
-                "Borrar documentos existentes",
-                options=current_docs_list,
-                key=f"delete_docs_offer_{offer_id}"
-            )
-        else:
-            docs_to_delete = []
-
-        if st.button("💾 Guardar cambios Oferta", key=f"save_offer_{offer_id}"):
-            # Eliminar archivos seleccionados
-            for doc in docs_to_delete:
-                if os.path.exists(doc):
-                    os.remove(doc)
-            # Actualizar columna Docs
-            remaining_docs = [d for d in current_docs_list if d not in docs_to_delete]
-
-            # Agregar nuevo archivo si se sube
-            if uploaded_offer:
-                file_path = save_uploaded_file(uploaded_offer, "offer", offer_id)
-                remaining_docs.append(file_path)
-
-            offers.loc[
-                offers["ID Oferta"] == offer_id,
-                ["Precio EUR/MWh", "Volumen MWh", "Probabilidad (%)", "Estado", "Notas", "Docs"]
-            ] = [precio, volumen, prob, estado, notas, ";".join(remaining_docs)]
-
-            offers.to_csv(OFFERS_FILE, index=False)
-            st.success("✅ Oferta actualizada")
-
-
-
-# =======================
-# TAB 7: Ver Leads
-# =======================
-with tabs[5]:
-    st.header("📁 Ver Leads")
-    filtro_cliente = st.text_input(
-        "Filtrar por Cliente (nombre):",
-        key="filtro_cliente_leads"
-    )
-    filtro_estado = st.selectbox(
-        "Filtrar por Estado:",
-        ["Todos"] + leads["Estado"].dropna().unique().tolist(),
-        key="filtro_estado_leads"
-    )
-
-    df = leads.copy()
-    if filtro_cliente:
-        df = df[df["Cliente"].str.contains(filtro_cliente, case=False, na=False)]
-    if filtro_estado != "Todos":
-        df = df[df["Estado"] == filtro_estado]
-
-    st.dataframe(df.drop(columns=["Docs"]), use_container_width=True)
-
-    st.subheader("📂 Documentación adjunta por Lead")
-    for _, row in df.iterrows():
-        docs = [doc for doc in str(row.get("Docs", "")).split(";") if doc and os.path.exists(doc)]
-        if docs:
-            st.markdown(f"### 👤 {row['Cliente']}")
-            for i, doc in enumerate(docs):
-                file_name = os.path.basename(doc)
-                with open(doc, "rb") as f:
-                    st.download_button(
-                        label=f"📎 Descargar {file_name}",
-                        data=f.read(),
-                        file_name=file_name,
-                        mime="application/octet-stream",
-                        key=f"download_lead_{row['ID Lead']}_{i}_{file_name}"  # key único por documento
-                    )
-
-    st.download_button(
-        "⬇️ Descargar Leads (CSV)",
-        data=convert_df(df),
-        file_name="leads_filtrados.csv",
-        mime="text/csv",
-        key="download_leads_csv"
-    )
-
-
-# =======================
-# TAB 8: Ver Ofertas
-# =======================
-with tabs[6]:
-    st.header("💼 Ver Ofertas")
-
-    # Filtro por estado de la oferta
-    filtro_estado_offer = st.selectbox(
-        "Filtrar por Estado:",
-        ["Todos"] + offers["Estado"].dropna().unique().tolist(),
-        key="filtro_estado_offer"
-    )
-
-    # Hacer merge para obtener nombre del cliente
-    df = offers.merge(leads[["ID Lead", "Cliente"]], on="ID Lead", how="left")
-
-    # Filtro por cliente
-    clientes_disponibles = ["Todos"] + sorted(df["Cliente"].dropna().unique().tolist())
-    filtro_cliente = st.selectbox(
-        "Filtrar por Cliente:",
-        clientes_disponibles,
-        key="filtro_cliente_offer"
-    )
-
-    # Aplicar filtros
-    if filtro_estado_offer != "Todos":
-        df = df[df["Estado"] == filtro_estado_offer]
-    if filtro_cliente != "Todos":
-        df = df[df["Cliente"] == filtro_cliente]
-
-    # Mostrar dataframe incluyendo la columna Cliente
-    st.dataframe(df.drop(columns=["Docs"]), use_container_width=True)
-
-    st.subheader("📂 Documentación adjunta por Oferta")
-    for _, row in df.iterrows():
-        docs = [doc for doc in str(row.get("Docs", "")).split(";") if doc and os.path.exists(doc)]
-        if docs:
-            st.markdown(f"### 🧾 Oferta ID {row['ID Oferta']} — Lead {row['ID Lead']} — Cliente: {row['Cliente']}")
-            for i, doc in enumerate(docs):
-                file_name = os.path.basename(doc)
-                with open(doc, "rb") as f:
-                    st.download_button(
-                        label=f"📎 Descargar {file_name}",
-                        data=f.read(),
-                        file_name=file_name,
-                        mime="application/octet-stream",
-                        key=f"download_offer_{row['ID Oferta']}_{i}_{file_name}"  # key único por documento
-                    )
-
-    st.download_button(
-        "⬇️ Descargar Ofertas (CSV)",
-        data=convert_df(df),
-        file_name="ofertas_filtradas.csv",
-        mime="text/csv",
-        key="download_offers_csv"
-    )
-
-
-
-
-# =======================
-# TAB 8: DASHBOARD CORPORATIVO (LIGHT THEME con filtros desplegables)
-# =======================
-with tabs[7]:
-    st.markdown("""
-        <style>
-        body, .stApp {
-            background-color: #f7f9fb;
-            color: #2c3e50;
-        }
-        .metric-card {
-            background: linear-gradient(135deg, #ffffff 0%, #eaf2f8 100%);
-            border: 1px solid #dce3ea;
-            border-radius: 15px;
-            padding: 20px;
-            text-align: center;
-            box-shadow: 0 2px 6px rgba(0,0,0,0.1);
-        }
-        .metric-title {
-            font-size: 15px;
-            color: #6c757d;
-        }
-        .metric-value {
-            font-size: 26px;
-            font-weight: 700;
-            color: #1b263b;
-            margin-top: 6px;
-        }
-        .section-title {
-            font-size: 22px;
-            font-weight: 600;
-            color: #005f73;
-            margin-top: 40px;
-            margin-bottom: 10px;
-        }
-        </style>
-    """, unsafe_allow_html=True)
-
-    st.title("Seguimiento PPA")
-
-    # -----------------------------
-    # 🎛️ FILTROS LATERALES
-    # -----------------------------
-    with st.sidebar:
-        st.header("🎚️ Filtros globales Dashboard")
-
-        responsable_filtro = st.selectbox(
-            "Responsable",
-            ["Todos"] + sorted(leads["Responsable"].dropna().unique().tolist())
-        ) if not leads.empty else "Todos"
-
-        cliente_lista = sorted(leads["Cliente"].dropna().unique().tolist()) if not leads.empty else []
-        cliente_filtro = st.selectbox(
-            "Cliente / Contraparte (Leads)",
-            ["Todos"] + cliente_lista
-        )
-
-        estado_lead_filtro = st.selectbox(
-            "Estado Lead",
-            ["Todos", "Nuevo", "En curso", "Negociación", "Cerrado Ganado", "Cerrado Perdido"]
-        )
-
-        estado_offer_filtro = st.selectbox(
-            "Estado Oferta",
-            ["Todos", "Enviada", "En negociación", "Aprobada", "Rechazada", "Cerrada"]
-        )
-
-    # ===============================
-    # 👥 DASHBOARD DE LEADS
-    # ===============================
-    st.markdown('<div class="section-title">👥 Dashboard de Leads</div>', unsafe_allow_html=True)
-
-    leads_filtrados = leads.copy()
-    if responsable_filtro != "Todos":
-        leads_filtrados = leads_filtrados[leads_filtrados["Responsable"] == responsable_filtro]
-    if estado_lead_filtro != "Todos":
-        leads_filtrados = leads_filtrados[leads_filtrados["Estado"] == estado_lead_filtro]
-    if cliente_filtro != "Todos":
-        leads_filtrados = leads_filtrados[leads_filtrados["Cliente"] == cliente_filtro]
-
-    # --- KPIs
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Total Leads</div>
-                <div class="metric-value">{len(leads_filtrados):,}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col2:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Capacidad Total (MWp)</div>
-                <div class="metric-value">{round(leads_filtrados["Capacidad"].sum(),2) if not leads_filtrados.empty else 0}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col3:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Producción Total (GWh)</div>
-                <div class="metric-value">{round(leads_filtrados["Produccion"].sum(),2) if not leads_filtrados.empty else 0}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col4:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Responsables Activos</div>
-                <div class="metric-value">{leads_filtrados["Responsable"].nunique()}</div>
-            </div>
-        """, unsafe_allow_html=True)
-
-    if not leads_filtrados.empty:
-        fig_estado = px.pie(
-            leads_filtrados, names="Estado",
-            title="Distribución por Estado", hole=0.4,
-            color_discrete_sequence=px.colors.qualitative.Pastel
-        )
-        fig_estado.update_layout(template="plotly_white")
-
-        fig_tec = px.bar(
-            leads_filtrados.groupby("Tecnologia").size().reset_index(name="Cantidad"),
-            x="Tecnologia", y="Cantidad", title="Leads por Tecnología",
-            color="Tecnologia", color_discrete_sequence=px.colors.qualitative.Safe
-        )
-        fig_tec.update_layout(template="plotly_white")
-
-        colA, colB = st.columns(2)
-        colA.plotly_chart(fig_estado, use_container_width=True)
-        colB.plotly_chart(fig_tec, use_container_width=True)
-
-        fig_resp = px.bar(
-            leads_filtrados.groupby("Responsable").size().reset_index(name="Cantidad"),
-            x="Responsable", y="Cantidad", title="Leads por Responsable",
-            color="Responsable", color_discrete_sequence=px.colors.qualitative.Pastel
-        )
-        fig_resp.update_layout(template="plotly_white")
-        st.plotly_chart(fig_resp, use_container_width=True)
-
-        st.markdown("### 📋 Detalle de Leads Filtrados")
-        st.dataframe(
-            leads_filtrados[
-                ["ID Lead", "Cliente", "Estado", "Tecnologia", "Tipo PPA", "Duracion", "Capacidad", "Produccion", "Responsable"]
-            ],
-            use_container_width=True
-        )
-    else:
-        st.info("No hay leads con los filtros seleccionados.")
-
-
-    # ===============================
-    # 💼 DASHBOARD DE OFERTAS
-    # ===============================
-    st.markdown('<div class="section-title">💼 Dashboard de Ofertas</div>', unsafe_allow_html=True)
-
-    # Lista de contrapartes desde ofertas (vinculadas con leads)
-    ofertas_con_clientes = offers.merge(leads[["ID Lead", "Cliente"]], on="ID Lead", how="left")
-    cliente_lista_offers = sorted(ofertas_con_clientes["Cliente"].dropna().unique().tolist())
-    cliente_offer_filtro = st.sidebar.selectbox(
-        "Cliente / Contraparte (Ofertas)",
-        ["Todos"] + cliente_lista_offers
-    )
-
-    offers_filtrados = ofertas_con_clientes.copy()
-    if estado_offer_filtro != "Todos":
-        offers_filtrados = offers_filtrados[offers_filtrados["Estado"] == estado_offer_filtro]
-    if cliente_offer_filtro != "Todos":
-        offers_filtrados = offers_filtrados[offers_filtrados["Cliente"] == cliente_offer_filtro]
-    if responsable_filtro != "Todos":
-        offers_filtrados = offers_filtrados[offers_filtrados["ID Lead"].isin(leads_filtrados["ID Lead"])]
-
-    total_ofertas = len(offers_filtrados)
-    volumen_total = offers_filtrados["Volumen MWh"].sum() if not offers_filtrados.empty else 0
-    precio_medio = offers_filtrados["Precio EUR/MWh"].mean() if not offers_filtrados.empty else 0
-    pipeline = (offers_filtrados["Precio EUR/MWh"] * offers_filtrados["Volumen MWh"] * (offers_filtrados["Probabilidad (%)"]/100)).sum() if not offers_filtrados.empty else 0
-
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Total Ofertas</div>
-                <div class="metric-value">{total_ofertas:,}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col2:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Volumen Total (MWh)</div>
-                <div class="metric-value">{round(volumen_total,2)}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col3:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Precio Medio (€/MWh)</div>
-                <div class="metric-value">{round(precio_medio,2)}</div>
-            </div>
-        """, unsafe_allow_html=True)
-    with col4:
-        st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-title">Pipeline Ponderado (€)</div>
-                <div class="metric-value">{round(pipeline,2):,}</div>
-            </div>
-        """, unsafe_allow_html=True)
-
-    if not offers_filtrados.empty:
-        fig_estado_offer = px.bar(
-            offers_filtrados.groupby("Estado").size().reset_index(name="Cantidad"),
-            x="Estado", y="Cantidad", title="Ofertas por Estado",
-            color="Estado", color_discrete_sequence=px.colors.qualitative.Safe
-        )
-        fig_estado_offer.update_layout(template="plotly_white")
-
-        fig_precio_estado = px.box(
-            offers_filtrados, x="Estado", y="Precio EUR/MWh",
-            title="Precio por Estado de Oferta",
-            color="Estado", color_discrete_sequence=px.colors.qualitative.Vivid
-        )
-        fig_precio_estado.update_layout(template="plotly_white")
-
-        colA, colB = st.columns(2)
-        colA.plotly_chart(fig_estado_offer, use_container_width=True)
-        colB.plotly_chart(fig_precio_estado, use_container_width=True)
-
-        fig_prob = px.histogram(
-            offers_filtrados, x="Probabilidad (%)", nbins=10,
-            title="Distribución de Probabilidades",
-            color_discrete_sequence=["#0077b6"]
-        )
-        fig_prob.update_layout(template="plotly_white")
-        st.plotly_chart(fig_prob, use_container_width=True)
-
-        st.markdown("### 📋 Detalle de Ofertas Filtradas")
-        st.dataframe(
-            offers_filtrados[[
-                "ID Oferta", "Cliente", "ID Lead", "Estado", "Precio EUR/MWh", "Volumen MWh", "Probabilidad (%)"
-            ]],
-            use_container_width=True
-        )
-    else:
-        st.info("No hay ofertas con los filtros seleccionados.")
-
-
-
-
+import os
+from datetime import date
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+from bulk_import import commit_import, validate_file
+from charts import (box_figure, box_stats, figure_cache_stats, get_figure, histogram_bins,
+                    histogram_figure)
+from cube import get_cube_view
+from doc_jobs import EN_COLA, PROCESANDO, document_info, job_status, pending_jobs, submit_upload
+from documents import DOCS_DIR, delete_document, list_attachments, read_document
+from exports import FORMATS, available_formats, export_file
+from forecast import N_SCENARIOS, SCENARIO_OPTIONS, get_forecast
+from history import as_of, field_history, maybe_snapshot
+from kpis import lead_kpis, offer_kpis, pipeline_by
+from offer_view import get_offer_view
+from profiles import daily_shape, get_profiles, monthly, shape_risk
+from schema import (ESTADOS_LEAD, ESTADOS_OFERTA, TECNOLOGIAS, TIPOS_CLIENTE, TIPOS_PPA, assign_values,
+                    columns)
+from search import SEARCH_FIELDS, matching_ids, search_rows, warm_index
+from session_memory import MAX_RECORDS, release_upload, session_memory, touch_record, upload_key
+from storage import (VERSION_COL, ConflictError, cache_stats, data_version, filter_data, filter_offers, insert_row,
+                     load_data, lookup_row, next_id, page_data, update_row)
+from tracing import TRACE_FILE, finish_trace, latency_stats, span, start_trace
+
+# --- Configuración de página ---
+st.set_page_config(page_title="Seguimiento PPA", layout="wide")
+
+# ================================
+# 🧩 SISTEMA DE LOGIN BÁSICO
+# ================================
+if "logged_in" not in st.session_state:
+    st.session_state.logged_in = False
+
+if not st.session_state.logged_in:
+    st.title("🔐 Iniciar sesión")
+    user = st.text_input("Usuario")
+    pwd = st.text_input("Contraseña", type="password")
+
+    if st.button("Entrar"):
+        if user == "admin" and pwd == "1234":
+            st.session_state.logged_in = True
+            st.session_state.usuario = user
+            try:
+                st.rerun()
+            except AttributeError:
+                st.experimental_rerun()
+        else:
+            st.error("Usuario o contraseña incorrectos.")
+    st.stop()
+
+# ================================
+# 🚪 BOTÓN CERRAR SESIÓN
+# ================================
+col_logout = st.columns([9, 1])[1]
+with col_logout:
+    if st.button("🚪 Cerrar sesión"):
+        for key in list(st.session_state.keys()):
+            del st.session_state[key]
+        st.success("✅ Sesión cerrada correctamente.")
+        st.stop()
+
+# ================================
+# 📊 APLICACIÓN PRINCIPAL
+# ================================
+# Traza de tiempos de este rerun (ver tracing.py); se cierra tras pintar la vista
+start_trace()
+ADMINS = {"admin"}
+LEADS_FILE = "leads.csv"
+OFFERS_FILE = "offers.csv"
+CLIENTS_FILE = "clients.csv"
+os.makedirs(DOCS_DIR, exist_ok=True)
+
+# Columnas y tipos de cada tabla: ver schema.py
+LEADS_COLS = columns("leads")
+OFFERS_COLS = columns("offers")
+CLIENTS_COLS = columns("clients")
+
+def apply_doc_changes(borrar, uploaded_file, entity, entity_id):
+    # Adjuntos del índice se desvinculan (el blob se borra si nadie más lo usa);
+    # las rutas antiguas de la columna "Docs" se borran del disco
+    for _, doc in borrar.iterrows():
+        if pd.notna(doc["ID Doc"]):
+            delete_document(int(doc["ID Doc"]))
+        elif os.path.exists(doc["Ruta"]):
+            os.remove(doc["Ruta"])
+    if uploaded_file:
+        # El blob y el índice se guardan ya; la extracción de texto va en segundo plano (doc_jobs.py)
+        submit_upload(uploaded_file, entity, entity_id)
+
+def convert_df(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+def render_attachments(adjuntos, etiqueta, key):
+    # Solo se lista la metadata; el fichero se lee al pulsar "Preparar descarga"
+    if adjuntos.empty:
+        st.info("No hay documentos adjuntos con los filtros seleccionados.")
+        return
+    seleccion = st.selectbox(
+        "Documento",
+        range(len(adjuntos)),
+        format_func=lambda i: etiqueta(adjuntos.iloc[i]),
+        key=f"doc_sel_{key}"
+    )
+    ruta = adjuntos["Ruta"].iat[seleccion]
+    nombre = adjuntos["Archivo"].iat[seleccion]
+
+    # Páginas y vista previa del procesado en segundo plano (solo adjuntos del índice)
+    info = document_info(os.path.basename(ruta)) if pd.notna(adjuntos["ID Doc"].iat[seleccion]) else None
+    if info:
+        paginas = f"{info['paginas']} páginas · " if info["paginas"] is not None else ""
+        st.caption(f"📄 {paginas}{info['caracteres']:,} caracteres de texto")
+        if info["vista_previa"] or info["miniatura"]:
+            with st.expander("👁️ Vista previa"):
+                if info["miniatura"] and os.path.exists(info["miniatura"]):
+                    st.image(info["miniatura"])
+                st.text(info["vista_previa"])
+
+    # El contenido preparado se guarda solo para el documento seleccionado
+    preparado = st.session_state.get(f"doc_data_{key}")
+    if preparado and preparado[0] != ruta:
+        del st.session_state[f"doc_data_{key}"]
+        preparado = None
+
+    if preparado is None and st.button("📥 Preparar descarga", key=f"doc_prepare_{key}"):
+        if not os.path.exists(ruta):
+            st.warning(f"⚠️ El fichero {nombre} ya no existe en el servidor.")
+            return
+        preparado = (ruta, read_document(ruta))
+        st.session_state[f"doc_data_{key}"] = preparado
+
+    if preparado:
+        st.download_button(
+            label=f"📎 Descargar {nombre}",
+            data=preparado[1],
+            file_name=nombre,
+            mime="application/octet-stream",
+            key=f"doc_download_{key}"
+        )
+
+def render_export(df, etiqueta, nombre, key, clave):
+    # El fichero solo se genera al pulsar "Preparar exportación" y se reutiliza
+    # mientras no cambien los filtros ni los datos (clave)
+    col_fmt, col_btn = st.columns([2, 1])
+    formato = col_fmt.selectbox("Formato de exportación", available_formats(), key=f"export_fmt_{key}")
+    clave = (key, clave, formato)
+
+    preparado = st.session_state.get(f"export_{key}")
+    if preparado and preparado[0] != clave:
+        del st.session_state[f"export_{key}"]
+        preparado = None
+
+    if preparado is None and col_btn.button("📦 Preparar exportación", key=f"export_prepare_{key}"):
+        with span("exportacion"):
+            preparado = (clave, export_file(df.drop(columns=[VERSION_COL], errors="ignore"), formato, clave[:2]))
+        st.session_state[f"export_{key}"] = preparado
+
+    if preparado:
+        extension, mime = FORMATS[formato]
+        try:
+            with open(preparado[1], "rb") as f:
+                descargado = st.download_button(
+                    f"⬇️ Descargar {etiqueta} ({formato})",
+                    data=f,
+                    file_name=nombre + extension,
+                    mime=mime,
+                    key=f"export_download_{key}"
+                )
+        except FileNotFoundError:
+            descargado = True
+            st.warning("⚠️ La exportación ha caducado; vuelve a prepararla.")
+        if descargado:
+            del st.session_state[f"export_{key}"]
+
+def render_jobs(entity, entity_ids, key):
+    # Estado de los documentos subidos que se procesan en segundo plano
+    trabajos = job_status(entity, entity_ids)
+    if trabajos.empty:
+        return
+    with st.expander(f"⚙️ Procesado de documentos ({pending_jobs()} pendientes en el servidor)",
+                     expanded=trabajos["Estado"].isin([EN_COLA, PROCESANDO]).any()):
+        st.dataframe(trabajos.drop(columns="ID Trabajo"), use_container_width=True, hide_index=True)
+        st.button("🔄 Actualizar estado", key=f"jobs_refresh_{key}")
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+def render_table(df, key, columns=None):
+    # Paginación y orden en el servidor: el navegador solo recibe la página visible
+    # y solo se copian las filas (y columnas) de esa página
+    columns = list(df.columns) if columns is None else columns
+    total = len(df)
+    col_tam, col_orden, col_dir, col_pag = st.columns([1, 2, 1, 1])
+    page_size = col_tam.selectbox("Filas por página", PAGE_SIZES, key=f"page_size_{key}")
+    sort_by = col_orden.selectbox("Ordenar por", ["—"] + columns, key=f"sort_by_{key}")
+    ascending = col_dir.radio("Orden", ["Asc", "Desc"], horizontal=True, key=f"sort_dir_{key}") == "Asc"
+
+    paginas = max(1, -(-total // page_size))
+    if st.session_state.get(f"page_{key}", 1) > paginas:
+        st.session_state[f"page_{key}"] = paginas  # los filtros han reducido el resultado
+    page = col_pag.number_input("Página", min_value=1, max_value=paginas, step=1, key=f"page_{key}")
+
+    with span("tabla"):
+        pagina = page_data(df, page, page_size, None if sort_by == "—" else sort_by, ascending)[columns]
+        st.dataframe(pagina, use_container_width=True, hide_index=True)
+    inicio = (page - 1) * page_size
+    st.caption(f"Mostrando {inicio + 1 if total else 0}–{inicio + len(pagina)} de {total:,} registros")
+
+def reset_record_state(prefixes, record_id):
+    # Descarta el estado de los widgets de un registro para que muestren los datos guardados
+    for prefix in prefixes:
+        st.session_state.pop(f"{prefix}_{record_id}", None)
+
+LEAD_STATE_PREFIXES = ["edit_cliente", "edit_contacto", "edit_estado", "edit_tipo", "edit_duracion", "edit_capacidad",
+                       "edit_ubicacion", "edit_produccion", "edit_resp", "edit_notas", "delete_docs_lead", "version_lead"]
+OFFER_STATE_PREFIXES = ["edit_precio", "edit_volumen", "edit_prob", "edit_estado_offer", "edit_notas_offer",
+                        "delete_docs_offer", "version_offer"]
+# Todo el estado por registro que se libera al salir de la lista LRU (session_memory.py)
+LEAD_SESSION_PREFIXES = LEAD_STATE_PREFIXES + ["conflict_lead", "upload_lead", "upload_lead_n"]
+OFFER_SESSION_PREFIXES = OFFER_STATE_PREFIXES + ["conflict_offer", "upload_offer", "upload_offer_n"]
+
+SELECTOR_PAGE = 50
+
+def select_record(df, key_col, label, etiqueta, key, buscar=None):
+    # Selector con búsqueda y paginación: el navegador solo recibe las opciones
+    # de la página. Un número filtra por prefijo de ID; un texto usa
+    # buscar(texto) -> IDs que coinciden (índice de trigramas de search.py)
+    col_busca, col_pag = st.columns([3, 1])
+    texto = col_busca.text_input("🔎 Buscar por ID o nombre", key=f"{key}_buscar").strip()
+    ids = df[key_col].dropna()
+    if texto.isdigit():
+        ids = ids[ids.astype(str).str.startswith(texto)]
+    elif texto and buscar is not None:
+        ids = ids[ids.isin(buscar(texto))]
+    ids = ids.drop_duplicates()
+
+    paginas = max(1, -(-len(ids) // SELECTOR_PAGE))
+    if st.session_state.get(f"{key}_pagina", 1) > paginas:
+        st.session_state[f"{key}_pagina"] = paginas  # la búsqueda ha reducido el resultado
+    pagina = col_pag.number_input("Página", min_value=1, max_value=paginas, step=1, key=f"{key}_pagina")
+    opciones = ids.iloc[(pagina - 1) * SELECTOR_PAGE:pagina * SELECTOR_PAGE].tolist()
+    st.caption(f"{len(ids):,} registros · página {pagina} de {paginas}")
+    if not opciones:
+        st.info("Ningún registro coincide con la búsqueda.")
+        return None
+    return st.selectbox(label, opciones, format_func=etiqueta, key=f"{key}_id")
+
+# --- Cargar datos ---
+# Carga perezosa: cada tabla se lee (de la caché) como mucho una vez por rerun
+# y solo si la vista activa la necesita
+TABLAS = {
+    "leads": (LEADS_FILE, LEADS_COLS),
+    "offers": (OFFERS_FILE, OFFERS_COLS),
+    "clients": (CLIENTS_FILE, CLIENTS_COLS),
+}
+datos = {}
+
+def get_table(name):
+    if name not in datos:
+        with span("load_data"):
+            datos[name] = load_data(*TABLAS[name])
+            # El índice de búsqueda se construye en segundo plano al cargar la tabla
+            # (lee la tabla de la caché después de fijar la versión del índice)
+            if name in SEARCH_FIELDS:
+                warm_index(TABLAS[name][0], lambda tabla=TABLAS[name]: load_data(*tabla))
+    return datos[name]
+
+def load_pipeline():
+    # (leads, offers) leídos de storage ahora, no los de la sesión: las vistas
+    # compartidas se reconstruyen con la versión de datos de ese momento
+    return load_data(*TABLAS["leads"]), load_data(*TABLAS["offers"])
+
+# Snapshots periódicos para el histórico a fecha (history.py); normalmente
+# solo comparan el tamaño del historial con el del último snapshot
+with span("historial"):
+    for tabla_historial in ("leads", "offers"):
+        maybe_snapshot(*TABLAS[tabla_historial])
+
+st.title("📊 PPA Tracker")
+
+with st.sidebar.expander("⚙️ Caché de datos"):
+    st.json(cache_stats())
+    st.json({"figuras": figure_cache_stats()})
+
+with st.sidebar.expander("🧠 Memoria de la sesión"):
+    # El cuerpo del expander se ejecuta en cada rerun aunque esté cerrado: el
+    # recorrido de la sesión (memory_usage(deep=True)) solo se hace a petición
+    st.caption(f"{len(st.session_state)} claves; se conserva el estado de los últimos {MAX_RECORDS} leads y "
+               f"ofertas abiertos.")
+    if st.checkbox("Medir memoria", key="memoria_medir"):
+        total_sesion, claves_sesion = session_memory()
+        st.caption(f"{total_sesion / 2 ** 20:,.2f} MB en total.")
+        st.dataframe(claves_sesion, use_container_width=True, hide_index=True)
+
+if st.session_state.get("usuario") in ADMINS:
+    with st.sidebar.expander("⏱️ Rendimiento (admin)"):
+        st.caption(f"Latencia por vista y sección en los últimos reruns del proceso. Trazas completas en {TRACE_FILE}.")
+        latencias = latency_stats()
+        vista_latencias = st.selectbox("Vista", ["Todas"] + sorted(latencias["Vista"].unique()), key="latencias_vista")
+        if vista_latencias != "Todas":
+            latencias = latencias[latencias["Vista"] == vista_latencias]
+        st.dataframe(latencias, use_container_width=True, hide_index=True)
+
+# =======================
+# TAB 1: CLIENTES / CONTRAPARTES
+# =======================
+def render_clientes():
+    clients = get_table("clients")
+
+    st.header("👥 Gestión de Clientes / Contrapartes")
+
+    # Inicializar flag si no existe
+    if "reset_client_form" not in st.session_state:
+        st.session_state.reset_client_form = False
+
+    # Variables vacías si hay que resetear el formulario
+    default_values = {
+        "nombre": "",
+        "cif": "",
+        "direccion": "",
+        "ciudad": "",
+        "provincia": "",
+        "tipo_cliente": "Productor",
+        "sector": "",
+        "notas_cliente": ""
+    }
+
+    # Si hay que limpiar, asignamos valores vacíos
+    if st.session_state.reset_client_form:
+        for k, v in default_values.items():
+            st.session_state[k] = v
+        st.session_state.reset_client_form = False  # desactivar flag
+
+    with st.form("form_client"):
+        nombre = st.text_input("Nombre o Razón Social", key="nombre")
+        cif = st.text_input("CIF / NIF", key="cif")
+        direccion = st.text_input("Dirección", key="direccion")
+        ciudad = st.text_input("Ciudad", key="ciudad")
+        provincia = st.text_input("Provincia", key="provincia")
+        pais = "España"
+        tipo = st.selectbox(
+            "Tipo de Cliente",
+            TIPOS_CLIENTE,
+            key="tipo_cliente"
+        )
+        sector = st.text_input("Sector", key="sector")
+        notas = st.text_area("Notas adicionales", key="notas_cliente")
+
+        submit_client = st.form_submit_button("Guardar Cliente")
+
+        if submit_client:
+            new_id = next_id(CLIENTS_FILE, "ID Cliente")
+            insert_row(CLIENTS_FILE, dict(zip(CLIENTS_COLS, [
+                new_id, nombre, cif, direccion, ciudad, provincia, pais, tipo, sector, notas, ""
+            ])))
+            st.success(f"✅ Cliente '{nombre}' añadido correctamente.")
+
+            # ✅ Activamos el reset para limpiar los campos en esta misma vista
+            st.session_state.reset_client_form = True
+            st.experimental_set_query_params(_="refresh")  # pequeño truco para forzar redibujo
+            st.rerun()
+
+    st.subheader("📋 Clientes Registrados (España)")
+    filtro_nombre = st.text_input("Filtrar por nombre o CIF/NIF de cliente:")
+    filtro_tipo = st.selectbox("Filtrar por tipo:", ["Todos"] + clients["Tipo"].dropna().unique().tolist())
+
+    with span("filtros"):
+        df = filter_data(clients, CLIENTS_FILE, equals={"Tipo": filtro_tipo} if filtro_tipo != "Todos" else None)
+        # Búsqueda sin tildes ni mayúsculas con el índice de trigramas compartido
+        df = search_rows(df, CLIENTS_FILE, filtro_nombre, lambda: clients)
+    render_table(df, key="clientes", columns=CLIENTS_COLS)
+
+    render_export(df, "Clientes", "clientes", key="clientes",
+                  clave=(data_version(CLIENTS_FILE), filtro_tipo, filtro_nombre.strip()))
+
+
+
+# =======================
+# TAB 2: Añadir Lead
+# =======================
+def render_add_lead():
+    clients = get_table("clients")
+
+    st.header("➕ Añadir Lead")
+    with st.form("form_lead"):
+        cliente = st.selectbox("Cliente / Contraparte", clients["Nombre"]) if not clients.empty else st.text_input(
+            "Cliente (no hay clientes aún)")
+        # Índice hash Nombre -> fila en lugar de recorrer la columna
+        cliente_row = lookup_row(clients, CLIENTS_FILE, "Nombre", cliente) if not clients.empty else None
+        cliente_id = cliente_row["ID Cliente"] if cliente_row is not None else ""
+        contacto = st.text_input("Contacto / Email")
+        estado = st.selectbox("Estado", ESTADOS_LEAD)
+        tecnologia = st.selectbox("Tecnología", TECNOLOGIAS)
+        tipo = st.selectbox("Tipo PPA", TIPOS_PPA)
+        duracion = st.number_input("Duración (años)", min_value=5, max_value=15, value=10, step=1)
+        fecha = st.date_input("Fecha Alta", value=date.today())
+        capacidad = st.number_input("Capacidad nominal (MWp)", min_value=0.0, step=0.1)
+        ubicacion = st.text_input("Ubicación del proyecto")
+        produccion = st.number_input("Producción anual (GWh/año)", min_value=0.0, step=0.1)
+        resp = st.text_input("Responsable")
+        notas = st.text_area("Notas")
+        submit_lead = st.form_submit_button("Guardar Lead")
+
+        if submit_lead:
+            new_id = next_id(LEADS_FILE, "ID Lead")
+            insert_row(LEADS_FILE, dict(zip(LEADS_COLS, [
+                new_id, cliente_id, cliente, contacto, estado,tecnologia,tipo,duracion, fecha,capacidad,ubicacion,produccion, resp, notas, ""
+            ])))
+            st.success(f"✅ Lead {new_id} añadido con éxito")
+
+# =======================
+# TAB 3: Añadir Oferta
+# =======================
+def render_add_offer():
+    st.header("➕ Añadir Oferta")
+    with st.form("form_offer"):
+        id_lead = st.number_input("ID Lead asociado", min_value=1, step=1)
+        fecha = st.date_input("Fecha Oferta", value=date.today())
+        precio = st.number_input("Precio (EUR/MWh)", min_value=0.0, step=0.1)
+        volumen = st.number_input("Volumen (MWh)", min_value=0.0, step=100.0)
+        prob = st.slider("Probabilidad (%)", 0, 100, 50)
+        estado = st.selectbox("Estado Oferta", ESTADOS_OFERTA)
+        notas = st.text_area("Notas")
+        submit_offer = st.form_submit_button("Guardar Oferta")
+
+        if submit_offer:
+            new_id = next_id(OFFERS_FILE, "ID Oferta", start=101)
+            insert_row(OFFERS_FILE, dict(zip(OFFERS_COLS, [
+                new_id, id_lead, fecha, precio, volumen, prob, estado, notas, ""
+            ])))
+            st.success(f"✅ Oferta {new_id} añadida con éxito")
+
+# =======================
+# TAB 4: Editar Lead
+# =======================
+def render_edit_lead():
+    leads = get_table("leads")
+
+    st.header("✏️ Editar Lead")
+    if not leads.empty:
+        lead_id = select_record(
+            leads, "ID Lead", "Selecciona Lead por ID",
+            lambda i: f"{i} — {lookup_row(leads, LEADS_FILE, 'ID Lead', i)['Cliente']}",
+            key="edit_lead", buscar=lambda texto: matching_ids(LEADS_FILE, texto, lambda: leads)
+        )
+        if lead_id is None:
+            return
+        lead_row = lookup_row(leads, LEADS_FILE, "ID Lead", lead_id)
+        touch_record("lead", lead_id, LEAD_SESSION_PREFIXES)
+
+        # Tras un conflicto se descarta el estado de los widgets antes de crearlos
+        if st.session_state.pop(f"conflict_lead_{lead_id}", False):
+            reset_record_state(LEAD_STATE_PREFIXES, lead_id)
+            st.error("⚠️ Otro usuario ha modificado este lead mientras lo editabas. "
+                     "Se han recargado sus datos: revisa los cambios y vuelve a guardar.")
+
+        # Versión de la fila al abrirla: se comprueba al guardar (bloqueo optimista)
+        if f"version_lead_{lead_id}" not in st.session_state:
+            st.session_state[f"version_lead_{lead_id}"] = lead_row[VERSION_COL]
+
+        cliente = st.text_input("Cliente", value=lead_row["Cliente"], key=f"edit_cliente_{lead_id}")
+        contacto = st.text_input("Contacto", value=lead_row["Contacto"], key=f"edit_contacto_{lead_id}")
+        estado = st.selectbox(
+            "Estado",
+            ESTADOS_LEAD,
+            index=ESTADOS_LEAD.index(lead_row["Estado"]),
+            key=f"edit_estado_{lead_id}"
+        )
+
+        tecnologia = st.selectbox(
+            "Tecnología",
+            TECNOLOGIAS,
+            index=TECNOLOGIAS.index(lead_row.get("Tecnologia", "Solar"))
+        )
+
+        tipo = st.selectbox(
+            "Tipo PPA",
+            TIPOS_PPA,
+            index=TIPOS_PPA.index(lead_row["Tipo PPA"]),
+            key=f"edit_tipo_{lead_id}"
+        )
+
+        duracion = st.number_input(
+            "Duración (años)",
+            min_value=5,
+            max_value=15,
+            value=int(lead_row.get("Duracion", 10)),
+            step=1,
+            key=f"edit_duracion_{lead_id}"
+        )
+
+        # 🆕 Campos añadidos
+        capacidad = st.number_input(
+            "Capacidad nominal (MWp)",
+            min_value=0.0,
+            step=0.1,
+            value=float(lead_row.get("Capacidad", 0.0) or 0.0),
+            key=f"edit_capacidad_{lead_id}"
+        )
+
+        ubicacion = st.text_input(
+            "Ubicación del proyecto",
+            value=lead_row.get("Ubicacion", ""),
+            key=f"edit_ubicacion_{lead_id}"
+        )
+
+        produccion = st.number_input(
+            "Producción anual (GWh/año)",
+            min_value=0.0,
+            step=0.1,
+            value=float(lead_row.get("Produccion", 0.0) or 0.0),
+            key=f"edit_produccion_{lead_id}"
+        )
+
+        resp = st.text_input("Responsable", value=lead_row["Responsable"], key=f"edit_resp_{lead_id}")
+        notas = st.text_area("Notas", value=lead_row["Notas"], key=f"edit_notas_{lead_id}")
+
+        # Adjuntar nuevo documento
+        uploaded = st.file_uploader(
+            "Adjuntar documento (Contrato/KYC/etc)",
+            type=["pdf", "docx", "xlsx"],
+            key=upload_key("upload_lead", lead_id)
+        )
+
+        # Lista de documentos existentes (índice de documentos + rutas antiguas)
+        with span("documentos"):
+            current_docs = list_attachments(leads.loc[[lead_row.name]], ["ID Lead"], "lead", "ID Lead")
+        if not current_docs.empty:
+            docs_to_delete = st.multiselect(
+                "Borrar documentos existentes",
+                options=list(range(len(current_docs))),
+                format_func=lambda i: current_docs["Archivo"].iat[i],
+                key=f"delete_docs_lead_{lead_id}"
+            )
+        else:
+            docs_to_delete = []
+        borrar = current_docs.iloc[docs_to_delete]
+
+        if st.button("💾 Guardar cambios Lead", key=f"save_lead_{lead_id}"):
+            # Actualizar columna Docs (solo rutas antiguas: los adjuntos nuevos van al índice)
+            remaining_docs = [
+                d for d in str(lead_row.get("Docs", "")).split(";")
+                if d and d != "nan" and d not in set(borrar["Ruta"])
+            ]
+
+            cambios = dict(zip(
+                ["Cliente", "Contacto", "Estado", "Tipo PPA","Duracion","Tecnologia","Capacidad","Ubicacion","Produccion",  "Responsable", "Notas", "Docs"],
+                [cliente, contacto, estado, tipo, duracion,tecnologia,capacidad,ubicacion,produccion, resp, notas, ";".join(remaining_docs)]
+            ))
+            try:
+                # Solo se registra la fila editada en el journal
+                nueva_version = update_row(
+                    LEADS_FILE, "ID Lead", lead_id, cambios,
+                    expected_version=st.session_state[f"version_lead_{lead_id}"]
+                )
+            except ConflictError:
+                st.session_state[f"conflict_lead_{lead_id}"] = True
+                st.rerun()
+            else:
+                # Cambios en adjuntos solo si el guardado no entra en conflicto
+                apply_doc_changes(borrar, uploaded, "lead", lead_id)
+                if uploaded:
+                    release_upload("upload_lead", lead_id)
+                cambios[VERSION_COL] = nueva_version
+                assign_values(leads, [lead_row.name], cambios)
+                st.session_state[f"version_lead_{lead_id}"] = nueva_version
+                st.success("✅ Lead actualizado")
+                if uploaded:
+                    st.info(f"📎 {uploaded.name} se está procesando en segundo plano.")
+
+        render_jobs("lead", [lead_id], key=f"lead_{lead_id}")
+
+
+# =======================
+# TAB 5: Editar Oferta
+# =======================
+def render_edit_offer():
+    offers = get_table("offers")
+
+    st.header("✏️ Editar Oferta")
+    if not offers.empty:
+        leads = get_table("leads")
+
+        def etiqueta(i):
+            id_lead = lookup_row(offers, OFFERS_FILE, "ID Oferta", i)["ID Lead"]
+            lead = lookup_row(leads, LEADS_FILE, "ID Lead", id_lead) if pd.notna(id_lead) else None
+            return f"{i} — Lead {id_lead}" + (f" — {lead['Cliente']}" if lead is not None else "")
+
+        def buscar(texto):
+            # Ofertas de los leads cuyo cliente o contacto coincide con el texto
+            return offers.loc[offers["ID Lead"].isin(matching_ids(LEADS_FILE, texto, lambda: leads)), "ID Oferta"]
+
+        offer_id = select_record(offers, "ID Oferta", "Selecciona Oferta por ID", etiqueta, key="edit_offer",
+                                 buscar=buscar)
+        if offer_id is None:
+            return
+        offer_row = lookup_row(offers, OFFERS_FILE, "ID Oferta", offer_id)
+        touch_record("offer", offer_id, OFFER_SESSION_PREFIXES)
+
+        # Tras un conflicto se descarta el estado de los widgets antes de crearlos
+        if st.session_state.pop(f"conflict_offer_{offer_id}", False):
+            reset_record_state(OFFER_STATE_PREFIXES, offer_id)
+            st.error("⚠️ Otro usuario ha modificado esta oferta mientras la editabas. "
+                     "Se han recargado sus datos: revisa los cambios y vuelve a guardar.")
+
+        # Versión de la fila al abrirla: se comprueba al guardar (bloqueo optimista)
+        if f"version_offer_{offer_id}" not in st.session_state:
+            st.session_state[f"version_offer_{offer_id}"] = offer_row[VERSION_COL]
+
+        precio = st.number_input(
+            "Precio EUR/MWh",
+            value=float(offer_row["Precio EUR/MWh"]),
+            key=f"edit_precio_{offer_id}"
+        )
+        volumen = st.number_input(
+            "Volumen MWh",
+            value=float(offer_row["Volumen MWh"]),
+            key=f"edit_volumen_{offer_id}"
+        )
+        prob = st.slider(
+            "Probabilidad (%)",
+            0, 100,
+            int(offer_row["Probabilidad (%)"]),
+            key=f"edit_prob_{offer_id}"
+        )
+        estado = st.selectbox(
+            "Estado",
+            ESTADOS_OFERTA,
+            index=ESTADOS_OFERTA.index(offer_row["Estado"]),
+            key=f"edit_estado_offer_{offer_id}"
+        )
+        notas = st.text_area("Notas", value=offer_row["Notas"], key=f"edit_notas_offer_{offer_id}")
+
+        # Adjuntar nuevo documento
+        uploaded_offer = st.file_uploader(
+            "Adjuntar documento Oferta (Contrato, etc)",
+            type=["pdf", "docx", "xlsx"],
+            key=upload_key("upload_offer", offer_id)
+        )
+
+        # Lista de documentos existentes (índice de documentos + rutas antiguas)
+        with span("documentos"):
+            current_docs = list_attachments(offers.loc[[offer_row.name]], ["ID Oferta"], "offer", "ID Oferta")
+        if not current_docs.empty:
+            docs_to_delete = st.multiselect(
+                "Borrar documentos existentes",
+                options=list(range(len(current_docs))),
+                format_func=lambda i: current_docs["Archivo"].iat[i],
+                key=f"delete_docs_offer_{offer_id}"
+            )
+        else:
+            docs_to_delete = []
+        borrar = current_docs.iloc[docs_to_delete]
+
+        if st.button("💾 Guardar cambios Oferta", key=f"save_offer_{offer_id}"):
+            # Actualizar columna Docs (solo rutas antiguas: los adjuntos nuevos van al índice)
+            remaining_docs = [
+                d for d in str(offer_row.get("Docs", "")).split(";")
+                if d and d != "nan" and d not in set(borrar["Ruta"])
+            ]
+
+            cambios = dict(zip(
+                ["Precio EUR/MWh", "Volumen MWh", "Probabilidad (%)", "Estado", "Notas", "Docs"],
+                [precio, volumen, prob, estado, notas, ";".join(remaining_docs)]
+            ))
+            try:
+                # Solo se registra la fila editada en el journal
+                nueva_version = update_row(
+                    OFFERS_FILE, "ID Oferta", offer_id, cambios,
+                    expected_version=st.session_state[f"version_offer_{offer_id}"]
+                )
+            except ConflictError:
+                st.session_state[f"conflict_offer_{offer_id}"] = True
+                st.rerun()
+            else:
+                # Cambios en adjuntos solo si el guardado no entra en conflicto
+                apply_doc_changes(borrar, uploaded_offer, "offer", offer_id)
+                if uploaded_offer:
+                    release_upload("upload_offer", offer_id)
+                cambios[VERSION_COL] = nueva_version
+                assign_values(offers, [offer_row.name], cambios)
+                st.session_state[f"version_offer_{offer_id}"] = nueva_version
+                st.success("✅ Oferta actualizada")
+                if uploaded_offer:
+                    st.info(f"📎 {uploaded_offer.name} se está procesando en segundo plano.")
+
+        render_jobs("offer", [offer_id], key=f"offer_{offer_id}")
+
+
+
+# =======================
+# TAB 7: Ver Leads
+# =======================
+def render_ver_leads():
+    leads = get_table("leads")
+
+    st.header("📁 Ver Leads")
+    filtro_cliente = st.text_input(
+        "Filtrar por Cliente o Contacto:",
+        key="filtro_cliente_leads"
+    )
+    filtro_estado = st.selectbox(
+        "Filtrar por Estado:",
+        ["Todos"] + leads["Estado"].dropna().unique().tolist(),
+        key="filtro_estado_leads"
+    )
+
+    with span("filtros"):
+        df = filter_data(leads, LEADS_FILE, equals={"Estado": filtro_estado} if filtro_estado != "Todos" else None)
+        df = search_rows(df, LEADS_FILE, filtro_cliente, lambda: leads)
+
+    render_table(df, key="leads", columns=[c for c in LEADS_COLS if c != "Docs"])
+
+    st.subheader("📂 Documentación adjunta por Lead")
+    render_jobs("lead", df["ID Lead"], key="leads")
+    with span("documentos"):
+        render_attachments(
+            list_attachments(df, ["ID Lead", "Cliente"], "lead", "ID Lead"),
+            lambda doc: f"👤 {doc['Cliente']} — {doc['Archivo']}",
+            key="lead"
+        )
+
+    render_export(df, "Leads", "leads_filtrados", key="leads",
+                  clave=(data_version(LEADS_FILE), filtro_estado, filtro_cliente.strip()))
+
+
+# =======================
+# TAB 8: Ver Ofertas
+# =======================
+def render_ver_ofertas():
+    # Vista ofertas ⋈ leads compartida (las tablas solo se cargan si hay que reconstruirla)
+    with span("vista_ofertas"):
+        vista_ofertas = get_offer_view(LEADS_FILE, OFFERS_FILE, load_pipeline)
+
+    st.header("💼 Ver Ofertas")
+
+    # Filtro por estado de la oferta
+    filtro_estado_offer = st.selectbox(
+        "Filtrar por Estado:",
+        ["Todos"] + vista_ofertas.distinct("Estado"),
+        key="filtro_estado_offer"
+    )
+
+    # Filtro por cliente (clientes de los leads que tienen ofertas)
+    filtro_cliente = st.selectbox(
+        "Filtrar por Cliente:",
+        ["Todos"] + vista_ofertas.distinct("Cliente"),
+        key="filtro_cliente_offer"
+    )
+
+    with span("filtros"):
+        df = filter_offers(
+            vista_ofertas.frame,
+            estado=filtro_estado_offer if filtro_estado_offer != "Todos" else None,
+            cliente=filtro_cliente if filtro_cliente != "Todos" else None
+        )
+
+    # Mostrar dataframe incluyendo la columna Cliente
+    render_table(df, key="ofertas", columns=[c for c in OFFERS_COLS if c != "Docs"] + ["Cliente"])
+
+    st.subheader("📂 Documentación adjunta por Oferta")
+    render_jobs("offer", df["ID Oferta"], key="ofertas")
+    with span("documentos"):
+        render_attachments(
+            list_attachments(df, ["ID Oferta", "ID Lead", "Cliente"], "offer", "ID Oferta"),
+            lambda doc: f"🧾 Oferta ID {doc['ID Oferta']} — Lead {doc['ID Lead']} — Cliente: {doc['Cliente']} — {doc['Archivo']}",
+            key="offer"
+        )
+
+    render_export(df, "Ofertas", "ofertas_filtradas", key="ofertas",
+                  clave=(data_version(LEADS_FILE), data_version(OFFERS_FILE), filtro_estado_offer, filtro_cliente))
+
+
+
+
+# =======================
+# TAB 8: DASHBOARD CORPORATIVO (LIGHT THEME con filtros desplegables)
+# =======================
+def render_dashboard():
+    leads = get_table("leads")
+
+    st.markdown("""
+        <style>
+        body, .stApp {
+            background-color: #f7f9fb;
+            color: #2c3e50;
+        }
+        .metric-card {
+            background: linear-gradient(135deg, #ffffff 0%, #eaf2f8 100%);
+            border: 1px solid #dce3ea;
+            border-radius: 15px;
+            padding: 20px;
+            text-align: center;
+            box-shadow: 0 2px 6px rgba(0,0,0,0.1);
+        }
+        .metric-title {
+            font-size: 15px;
+            color: #6c757d;
+        }
+        .metric-value {
+            font-size: 26px;
+            font-weight: 700;
+            color: #1b263b;
+            margin-top: 6px;
+        }
+        .section-title {
+            font-size: 22px;
+            font-weight: 600;
+            color: #005f73;
+            margin-top: 40px;
+            margin-bottom: 10px;
+        }
+        </style>
+    """, unsafe_allow_html=True)
+
+    st.title("Seguimiento PPA")
+
+    # -----------------------------
+    # 🎛️ FILTROS LATERALES
+    # -----------------------------
+    with st.sidebar:
+        st.header("🎚️ Filtros globales Dashboard")
+
+        responsable_filtro = st.selectbox(
+            "Responsable",
+            ["Todos"] + sorted(leads["Responsable"].dropna().unique().tolist())
+        ) if not leads.empty else "Todos"
+
+        cliente_lista = sorted(leads["Cliente"].dropna().unique().tolist()) if not leads.empty else []
+        cliente_filtro = st.selectbox(
+            "Cliente / Contraparte (Leads)",
+            ["Todos"] + cliente_lista
+        )
+
+        estado_lead_filtro = st.selectbox(
+            "Estado Lead",
+            ["Todos"] + ESTADOS_LEAD
+        )
+
+        estado_offer_filtro = st.selectbox(
+            "Estado Oferta",
+            ["Todos"] + ESTADOS_OFERTA
+        )
+
+    # ===============================
+    # 👥 DASHBOARD DE LEADS
+    # ===============================
+    st.markdown('<div class="section-title">👥 Dashboard de Leads</div>', unsafe_allow_html=True)
+
+    filtros_lead = {
+        col: valor for col, valor in [
+            ("Responsable", responsable_filtro), ("Estado", estado_lead_filtro), ("Cliente", cliente_filtro)
+        ] if valor != "Todos"
+    }
+    # KPIs y gráficos de conteo salen del cubo de agregados; las filas solo
+    # se filtran para la tabla de detalle
+    with span("cubo"):
+        cubo = get_cube_view(LEADS_FILE, OFFERS_FILE, load_pipeline)
+    celdas_leads = cubo.leads(filtros_lead)
+    kpis_leads = cubo.lead_kpis(celdas_leads)
+    with span("filtros"):
+        leads_filtrados = filter_data(leads, LEADS_FILE, equals=filtros_lead)
+
+    # --- KPIs
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Total Leads</div>
+                <div class="metric-value">{kpis_leads["total"]:,}</div>
+            </div>
+        """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Capacidad Total (MWp)</div>
+                <div class="metric-value">{round(kpis_leads["capacidad"],2)}</div>
+            </div>
+        """, unsafe_allow_html=True)
+    with col3:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Producción Total (GWh)</div>
+                <div class="metric-value">{round(kpis_leads["produccion"],2)}</div>
+            </div>
+        """, unsafe_allow_html=True)
+    with col4:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Responsables Activos</div>
+                <div class="metric-value">{kpis_leads["responsables"]}</div>
+            </div>
+        """, unsafe_allow_html=True)
+
+    # Figuras en caché por versión de los datos y filtros (charts.py)
+    version_datos = (data_version(LEADS_FILE), data_version(OFFERS_FILE))
+    clave_leads = (version_datos, tuple(sorted(filtros_lead.items())))
+
+    if kpis_leads["total"]:
+        with span("graficos"):
+            def figura_estado():
+                fig = px.pie(
+                    cubo.breakdown(celdas_leads, "Estado"), names="Estado", values="Cantidad",
+                    title="Distribución por Estado", hole=0.4,
+                    color_discrete_sequence=px.colors.qualitative.Pastel
+                )
+                return fig.update_layout(template="plotly_white")
+
+            def figura_tecnologia():
+                fig = px.bar(
+                    cubo.breakdown(celdas_leads, "Tecnologia"),
+                    x="Tecnologia", y="Cantidad", title="Leads por Tecnología",
+                    color="Tecnologia", color_discrete_sequence=px.colors.qualitative.Safe
+                )
+                return fig.update_layout(template="plotly_white")
+
+            def figura_responsable():
+                fig = px.bar(
+                    cubo.breakdown(celdas_leads, "Responsable"),
+                    x="Responsable", y="Cantidad", title="Leads por Responsable",
+                    color="Responsable", color_discrete_sequence=px.colors.qualitative.Pastel
+                )
+                return fig.update_layout(template="plotly_white")
+
+            colA, colB = st.columns(2)
+            colA.plotly_chart(get_figure(("leads_estado", clave_leads), figura_estado), use_container_width=True)
+            colB.plotly_chart(get_figure(("leads_tecnologia", clave_leads), figura_tecnologia),
+                              use_container_width=True)
+            st.plotly_chart(get_figure(("leads_responsable", clave_leads), figura_responsable),
+                            use_container_width=True)
+
+        st.markdown("### 📋 Detalle de Leads Filtrados")
+        render_table(
+            leads_filtrados, key="dashboard_leads",
+            columns=["ID Lead", "Cliente", "Estado", "Tecnologia", "Tipo PPA", "Duracion", "Capacidad", "Produccion",
+                     "Responsable"]
+        )
+    else:
+        st.info("No hay leads con los filtros seleccionados.")
+
+    # ===============================
+    # ⚡ PERFILES HORARIOS DE ENTREGA
+    # ===============================
+    st.markdown('<div class="section-title">⚡ Perfiles horarios de entrega</div>', unsafe_allow_html=True)
+    st.caption("Generación y entrega horaria (8760 h) del primer año según Tecnología, Producción y Tipo PPA de "
+               "cada lead. El riesgo de forma es la energía que hay que comprar o vender en mercado cuando la "
+               "entrega comprometida no coincide con la generación.")
+    if kpis_leads["total"] and st.checkbox("Mostrar perfiles", key="perfiles_mostrar"):
+        with span("perfiles"):
+            perfiles = get_profiles(LEADS_FILE, lambda: leads)
+            # Sin filtros se usa la energía por grupo ya acumulada; con filtros, la de los leads filtrados
+            generacion, entrega = perfiles.hourly(leads_filtrados["ID Lead"] if filtros_lead else None)
+            riesgo = shape_risk(generacion, entrega)
+            anual = perfiles.yearly(leads_filtrados["ID Lead"] if filtros_lead else None)
+
+        col1, col2, col3, col4 = st.columns(4)
+        for col, titulo, valor in [
+            (col1, "Entrega Año 1 (MWh)", f"{riesgo['entrega']:,.0f}"),
+            (col2, "Déficit a comprar (MWh)", f"{riesgo['corto']:,.0f}"),
+            (col3, "Excedente a vender (MWh)", f"{riesgo['largo']:,.0f}"),
+            (col4, "Riesgo de forma (% entrega)", f"{riesgo['riesgo_pct']:.1f}"),
+        ]:
+            with col:
+                st.markdown(f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo}</div>
+                        <div class="metric-value">{valor}</div>
+                    </div>
+                """, unsafe_allow_html=True)
+
+        with span("graficos"):
+            colores = ["#ee9b00", "#005f73"]
+            fig_mes = px.bar(
+                monthly(generacion, entrega).melt(id_vars="Mes", var_name="Serie", value_name="MWh"),
+                x="Mes", y="MWh", color="Serie", barmode="group", title="Generación y entrega mensual (Año 1)",
+                color_discrete_sequence=colores
+            )
+            fig_mes.update_layout(template="plotly_white")
+
+            fig_hora = px.line(
+                daily_shape(generacion, entrega).melt(id_vars="Hora", var_name="Serie", value_name="MWh"),
+                x="Hora", y="MWh", color="Serie", markers=True, title="Día medio: MWh por hora",
+                color_discrete_sequence=colores
+            )
+            fig_hora.update_layout(template="plotly_white")
+
+            colA, colB = st.columns(2)
+            colA.plotly_chart(fig_mes, use_container_width=True)
+            colB.plotly_chart(fig_hora, use_container_width=True)
+
+            fig_anual = px.bar(anual, x="Año de contrato", y="Entrega (MWh)",
+                               title="Entrega por año de contrato (con degradación)",
+                               color_discrete_sequence=["#0a9396"])
+            fig_anual.update_layout(template="plotly_white")
+            st.plotly_chart(fig_anual, use_container_width=True)
+
+
+    # ===============================
+    # 🕰️ PIPELINE A FECHA
+    # ===============================
+    st.markdown('<div class="section-title">🕰️ Pipeline a fecha</div>', unsafe_allow_html=True)
+    if st.checkbox("Ver el pipeline a una fecha pasada", key="asof_activo"):
+        fecha_asof = st.date_input("Fecha", value=date.today(), max_value=date.today(), key="asof_fecha")
+        # Estado al final del día elegido: último snapshot anterior + eventos hasta esa hora
+        instante = pd.Timestamp(fecha_asof).to_pydatetime().replace(hour=23, minute=59, second=59)
+        with span("historial"):
+            leads_asof, desde = as_of(LEADS_FILE, LEADS_COLS, instante)
+            offers_asof, _ = as_of(OFFERS_FILE, OFFERS_COLS, instante)
+        if instante < desde:
+            st.warning(f"⚠️ El historial empieza el {desde:%d/%m/%Y %H:%M}: se muestra el estado en esa fecha.")
+        offers_hoy = get_table("offers")
+
+        def resumen_pipeline(df_leads, df_offers):
+            kpis_l, kpis_o = lead_kpis(df_leads), offer_kpis(df_offers)
+            return {
+                "Leads": kpis_l["total"],
+                "Capacidad (MWp)": kpis_l["capacidad"],
+                "Ofertas": kpis_o["total"],
+                "Pipeline Ponderado (€)": kpis_o["pipeline"],
+            }
+
+        antes = resumen_pipeline(leads_asof, offers_asof)
+        ahora = resumen_pipeline(leads, offers_hoy)
+        for col, (titulo, valor) in zip(st.columns(4), antes.items()):
+            with col:
+                st.markdown(f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo} a {fecha_asof:%d/%m/%Y}</div>
+                        <div class="metric-value">{valor:,.0f}</div>
+                        <div class="metric-title">Hoy: {ahora[titulo]:,.0f}</div>
+                    </div>
+                """, unsafe_allow_html=True)
+
+        comparativa = pipeline_by(offers_asof, "Estado").join(pipeline_by(offers_hoy, "Estado"), how="outer",
+                                                              lsuffix="_a", rsuffix="_h")
+        comparativa.columns = [f"Ofertas a {fecha_asof:%d/%m/%Y}", f"Pipeline a {fecha_asof:%d/%m/%Y} (€)",
+                               "Ofertas hoy", "Pipeline hoy (€)"]
+        st.dataframe(comparativa.fillna(0).style.format("{:,.0f}"), use_container_width=True)
+
+        # Evolución de precio y probabilidad de una oferta (eventos del historial)
+        oferta_hist = st.number_input("Historial de la oferta (ID)", min_value=0, step=1, key="asof_oferta")
+        if oferta_hist:
+            cambios = field_history(OFFERS_FILE, "ID Oferta", int(oferta_hist), ["Precio EUR/MWh", "Probabilidad (%)"])
+            if cambios.empty:
+                st.info("No hay cambios registrados de esta oferta desde que empezó el historial.")
+            else:
+                with span("graficos"):
+                    fig_hist = px.line(
+                        cambios.melt(id_vars=["Fecha", "Cambio"], var_name="Campo", value_name="Valor"),
+                        x="Fecha", y="Valor", color="Campo", line_shape="hv", markers=True, facet_row="Campo",
+                        title=f"Oferta {int(oferta_hist)}: precio y probabilidad en el tiempo"
+                    )
+                    fig_hist.update_yaxes(matches=None)
+                    fig_hist.update_layout(template="plotly_white")
+                    st.plotly_chart(fig_hist, use_container_width=True)
+                st.dataframe(cambios, use_container_width=True, hide_index=True)
+
+    # ===============================
+    # 💼 DASHBOARD DE OFERTAS
+    # ===============================
+    st.markdown('<div class="section-title">💼 Dashboard de Ofertas</div>', unsafe_allow_html=True)
+
+    # Lista de contrapartes desde ofertas (vinculadas con leads)
+    with span("vista_ofertas"):
+        vista_ofertas = get_offer_view(LEADS_FILE, OFFERS_FILE, load_pipeline)
+    cliente_offer_filtro = st.sidebar.selectbox(
+        "Cliente / Contraparte (Ofertas)",
+        ["Todos"] + vista_ofertas.distinct("Cliente")
+    )
+
+    filtros_oferta = {
+        "estado": estado_offer_filtro if estado_offer_filtro != "Todos" else None,
+        "cliente": cliente_offer_filtro if cliente_offer_filtro != "Todos" else None,
+        # El filtro de responsable restringe las ofertas a los leads filtrados
+        "lead_equals": filtros_lead if responsable_filtro != "Todos" else None,
+    }
+    celdas_ofertas = cubo.offers(**filtros_oferta)
+    kpis_ofertas = cubo.offer_kpis(celdas_ofertas)
+    with span("filtros"):
+        offers_filtrados = filter_offers(vista_ofertas.frame, **filtros_oferta)
+
+    total_ofertas = kpis_ofertas["total"]
+    volumen_total = kpis_ofertas["volumen"]
+    precio_medio = kpis_ofertas["precio_medio"]
+    pipeline = kpis_ofertas["pipeline"]
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Total Ofertas</div>
+                <div class="metric-value">{total_ofertas:,}</div>
+            </div>
+        """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Volumen Total (MWh)</div>
+                <div class="metric-value">{round(volumen_total,2)}</div>
+            </div>
+        """, unsafe_allow_html=True)
+    with col3:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Precio Medio (€/MWh)</div>
+                <div class="metric-value">{round(precio_medio,2)}</div>
+            </div>
+        """, unsafe_allow_html=True)
+    with col4:
+        st.markdown(f"""
+            <div class="metric-card">
+                <div class="metric-title">Pipeline Ponderado (€)</div>
+                <div class="metric-value">{round(pipeline,2):,}</div>
+            </div>
+        """, unsafe_allow_html=True)
+
+    clave_ofertas = (version_datos, tuple(sorted((k, repr(v)) for k, v in filtros_oferta.items())))
+    if not offers_filtrados.empty:
+        with span("graficos"):
+            def figura_estado_oferta():
+                fig = px.bar(
+                    cubo.breakdown(celdas_ofertas, "Estado Oferta").rename(columns={"Estado Oferta": "Estado"}),
+                    x="Estado", y="Cantidad", title="Ofertas por Estado",
+                    color="Estado", color_discrete_sequence=px.colors.qualitative.Safe
+                )
+                return fig.update_layout(template="plotly_white")
+
+            # Boxplot e histograma con cuartiles y conteos calculados en el servidor:
+            # el navegador recibe unas decenas de valores, no una fila por oferta
+            def figura_precio_estado():
+                return box_figure(
+                    box_stats(offers_filtrados, "Estado", "Precio EUR/MWh"), "Estado", "Precio EUR/MWh",
+                    "Precio por Estado de Oferta", px.colors.qualitative.Vivid
+                )
+
+            def figura_probabilidad():
+                return histogram_figure(
+                    histogram_bins(offers_filtrados["Probabilidad (%)"], 10, (0, 100)), "Probabilidad (%)",
+                    "Distribución de Probabilidades", "#0077b6"
+                )
+
+            colA, colB = st.columns(2)
+            colA.plotly_chart(get_figure(("ofertas_estado", clave_ofertas), figura_estado_oferta),
+                              use_container_width=True)
+            colB.plotly_chart(get_figure(("ofertas_precio", clave_ofertas), figura_precio_estado),
+                              use_container_width=True)
+            st.plotly_chart(get_figure(("ofertas_probabilidad", clave_ofertas), figura_probabilidad),
+                            use_container_width=True)
+
+        st.markdown("### 📋 Detalle de Ofertas Filtradas")
+        render_table(
+            offers_filtrados, key="dashboard_ofertas",
+            columns=["ID Oferta", "Cliente", "ID Lead", "Estado", "Precio EUR/MWh", "Volumen MWh", "Probabilidad (%)"]
+        )
+    else:
+        st.info("No hay ofertas con los filtros seleccionados.")
+        return
+
+    # ===============================
+    # 🎲 PREVISIÓN MONTE CARLO
+    # ===============================
+    st.markdown('<div class="section-title">🎲 Previsión Monte Carlo del Pipeline</div>', unsafe_allow_html=True)
+    st.caption("Cada escenario cierra o pierde cada oferta según su probabilidad. Ingresos anuales = Precio × "
+               "Volumen; ingresos de contrato = ingresos anuales × Duración del lead.")
+    col_esc, col_corr = st.columns(2)
+    escenarios = col_esc.selectbox("Escenarios", SCENARIO_OPTIONS, index=SCENARIO_OPTIONS.index(N_SCENARIOS),
+                                   format_func=lambda n: f"{n:,}".replace(",", "."), key="mc_escenarios")
+    correlacion = col_corr.slider("Correlación entre ofertas del mismo cliente", 0.0, 0.9, 0.0, 0.1,
+                                  key="mc_correlacion")
+
+    if st.checkbox("Calcular previsión", key="mc_calcular"):
+        duraciones = offers_filtrados["ID Lead"].map(
+            leads.drop_duplicates("ID Lead", keep="last").set_index("ID Lead")["Duracion"]
+        )
+        # Resultado compartido y en caché por versión de datos y filtros
+        clave = (data_version(LEADS_FILE), data_version(OFFERS_FILE), repr(filtros_oferta))
+        with span("montecarlo"):
+            prevision = get_forecast(clave, offers_filtrados, duraciones, escenarios, correlacion)
+
+        resumen = prevision["resumen"].set_index("Métrica")
+        col1, col2, col3 = st.columns(3)
+        for col, percentil in zip([col1, col2, col3], ["P10", "P50", "P90"]):
+            with col:
+                st.markdown(f"""
+                    <div class="metric-card">
+                        <div class="metric-title">Ingresos anuales {percentil} (€)</div>
+                        <div class="metric-value">{resumen.loc["Ingresos anuales (€)", percentil]:,.0f}</div>
+                    </div>
+                """, unsafe_allow_html=True)
+
+        st.dataframe(resumen.style.format("{:,.0f}"), use_container_width=True)
+
+        mensual = prevision["mensual"]
+        with span("graficos"):
+            fig_mc = px.line(
+                mensual.melt(id_vars="Mes", value_vars=["Ingresos P10", "Ingresos P50", "Ingresos P90"],
+                             var_name="Percentil", value_name="Ingresos (€)"),
+                x="Mes", y="Ingresos (€)", color="Percentil", markers=True,
+                title="Ingresos anuales cerrados por mes de oferta (P10 / P50 / P90)",
+                color_discrete_sequence=["#94d2bd", "#005f73", "#ee9b00"]
+            )
+            fig_mc.update_layout(template="plotly_white")
+            st.plotly_chart(fig_mc, use_container_width=True)
+
+
+# =======================
+# TAB 9: IMPORTACIÓN MASIVA
+# =======================
+TABLAS_IMPORTACION = {"clients": "👥 Clientes", "leads": "📁 Leads", "offers": "💼 Ofertas"}
+
+def render_importar():
+    st.header("📥 Importación masiva")
+    st.caption("CSV (separado por comas o punto y coma) o Excel, con la cabecera en la primera fila y los mismos "
+               "nombres de columna que la tabla. Las filas sin ID reciben uno nuevo automáticamente.")
+
+    tabla = st.selectbox("Tabla destino", list(TABLAS_IMPORTACION), format_func=TABLAS_IMPORTACION.get,
+                         key="import_tabla")
+    fichero = st.file_uploader("Fichero a importar", type=["csv", "xlsx"], key="import_fichero")
+    ficheros = {nombre: file for nombre, (file, _) in TABLAS.items()}
+
+    # El resultado de la validación se conserva entre reruns hasta importar o cambiar de fichero
+    resultado = st.session_state.get("import_resultado")
+    if resultado and (fichero is None or resultado["fichero"] != fichero.file_id or resultado["tabla"] != tabla):
+        del st.session_state["import_resultado"]
+        resultado = None
+
+    if fichero is not None and st.button("🔍 Validar fichero", key="import_validar"):
+        try:
+            with span("importacion"):
+                validas, errores, ignoradas = validate_file(fichero, tabla, ficheros)
+        except (ImportError, ValueError, UnicodeDecodeError) as e:
+            st.error(f"❌ No se ha podido leer el fichero: {e}")
+            return
+        resultado = {"fichero": fichero.file_id, "tabla": tabla, "validas": validas, "errores": errores,
+                     "ignoradas": ignoradas}
+        st.session_state["import_resultado"] = resultado
+
+    if not resultado:
+        return
+
+    validas, errores = resultado["validas"], resultado["errores"]
+    col1, col2 = st.columns(2)
+    col1.metric("Filas válidas", f"{len(validas):,}")
+    col2.metric("Filas con errores", f"{errores['Fila'].nunique():,}")
+    if resultado["ignoradas"]:
+        st.warning("⚠️ Columnas ignoradas (no existen en la tabla): " + ", ".join(resultado["ignoradas"]))
+
+    if not errores.empty:
+        st.markdown("### ❌ Errores por fila")
+        render_table(errores, key="import_errores")
+        st.download_button(
+            "⬇️ Descargar informe de errores (CSV)",
+            data=convert_df(errores),
+            file_name="errores_importacion.csv",
+            mime="text/csv",
+            key="import_informe"
+        )
+
+    if len(validas) and st.button(f"✅ Importar {len(validas):,} filas válidas", key="import_confirmar"):
+        with span("importacion"):
+            importadas, rechazadas = commit_import(validas, tabla, ficheros)
+        del st.session_state["import_resultado"]
+        st.success(f"✅ {importadas:,} filas importadas en {TABLAS_IMPORTACION[tabla]}.")
+        if not rechazadas.empty:
+            st.warning(f"⚠️ {len(rechazadas):,} filas rechazadas: su ID ya existe o su referencia ya no existe.")
+            render_table(rechazadas, key="import_rechazadas")
+
+
+# ================================
+# 🗂️ VISTAS PRINCIPALES
+# ================================
+# Solo se ejecuta la vista seleccionada (st.tabs ejecutaría las ocho en cada rerun)
+VISTAS = {
+    "👥 Clientes / Contrapartes": render_clientes,
+    "➕ Añadir Lead": render_add_lead,
+    "➕ Añadir Oferta": render_add_offer,
+    "✏️ Editar Lead": render_edit_lead,
+    "✏️ Editar Oferta": render_edit_offer,
+    "📁 Ver Leads": render_ver_leads,
+    "💼 Ver Ofertas": render_ver_ofertas,
+    "📈 Dashboard": render_dashboard,
+    "📥 Importar": render_importar,
+}
+vista = st.radio("Vista", list(VISTAS), horizontal=True, key="vista", label_visibility="collapsed")
+try:
+    VISTAS[vista]()
+finally:
+    finish_trace(vista)
@@ -0,0 +1,273 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from schema import TECNOLOGIAS, TIPOS_PPA
+from storage import data_version
+
+# ================================
+# ⚡ PERFILES HORARIOS DE GENERACIÓN Y ENTREGA
+# ================================
+# Cada lead tiene un perfil de 8760 horas de generación (forma horaria de su
+# tecnología escalada a su producción anual) y otro de entrega según el tipo
+# de PPA: Pay-as-Produced entrega lo generado, Solar Profile la curva solar
+# esperada (sin la variabilidad meteorológica) y Baseload Solar una banda
+# plana. Los años siguientes aplican la degradación anual de la tecnología
+# durante la Duracion del contrato (perfil 8760 × años bajo demanda).
+# El perfil del primer año de un lead es la forma unitaria de su tecnología
+# (y tipo de PPA) multiplicada por su energía anual, así que no se guardan
+# filas de 8760 horas por lead: en PROFILES_DIR solo hay las formas unitarias
+# (formas.f32, mapeado en memoria) y un índice con los escalares de cada lead
+# (tecnología, tipo, energía anual, duración) y la clave de sus parámetros,
+# de modo que solo se recalculan los leads nuevos o cuyos parámetros cambian.
+# La energía anual se acumula por (tecnología, tipo de PPA): el perfil de
+# cualquier conjunto de leads es la suma de las formas ponderadas por la
+# energía de cada grupo, O(grupos × 8760) sin importar cuántos leads haya.
+PROFILES_DIR = "profiles"
+LEGACY_FILES = ["generacion.f32", "entrega.f32", "totales.f64"]  # filas por lead (versión 1)
+HORAS = 8760
+PARAMS = ["Tecnologia", "Tipo PPA", "Capacidad", "Produccion", "Duracion"]
+PROFILE_VERSION = 2  # cambiarlo invalida los perfiles guardados
+SEED = 2025
+LATITUD = np.radians(40.0)  # España peninsular
+# Horas equivalentes para estimar la producción si el lead no la tiene
+HORAS_EQUIVALENTES = {"Solar": 1800, "Eólica": 2500, "Solar+BESS": 1800, "Otro": 2000}
+DEGRADACION = {"Solar": 0.005, "Eólica": 0.002, "Solar+BESS": 0.005, "Otro": 0.0}
+DURACION_DEFECTO = 10
+MESES = pd.date_range("2025-01-01", periods=HORAS, freq="h").month.to_numpy()
+_INICIO_MES = np.r_[0, np.flatnonzero(np.diff(MESES)) + 1]
+
+
+def _unit(x):
+    return (x / x.sum()).astype(np.float32)
+
+
+def _unit_shapes():
+    # Formas normalizadas (suman 1 en el año) de generación por tecnología y
+    # de entrega por tecnología × tipo de PPA. Año tipo sintético y fijo.
+    rng = np.random.default_rng(SEED)
+    hora = np.arange(HORAS)
+    dia, hora_dia = hora // 24, hora % 24 + 0.5
+    declinacion = np.radians(23.45) * np.sin(2 * np.pi * (284 + dia + 1) / 365)
+    elevacion = (np.sin(LATITUD) * np.sin(declinacion)
+                 + np.cos(LATITUD) * np.cos(declinacion) * np.cos(np.radians(15 * (hora_dia - 12))))
+    cielo_despejado = np.clip(elevacion, 0, None)
+
+    # Claridad diaria: media estacional (más nubes en invierno) más ruido meteorológico
+    claridad_media = 0.72 + 0.15 * np.cos(2 * np.pi * (np.arange(365) - 172) / 365)
+    claridad = np.clip(claridad_media + rng.normal(0, 0.15, 365), 0.15, 1.0)
+    solar = cielo_despejado * np.repeat(claridad, 24)
+    solar_esperado = cielo_despejado * np.repeat(claridad_media, 24)
+
+    # Eólica: más viento en invierno y de noche, con rachas suavizadas (ventana de 12 h)
+    ruido = np.convolve(rng.normal(0, 1, HORAS + 11), np.ones(12) / np.sqrt(12), mode="valid")
+    eolica = ((1 + 0.3 * np.cos(2 * np.pi * (dia - 15) / 365)) * (1 + 0.15 * np.cos(2 * np.pi * (hora_dia - 3) / 24))
+              * np.exp(0.45 * ruido))
+
+    # Solar+BESS: la batería desplaza un 30 % de la producción de 11 a 15 h a las 19-23 h
+    bess = solar.reshape(365, 24).copy()
+    desplazado = 0.3 * bess[:, 11:15].sum(axis=1)
+    bess[:, 11:15] *= 0.7
+    bess[:, 19:23] += desplazado[:, None] / 4
+
+    generacion = {
+        "Solar": _unit(solar),
+        "Eólica": _unit(eolica),
+        "Solar+BESS": _unit(bess.ravel()),
+        "Otro": _unit(1 + 0.05 * rng.normal(0, 1, HORAS)),
+    }
+    gen = np.stack([generacion[t] for t in TECNOLOGIAS])
+    entrega = np.empty((len(TECNOLOGIAS), len(TIPOS_PPA), HORAS), dtype=np.float32)
+    for i in range(len(TECNOLOGIAS)):
+        for j, tipo in enumerate(TIPOS_PPA):
+            entrega[i, j] = {"Solar Profile": _unit(solar_esperado),
+                             "Baseload Solar": np.full(HORAS, 1 / HORAS, dtype=np.float32)}.get(tipo, gen[i])
+    return gen, entrega
+
+
+GEN_UNIT, ENTREGA_UNIT = _unit_shapes()
+
+
+def _codes(values, catalog):
+    # Índice en el catálogo; los valores desconocidos usan "Otro" (el último)
+    idx = pd.Categorical(values.astype(object), categories=catalog).codes
+    return np.where(idx < 0, len(catalog) - 1, idx)
+
+
+def _lead_params(leads):
+    df = leads.drop_duplicates("ID Lead", keep="last")
+    df = df[df["ID Lead"].notna()]
+    tec = _codes(df["Tecnologia"], TECNOLOGIAS)
+    tipo = _codes(df["Tipo PPA"], TIPOS_PPA)
+    produccion = pd.to_numeric(df["Produccion"], errors="coerce").to_numpy(dtype=float) * 1000
+    capacidad = pd.to_numeric(df["Capacidad"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    estimada = capacidad * np.array([HORAS_EQUIVALENTES[t] for t in TECNOLOGIAS])[tec]
+    anual = np.where(np.isnan(produccion) | (produccion <= 0), estimada, produccion)
+    duracion = pd.to_numeric(df["Duracion"], errors="coerce").fillna(DURACION_DEFECTO).to_numpy(dtype=int)
+    claves = pd.util.hash_pandas_object(
+        df[PARAMS].astype(str).assign(v=str(PROFILE_VERSION)), index=False
+    ).to_numpy()
+    return pd.DataFrame({
+        "ID Lead": df["ID Lead"].astype("int64").to_numpy(),
+        "clave": claves,
+        "tec": tec,
+        "tipo": tipo,
+        "anual": np.clip(anual, 0, None),
+        "duracion": np.clip(duracion, 1, None),
+    })
+
+
+class ProfileStore:
+    # Formas unitarias en memmap y escalares por lead; la energía anual se
+    # suma por (tecnología, tipo de PPA) para los totales de la cartera
+    def __init__(self, directory=PROFILES_DIR):
+        self.dir = directory
+        os.makedirs(directory, exist_ok=True)
+        for nombre in LEGACY_FILES:
+            path = os.path.join(directory, nombre)
+            if os.path.exists(path):
+                os.remove(path)
+        self.gen_unit, self.entrega_unit = self._shapes()
+        self._gen64 = self.gen_unit.astype(np.float64)
+        self._entrega64 = self.entrega_unit.astype(np.float64)
+        self.index_path = os.path.join(directory, "index.csv")
+        if os.path.exists(self.index_path):
+            self.index = pd.read_csv(self.index_path, dtype={"clave": "uint64"})
+        else:
+            self.index = pd.DataFrame({"ID Lead": pd.Series(dtype="int64"), "clave": pd.Series(dtype="uint64"),
+                                       "tec": pd.Series(dtype="int64"), "tipo": pd.Series(dtype="int64"),
+                                       "anual": pd.Series(dtype=float), "duracion": pd.Series(dtype="int64")})
+        self.energia = self._group_energy(self.index)
+
+    def _shapes(self):
+        # (generación [tec, 8760], entrega [tec, tipo, 8760]) en un único fichero
+        path = os.path.join(self.dir, f"formas.v{PROFILE_VERSION}.f32")
+        forma = (len(TECNOLOGIAS), 1 + len(TIPOS_PPA), HORAS)
+        if not os.path.exists(path):
+            formas = np.concatenate([GEN_UNIT[:, None], ENTREGA_UNIT], axis=1)
+            tmp = path + ".tmp"
+            formas.astype(np.float32).tofile(tmp)
+            os.replace(tmp, path)
+        formas = np.memmap(path, dtype=np.float32, mode="r", shape=forma)
+        return formas[:, 0], formas[:, 1:]
+
+    @staticmethod
+    def _group_energy(filas):
+        # MWh anuales por (tecnología, tipo de PPA)
+        energia = np.zeros((len(TECNOLOGIAS), len(TIPOS_PPA)))
+        np.add.at(energia, (filas["tec"].to_numpy(dtype=int), filas["tipo"].to_numpy(dtype=int)),
+                  filas["anual"].to_numpy(dtype=float))
+        return energia
+
+    def sync(self, leads):
+        # Actualiza solo los leads nuevos, borrados o con parámetros distintos
+        params = _lead_params(leads)
+        actual = self.index.set_index("ID Lead")
+        nuevos = params.set_index("ID Lead")
+        comunes = nuevos.index.intersection(actual.index)
+        iguales = comunes[actual.loc[comunes, "clave"].to_numpy() == nuevos.loc[comunes, "clave"].to_numpy()]
+        salen = actual.drop(index=iguales)
+        entran = nuevos.drop(index=iguales)
+        if salen.empty and entran.empty:
+            return 0
+
+        self.energia = self.energia - self._group_energy(salen) + self._group_energy(entran)
+        self.index = pd.concat([actual.loc[iguales], entran]).reset_index()[
+            ["ID Lead", "clave", "tec", "tipo", "anual", "duracion"]]
+        tmp = self.index_path + ".tmp"
+        self.index.to_csv(tmp, index=False)
+        os.replace(tmp, self.index_path)
+        return len(entran)
+
+    def _profiles(self, energia):
+        # Perfiles horarios a partir de la energía por (tecnología, tipo de PPA)
+        gen = energia.sum(axis=1) @ self._gen64
+        entrega = np.einsum("tj,tjh->h", energia, self._entrega64)
+        return gen, entrega
+
+    def hourly(self, lead_ids=None, tipos=None):
+        # (generación, entrega) horarias del primer año, en MWh, sumadas sobre
+        # los leads indicados (None = toda la cartera)
+        if lead_ids is None:
+            energia = self.energia
+        else:
+            energia = self._group_energy(self.index[self.index["ID Lead"].isin(lead_ids)])
+        if tipos is not None:
+            energia = energia * np.isin(TIPOS_PPA, tipos)[None, :]
+        return self._profiles(energia)
+
+    def lead_profile(self, lead_id):
+        # Perfil completo (años × 8760) de generación y entrega de un lead
+        fila = self.index[self.index["ID Lead"] == lead_id]
+        if fila.empty:
+            return None
+        fila = fila.iloc[0]
+        tec, tipo, anual = int(fila["tec"]), int(fila["tipo"]), np.float32(fila["anual"])
+        factor = self._degradacion(tec, int(fila["duracion"]))[:, None]
+        return self.gen_unit[tec] * anual * factor, self.entrega_unit[tec, tipo] * anual * factor
+
+    @staticmethod
+    def _degradacion(tec, duracion):
+        return ((1 - DEGRADACION[TECNOLOGIAS[tec]]) ** np.arange(duracion)).astype(np.float32)
+
+    def yearly(self, lead_ids=None):
+        # MWh entregados por año de contrato con la degradación de cada tecnología
+        idx = self.index if lead_ids is None else self.index[self.index["ID Lead"].isin(lead_ids)]
+        anos = int(idx["duracion"].max()) if not idx.empty else 0
+        ano = np.arange(anos)
+        tasa = np.array([DEGRADACION[t] for t in TECNOLOGIAS])[idx["tec"].to_numpy()]
+        activo = ano[None, :] < idx["duracion"].to_numpy()[:, None]
+        mwh = idx["anual"].to_numpy()[:, None] * (1 - tasa[:, None]) ** ano[None, :] * activo
+        return pd.DataFrame({"Año de contrato": ano + 1, "Entrega (MWh)": mwh.sum(axis=0)})
+
+
+def monthly(gen, entrega):
+    return pd.DataFrame({
+        "Mes": np.arange(1, 13),
+        "Generación (MWh)": np.add.reduceat(gen, _INICIO_MES),
+        "Entrega (MWh)": np.add.reduceat(entrega, _INICIO_MES),
+    })
+
+
+def daily_shape(gen, entrega):
+    # Día medio: MWh por hora del día
+    return pd.DataFrame({
+        "Hora": np.arange(24),
+        "Generación (MWh)": gen.reshape(365, 24).mean(axis=0),
+        "Entrega (MWh)": entrega.reshape(365, 24).mean(axis=0),
+    })
+
+
+def shape_risk(gen, entrega):
+    # Desvío horario entre lo comprometido y lo generado: las horas cortas hay
+    # que comprarlas en mercado y las largas venderlas
+    desvio = entrega - gen
+    total = entrega.sum()
+    corto, largo = desvio.clip(min=0).sum(), (-desvio).clip(min=0).sum()
+    return {
+        "entrega": total,
+        "corto": corto,
+        "largo": largo,
+        "riesgo_pct": (corto + largo) / total * 100 if total else 0.0,
+        "horas_cortas": int((desvio > 1e-9).sum()),
+    }
+
+
+# Almacén compartido por todas las sesiones del proceso
+_lock = threading.Lock()
+_state = {"store": None, "version": None}
+
+
+def get_profiles(leads_file, load):
+    # load() -> DataFrame de leads; solo se llama si los leads han cambiado
+    with _lock:
+        store = _state["store"]
+        if store is None:
+            store = _state["store"] = ProfileStore()
+        version = data_version(leads_file)
+        if _state["version"] != version:
+            store.sync(load())
+            _state["version"] = version
+        return store
@@ -0,0 +1,211 @@
+import argparse
+import html
+import multiprocessing
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from kpis import LEAD_KPIS, OFFER_KPIS, breakdown, lead_kpis, offer_kpis, pipeline_by
+from offer_view import LEAD_COLS
+from schema import columns
+from storage import load_data
+
+# ================================
+# 🗂️ INFORMES POR LOTES (SIN NAVEGADOR)
+# ================================
+# Genera un informe por Responsable y otro por cliente con los mismos KPIs del
+# Dashboard (kpis.py): CSV con los leads, las ofertas, los indicadores y los
+# desgloses, y un informe.html autocontenido con gráficos estáticos en SVG
+# (no hace falta navegador ni motor de exportación de imágenes).
+#   python reports.py --por responsable cliente --workers 4
+# Los datos se cargan una sola vez en el proceso principal (ofertas ya unidas
+# con su lead) y se agrupan allí; cada informe es una tarea de un pool de
+# procesos que solo recibe las posiciones de sus filas. Con "fork" los
+# procesos heredan los DataFrames sin copiarlos; donde solo hay "spawn" se
+# envían una vez a cada proceso al arrancar, no en cada tarea.
+REPORTS_DIR = "informes"
+LEADS_FILE = "leads.csv"
+OFFERS_FILE = "offers.csv"
+GROUPS = {"responsable": "Responsable", "cliente": "Cliente"}
+FORMATS = ["csv", "html"]
+COLORS = {"leads": "#005f73", "ofertas": "#ee9b00"}
+BAR_HEIGHT = 22
+CHART_WIDTH = 620
+LABEL_WIDTH = 170
+
+# Datos compartidos por las tareas de cada proceso del pool
+_data = {}
+
+
+def load_pipeline(leads_file=LEADS_FILE, offers_file=OFFERS_FILE):
+    # (leads, ofertas con Cliente, Responsable y Estado Lead de su lead)
+    leads = load_data(leads_file, columns("leads"))
+    offers = load_data(offers_file, columns("offers"))
+    lead_cols = leads[["ID Lead"] + list(LEAD_COLS)].drop_duplicates("ID Lead", keep="last")
+    return leads, offers.merge(lead_cols.rename(columns=LEAD_COLS), on="ID Lead", how="left")
+
+
+def _slug(value):
+    texto = unicodedata.normalize("NFKD", str(value)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^A-Za-z0-9]+", "_", texto).strip("_").lower() or "sin_nombre"
+
+
+def _tasks(leads, offers, groups, out_dir):
+    # Una tarea por valor de cada agrupación: (agrupación, valor, carpeta, posiciones)
+    tareas = []
+    for grupo in groups:
+        col = GROUPS[grupo]
+        pos_leads = leads.groupby(leads[col].astype(object)).indices
+        pos_ofertas = offers.groupby(offers[col].astype(object)).indices
+        usadas = set()
+        for valor in sorted(set(pos_leads) | set(pos_ofertas), key=str):
+            if str(valor) == "":
+                continue
+            nombre, n = _slug(valor), 1
+            while nombre in usadas:  # valores distintos con el mismo slug
+                n += 1
+                nombre = f"{_slug(valor)}_{n}"
+            usadas.add(nombre)
+            tareas.append((grupo, valor, os.path.join(out_dir, grupo, nombre),
+                           pos_leads.get(valor, []), pos_ofertas.get(valor, [])))
+    return tareas
+
+
+def _svg_bars(df, label_col, value_col, title, color):
+    # Barras horizontales en SVG: el informe se ve igual sin JavaScript ni red
+    if df.empty:
+        return f"<h3>{html.escape(title)}</h3><p>Sin datos.</p>"
+    maximo = float(df[value_col].max()) or 1.0
+    ancho_barra = CHART_WIDTH - LABEL_WIDTH - 90
+    filas = []
+    for i, (etiqueta, valor) in enumerate(zip(df[label_col], df[value_col])):
+        y = i * (BAR_HEIGHT + 6)
+        w = max(1.0, float(valor) / maximo * ancho_barra) if valor else 0
+        filas.append(
+            f'<text x="{LABEL_WIDTH - 8}" y="{y + 15}" text-anchor="end">{html.escape(str(etiqueta))}</text>'
+            f'<rect x="{LABEL_WIDTH}" y="{y}" width="{w:.1f}" height="{BAR_HEIGHT}" fill="{color}" rx="3"/>'
+            f'<text x="{LABEL_WIDTH + w + 6:.1f}" y="{y + 15}">{float(valor):,.0f}</text>'
+        )
+    alto = len(df) * (BAR_HEIGHT + 6)
+    return (f"<h3>{html.escape(title)}</h3>"
+            f'<svg width="{CHART_WIDTH}" height="{alto}" font-family="sans-serif" font-size="12" fill="#2c3e50">'
+            + "".join(filas) + "</svg>")
+
+
+def _cards(kpis_dict, titulos):
+    return "".join(
+        f'<div class="card"><div class="t">{html.escape(titulos[k])}</div>'
+        f'<div class="v">{v:,.2f}</div></div>' if isinstance(v, float) else
+        f'<div class="card"><div class="t">{html.escape(titulos[k])}</div><div class="v">{v:,}</div></div>'
+        for k, v in kpis_dict.items()
+    )
+
+
+def _html(grupo, valor, kpis_l, kpis_o, desgloses, ficheros):
+    titulo = f"{GROUPS[grupo]}: {valor}"
+    enlaces = "".join(f'<li><a href="{f}">{f}</a></li>' for f in ficheros)
+    return f"""<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>{html.escape(titulo)}</title>
+<style>
+body {{ background: #f7f9fb; color: #2c3e50; font-family: sans-serif; margin: 30px; }}
+h1, h2 {{ color: #005f73; }}
+.cards {{ display: flex; flex-wrap: wrap; gap: 14px; }}
+.card {{ background: #ffffff; border: 1px solid #dce3ea; border-radius: 12px; padding: 14px 20px; min-width: 170px; }}
+.t {{ font-size: 13px; color: #6c757d; }}
+.v {{ font-size: 22px; font-weight: 700; color: #1b263b; margin-top: 4px; }}
+</style></head><body>
+<h1>📊 {html.escape(titulo)}</h1>
+<p>Informe generado el {date.today():%d/%m/%Y}.</p>
+<h2>👥 Leads</h2><div class="cards">{_cards(kpis_l, LEAD_KPIS)}</div>
+{_svg_bars(desgloses["estado"], "Estado", "Cantidad", "Leads por Estado", COLORS["leads"])}
+{_svg_bars(desgloses["tecnologia"], "Tecnologia", "Cantidad", "Leads por Tecnología", COLORS["leads"])}
+<h2>💼 Ofertas</h2><div class="cards">{_cards(kpis_o, OFFER_KPIS)}</div>
+{_svg_bars(desgloses["pipeline"], "Estado", "Pipeline Ponderado (€)", "Pipeline ponderado por estado (€)",
+           COLORS["ofertas"])}
+{f"<h2>📁 Datos</h2><ul>{enlaces}</ul>" if ficheros else ""}
+</body></html>
+"""
+
+
+def _init(data=None):
+    # Con "spawn" los datos llegan aquí una vez por proceso; con "fork" ya están heredados
+    if data is not None:
+        _data.update(data)
+
+
+def build_report(task):
+    grupo, valor, carpeta, pos_leads, pos_ofertas = task
+    inicio = time.perf_counter()
+    leads = _data["leads"].iloc[pos_leads]
+    offers = _data["offers"].iloc[pos_ofertas]
+    kpis_l, kpis_o = lead_kpis(leads), offer_kpis(offers)
+    desgloses = {
+        "estado": breakdown(leads, "Estado"),
+        "tecnologia": breakdown(leads, "Tecnologia"),
+        "pipeline": pipeline_by(offers, "Estado").reset_index(),
+    }
+
+    os.makedirs(carpeta, exist_ok=True)
+    ficheros = []
+    if "csv" in _data["formats"]:
+        indicadores = [(LEAD_KPIS[k], v) for k, v in kpis_l.items()] + [(OFFER_KPIS[k], v) for k, v in kpis_o.items()]
+        tablas = {
+            "kpis.csv": pd.DataFrame(indicadores, columns=["Indicador", "Valor"]),
+            "leads.csv": leads,
+            "ofertas.csv": offers,
+            "leads_por_estado.csv": desgloses["estado"],
+            "leads_por_tecnologia.csv": desgloses["tecnologia"],
+            "pipeline_por_estado.csv": desgloses["pipeline"],
+        }
+        for nombre, df in tablas.items():
+            df.to_csv(os.path.join(carpeta, nombre), index=False)
+        ficheros = list(tablas)
+    if "html" in _data["formats"]:
+        with open(os.path.join(carpeta, "informe.html"), "w", encoding="utf-8") as f:
+            f.write(_html(grupo, valor, kpis_l, kpis_o, desgloses, ficheros))
+
+    return dict({"Agrupación": grupo, "Valor": valor, "Carpeta": carpeta},
+                **{LEAD_KPIS[k]: v for k, v in kpis_l.items()}, **{OFFER_KPIS[k]: v for k, v in kpis_o.items()},
+                Segundos=round(time.perf_counter() - inicio, 3))
+
+
+def run_reports(out_dir, groups, workers, formats, leads_file=LEADS_FILE, offers_file=OFFERS_FILE):
+    # Devuelve el índice de informes generados (también se guarda en out_dir/indice.csv)
+    leads, offers = load_pipeline(leads_file, offers_file)
+    _data.update(leads=leads, offers=offers, formats=list(formats))
+    tareas = _tasks(leads, offers, groups, out_dir)
+    if workers <= 1 or len(tareas) <= 1:
+        filas = [build_report(t) for t in tareas]
+    else:
+        fork = "fork" in multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context("fork" if fork else "spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto, initializer=_init,
+                                 initargs=() if fork else (dict(_data),)) as pool:
+            filas = list(pool.map(build_report, tareas, chunksize=max(1, len(tareas) // (workers * 4))))
+    indice = pd.DataFrame(filas)
+    os.makedirs(out_dir, exist_ok=True)
+    indice.to_csv(os.path.join(out_dir, "indice.csv"), index=False)
+    return indice
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera informes de KPIs por Responsable y por cliente.")
+    parser.add_argument("--por", nargs="+", choices=list(GROUPS), default=list(GROUPS),
+                        help="agrupaciones de los informes")
+    parser.add_argument("--out", default=os.path.join(REPORTS_DIR, date.today().isoformat()),
+                        help="directorio de salida")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="procesos del pool")
+    parser.add_argument("--formatos", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--leads", default=LEADS_FILE)
+    parser.add_argument("--ofertas", default=OFFERS_FILE)
+    args = parser.parse_args()
+    inicio = time.perf_counter()
+    indice = run_reports(args.out, args.por, args.workers, args.formatos, args.leads, args.ofertas)
+    for grupo, n in indice.groupby("Agrupación").size().items() if not indice.empty else []:
+        print(f"{grupo}: {n:,} informes")
+    print(f"{len(indice):,} informes en {args.out} ({time.perf_counter() - inicio:,.1f} s)")
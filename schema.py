@@ -0,0 +1,318 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import CategoricalDtype, is_datetime64_any_dtype
+
+# ================================
+# 🧬 ESQUEMA DE LAS TABLAS
+# ================================
+# Un único esquema por entidad con el tipo de cada columna. storage lo usa al
+# cargar (tipos compactos: categorías para los enumerados, fechas, enteros
+# nullables), al validar altas/ediciones y al reproducir el journal. Las
+# medidas son float64: en float32 un 85,28 se leería como 85,27999877929688 y
+# así acabaría en el journal, el historial, SQLite y los informes.
+# Tipos: lista de valores (enumerado), "category" (categoría abierta), "text",
+# "note" (texto libre, vacío en lugar de NaN), "date" o un dtype de pandas.
+ESTADOS_LEAD = ["Nuevo", "En curso", "Negociación", "Cerrado Ganado", "Cerrado Perdido"]
+TECNOLOGIAS = ["Solar", "Eólica", "Solar+BESS", "Otro"]
+TIPOS_PPA = ["Pay-as-Produced", "Solar Profile", "Baseload Solar", "Otro"]
+TIPOS_CLIENTE = ["Productor", "Consumidor", "Trader", "Otro"]
+ESTADOS_OFERTA = ["Enviada", "En negociación", "Aprobada", "Rechazada", "Cerrada"]
+
+SCHEMAS = {
+    "leads": {
+        "ID Lead": "Int64",
+        "ID Cliente": "Int64",
+        "Cliente": "category",
+        "Contacto": "text",
+        "Estado": ESTADOS_LEAD,
+        "Tecnologia": TECNOLOGIAS,
+        "Tipo PPA": TIPOS_PPA,
+        "Duracion": "Int16",
+        "Fecha Alta": "date",
+        "Capacidad": "float64",
+        "Ubicacion": "text",
+        "Produccion": "float64",
+        "Responsable": "category",
+        "Notas": "note",
+        "Docs": "note",
+    },
+    "offers": {
+        "ID Oferta": "Int64",
+        "ID Lead": "Int64",
+        "Fecha Oferta": "date",
+        "Precio EUR/MWh": "float64",
+        "Volumen MWh": "float64",
+        "Probabilidad (%)": "float64",
+        "Estado": ESTADOS_OFERTA,
+        "Notas": "note",
+        "Docs": "note",
+    },
+    "clients": {
+        "ID Cliente": "Int64",
+        "Nombre": "text",
+        "CIF/NIF": "text",
+        "Dirección": "text",
+        "Ciudad": "category",
+        "Provincia": "category",
+        "País": "category",
+        "Tipo": TIPOS_CLIENTE,
+        "Sector": "category",
+        "Notas": "note",
+        "Docs": "note",
+    },
+}
+
+# Columna de versión que storage añade a las filas de todas las tablas para
+# detectar conflictos; no es un campo de la entidad (no sale en columns()).
+# Las filas anteriores a la columna quedan con versión 0
+VERSION_COL = "Version"
+VERSION_DTYPE = "Int64"
+
+
+# Rangos admitidos (mínimo, máximo; None = sin límite) de las columnas numéricas
+RANGES = {
+    "leads": {"Duracion": (5, 15), "Capacidad": (0, None), "Produccion": (0, None)},
+    "offers": {"Precio EUR/MWh": (0, None), "Volumen MWh": (0, None), "Probabilidad (%)": (0, 100)},
+}
+
+
+def columns(table):
+    return list(SCHEMAS[table])
+
+
+def _dtype(spec):
+    if isinstance(spec, list):
+        return CategoricalDtype(spec)
+    if spec == "category":
+        return CategoricalDtype()
+    if spec in ("text", "note"):
+        return np.dtype(object)
+    if spec == "date":
+        return np.dtype("datetime64[ns]")
+    return pd.api.types.pandas_dtype(spec)
+
+
+def _is_missing(value):
+    return value is None or (np.ndim(value) == 0 and pd.isna(value))
+
+
+def cast(series, dtype):
+    if isinstance(dtype, CategoricalDtype):
+        # Los valores fuera del catálogo se conservan como categorías adicionales
+        base = list(dtype.categories) if dtype.categories is not None else []
+        present = series.cat.categories if isinstance(series.dtype, CategoricalDtype) else series.dropna().unique()
+        known = set(base)
+        extra = sorted((v for v in present if v not in known), key=str)
+        categories = base + extra
+        if isinstance(series.dtype, CategoricalDtype) and list(series.cat.categories) == categories:
+            return series
+        if isinstance(series.dtype, CategoricalDtype):
+            return series.cat.set_categories(categories)
+        return series.astype(CategoricalDtype(categories, ordered=dtype.ordered))
+    if is_datetime64_any_dtype(dtype):
+        if is_datetime64_any_dtype(series.dtype):
+            return series
+        return pd.to_datetime(series, errors="coerce", format="ISO8601")
+    if series.dtype == dtype:
+        return series
+    if dtype == object:
+        return series.astype(object)
+    numbers = pd.to_numeric(series, errors="coerce")
+    if dtype.kind in "iu" and (numbers.dropna() % 1 != 0).any():
+        return numbers  # decimales en una columna entera: se conservan como float
+    return numbers.astype(dtype)
+
+
+def _cast_column(df, col, spec):
+    df[col] = cast(df[col], _dtype(spec))
+    if spec == "note":
+        df[col] = df[col].fillna("").replace("nan", "")
+    elif col == VERSION_COL:
+        df[col] = df[col].fillna(0)
+
+
+def _typed(table):
+    schema = SCHEMAS.get(table)
+    return None if schema is None else dict(schema, **{VERSION_COL: VERSION_DTYPE})
+
+
+def apply_schema(df, table):
+    # Convierte las columnas del DataFrame a los tipos del esquema (en el sitio)
+    schema = _typed(table)
+    if schema is None or df is None:
+        return df
+    for col, spec in schema.items():
+        if col in df.columns:
+            _cast_column(df, col, spec)
+    return df
+
+
+def restore_dtypes(df, dtypes):
+    # Tras un concat las columnas pierden su tipo: se restauran los anteriores
+    for col, dtype in dtypes.items():
+        if col in df.columns and df[col].dtype != dtype:
+            df[col] = cast(df[col], dtype)
+    return df
+
+
+def append_rows(df, rows, table=None):
+    # Añade filas (dicts) al final de df: solo se convierten las filas nuevas a
+    # los tipos de df. Las categóricas se unen por códigos (las categorías
+    # nuevas van al final del catálogo); pd.concat compararía y uniría los
+    # catálogos completos, que en Cliente tienen tantas entradas como clientes.
+    nuevas = pd.DataFrame(rows)
+    notas = [col for col, spec in SCHEMAS.get(table, {}).items() if spec == "note"]
+    for col in notas:
+        if col in df.columns or col in nuevas:
+            nuevas[col] = nuevas[col].fillna("").replace("nan", "") if col in nuevas else ""
+    if df.empty and len(df.columns) == 0:
+        return nuevas
+    categorias = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, CategoricalDtype):
+            valores = nuevas[col].astype(object) if col in nuevas else pd.Series(None, index=nuevas.index, dtype=object)
+            codigos = dtype.categories.get_indexer(valores)
+            extra = pd.unique(valores[(codigos == -1) & valores.notna()])
+            if len(extra):
+                dtype = CategoricalDtype(dtype.categories.append(pd.Index(extra, dtype=object)), ordered=dtype.ordered)
+                codigos = dtype.categories.get_indexer(valores)
+            categorias[col] = (dtype, codigos)
+        elif col in nuevas:
+            nuevas[col] = cast(nuevas[col], dtype)
+    resto = [col for col in df.columns if col not in categorias]
+    result = pd.concat([df[resto], nuevas.drop(columns=[c for c in categorias if c in nuevas])], ignore_index=True)
+    for col, (dtype, codigos) in categorias.items():
+        codes = np.concatenate([df[col].cat.codes.to_numpy(dtype=np.int64), codigos])
+        result[col] = pd.Categorical.from_codes(codes, dtype=dtype)
+    result = result[list(df.columns) + [col for col in result.columns if col not in df.columns]]
+    # Una columna del esquema que aparece con estas filas (notas, versión) toma su
+    # tipo: las filas anteriores quedan con notas vacías y versión 0, no NaN
+    for col, spec in (_typed(table) or {}).items():
+        if col in nuevas and col not in df.columns:
+            _cast_column(result, col, spec)
+    return restore_dtypes(result, df.dtypes[resto])
+
+
+def assign_values(df, rows, values):
+    # df.loc[rows, col] = valor manteniendo el dtype de cada columna
+    for col, value in values.items():
+        if col not in df.columns:
+            df.loc[rows, col] = value
+            continue
+        dtype = df[col].dtype
+        if isinstance(dtype, CategoricalDtype):
+            nuevos = [v for v in pd.unique(np.ravel(np.asarray(value, dtype=object)))
+                      if not _is_missing(v) and v not in dtype.categories]
+            if nuevos:
+                df[col] = df[col].cat.add_categories(nuevos)
+        elif is_datetime64_any_dtype(dtype):
+            value = pd.to_datetime(value, errors="coerce", format="ISO8601")
+        elif isinstance(dtype, np.dtype) and dtype.kind == "f":
+            value = np.asarray(value, dtype=dtype) if np.ndim(value) else dtype.type(np.nan if _is_missing(value) else value)
+        df.loc[rows, col] = value
+    return df
+
+
+def _coerce(col, spec, value):
+    if hasattr(value, "item") and np.ndim(value) == 0:
+        value = value.item()
+    if spec == "note":
+        return "" if _is_missing(value) else str(value)
+    if _is_missing(value) or (value == "" and spec != "text"):
+        return None
+    if isinstance(spec, list):
+        if value not in spec:
+            raise ValueError(f"Valor no válido para '{col}': {value!r} (permitidos: {', '.join(spec)})")
+        return value
+    if spec in ("text", "category"):
+        return str(value)
+    if spec == "date":
+        try:
+            return pd.Timestamp(value).date()
+        except (TypeError, ValueError):
+            raise ValueError(f"Fecha no válida para '{col}': {value!r}") from None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Valor numérico no válido para '{col}': {value!r}") from None
+    if str(spec).startswith("Int"):
+        if not number.is_integer():
+            raise ValueError(f"'{col}' debe ser un número entero: {value!r}")
+        return int(number)
+    return number
+
+
+def _range_error(col, rango):
+    lo, hi = rango
+    if hi is None:
+        return f"'{col}' debe ser mayor o igual que {lo}"
+    return f"'{col}' debe estar entre {lo} y {hi}"
+
+
+def validate(table, values):
+    # Comprueba y normaliza los valores de una fila antes de escribirla
+    schema = SCHEMAS.get(table)
+    if schema is None:
+        return dict(values)
+    clean = {col: _coerce(col, schema[col], value) if col in schema else value for col, value in values.items()}
+    for col, (lo, hi) in RANGES.get(table, {}).items():
+        value = clean.get(col)
+        if value is not None and ((lo is not None and value < lo) or (hi is not None and value > hi)):
+            raise ValueError(_range_error(col, (lo, hi)))
+    return clean
+
+
+def _parse_dates(raw):
+    # ISO (2025-06-18) o formato español (18/06/2025)
+    fechas = pd.to_datetime(raw, errors="coerce", format="ISO8601")
+    pendientes = fechas.isna() & raw.notna()
+    if pendientes.any():
+        fechas[pendientes] = pd.to_datetime(raw[pendientes], errors="coerce", format="%d/%m/%Y")
+    return fechas
+
+
+def validate_frame(table, df):
+    # Versión vectorizada de validate para importaciones en bloque: devuelve el
+    # DataFrame tipado y los errores (fila, columna, valor, error) sin recorrer
+    # las filas una a una
+    schema = SCHEMAS[table]
+    typed = pd.DataFrame(index=df.index)
+    errores = []
+    for col, spec in schema.items():
+        if col not in df.columns:
+            continue
+        raw = df[col]
+        texto = raw.astype(str).str.strip()
+        presente = raw.notna() & (texto != "")
+        raw = raw.where(presente)
+        malos = []
+        if isinstance(spec, list):
+            malos.append((presente & ~texto.isin(spec), f"valor no permitido (permitidos: {', '.join(spec)})"))
+            valores = texto.where(presente)
+        elif spec == "date":
+            valores = _parse_dates(raw)
+            malos.append((presente & valores.isna(), "fecha no válida"))
+        elif spec in ("text", "category", "note"):
+            valores = raw
+        else:
+            # Admite coma decimal (CSV exportado desde Excel en español)
+            texto_num = texto.where(~texto.str.contains(r"^-?\d+,\d+$", regex=True), texto.str.replace(",", "."))
+            valores = pd.to_numeric(texto_num.where(presente), errors="coerce")
+            malos.append((presente & valores.isna(), "no es un número"))
+            if str(spec).startswith("Int"):
+                malos.append((valores.notna() & (valores % 1 != 0), "debe ser un número entero"))
+            lo, hi = RANGES.get(table, {}).get(col, (None, None))
+            if lo is not None:
+                malos.append((valores < lo, _range_error(col, (lo, hi))))
+            if hi is not None:
+                malos.append((valores > hi, _range_error(col, (lo, hi))))
+        for mask, mensaje in malos:
+            if mask.any():
+                errores.append(pd.DataFrame({"Fila": df.index[mask], "Columna": col,
+                                             "Valor": df.loc[mask, col].astype(str), "Error": mensaje}))
+                valores = valores.where(~mask)
+        typed[col] = valores
+    errores = pd.concat(errores, ignore_index=True) if errores else \
+        pd.DataFrame(columns=["Fila", "Columna", "Valor", "Error"])
+    return apply_schema(typed, table), errores
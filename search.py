@@ -0,0 +1,263 @@
+import os
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from storage import changes_since, data_version
+
+# ================================
+# 🔍 ÍNDICE DE BÚSQUEDA POR NOMBRE
+# ================================
+# Índice de n-gramas sobre los textos normalizados (sin tildes, casefold,
+# espacios recortados) de las columnas de búsqueda de cada tabla. Para cada
+# n-grama de 1 a 3 caracteres se guarda la lista ordenada de filas que lo
+# contienen (arrays de numpy construidos de una vez): una consulta de 1-3
+# caracteres es directamente su lista ("ab" encuentra "Kabel") y una más
+# larga intersecta las listas de sus trigramas y verifica la subcadena solo
+# en los candidatos. Las altas/ediciones que llegan por el journal se guardan
+# aparte (se recorren en cada consulta) y marcan como obsoleta su fila
+# anterior; pasadas DIRTY_LIMIT se rehacen las listas. El índice se comparte
+# entre sesiones, se construye en segundo plano al cargar la tabla
+# (warm_index) y una sola vez aunque lo pidan varias sesiones a la vez; la
+# construcción no retiene el lock global, así que no bloquea las búsquedas de
+# otras tablas.
+SEARCH_FIELDS = {
+    "clients": ("ID Cliente", ["Nombre", "CIF/NIF"]),
+    "leads": ("ID Lead", ["Cliente", "Contacto"]),
+}
+NGRAM = 3
+# Altas/ediciones/bajas acumuladas fuera de las listas antes de rehacerlas
+DIRTY_LIMIT = 2_000
+# Cada carácter ocupa 21 bits en el código de un n-grama (hasta 3 en un int64)
+_BITS = 21
+# Separador de los campos en el texto de cada fila: ningún n-grama lo contiene
+SEP = "\x00"
+
+
+def normalize(text):
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return ""
+    text = str(text)
+    if text.isascii():
+        # Sin caracteres compuestos: NFKD no cambia nada
+        return " ".join(text.lower().split())
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.casefold().split())
+
+
+def _key(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _grams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _gram_text(code):
+    chars = []
+    while code:
+        chars.append(chr(code & ((1 << _BITS) - 1)))
+        code >>= _BITS
+    return "".join(chars)
+
+
+def _postings(texts):
+    # Listas ordenadas de filas por n-grama (n = 1..NGRAM) del texto de cada fila.
+    # Devuelve las filas de todos los n-gramas seguidas y {n-grama: (inicio, fin)}
+    cp = np.frombuffer((SEP.join(texts) + SEP).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    largos = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+    filas = np.repeat(np.arange(len(texts), dtype=np.int32), largos)
+    valido = cp != 0
+    code = cp.copy()
+    ok = valido.copy()
+    codes, rows = [code[ok]], [filas[ok]]
+    for k in range(1, NGRAM):
+        # El n-grama que empieza en cada posición: se añade el carácter k posiciones más allá
+        code[:-k] |= cp[k:] << (_BITS * k)
+        ok[:-k] &= valido[k:]
+        ok[-k:] = False
+        codes.append(code[ok])
+        rows.append(filas[ok])
+    codes = np.concatenate(codes)
+    rows = np.concatenate(rows)
+    if not len(codes):
+        return np.empty(0, dtype=np.int32), {}
+    # Agrupar por n-grama conservando el orden de las filas (radix con pocos n-gramas)
+    ids, uniques = pd.factorize(codes)
+    orden = np.argsort(ids.astype(np.uint16) if len(uniques) <= 1 << 16 else ids, kind="stable")
+    ids = ids[orden]
+    rows = rows[orden]
+    nuevo = np.ones(len(rows), dtype=bool)
+    nuevo[1:] = (ids[1:] != ids[:-1]) | (rows[1:] != rows[:-1])
+    ids = ids[nuevo]
+    rows = rows[nuevo]
+    cortes = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+    inicios = np.concatenate([[0], cortes]).tolist()
+    fines = np.concatenate([cortes, [len(rows)]]).tolist()
+    grams = {_gram_text(c): t for c, t in zip(uniques[ids[inicios]].tolist(), zip(inicios, fines))}
+    return rows, grams
+
+
+class NgramIndex:
+    # Listas de filas (posiciones en keys) por n-grama, construidas de una vez, más
+    # las altas/ediciones posteriores (dirty) y las filas que ya no valen (stale).
+    # El texto de cada fila son sus campos normalizados unidos con SEP
+    def __init__(self, df, key_col, fields):
+        self.key_col = key_col
+        self.fields = fields
+        keys, texts = [], []
+        if not df.empty:
+            keys = [_key(v) for v in df[key_col].tolist()]
+            texts = [SEP.join(fila) for fila in zip(*([normalize(v) for v in df[f].tolist()] for f in fields))]
+        self._build(keys, texts)
+
+    def _build(self, keys, texts):
+        self.keys = np.array(keys) if keys else np.empty(0, dtype=np.int64)
+        self.keys.flags.writeable = False
+        self.texts = texts
+        self.rows = {k: i for i, k in enumerate(keys)}
+        self.stale = np.zeros(len(keys), dtype=bool)
+        self.n_stale = 0
+        self.dirty = {}
+        self.postings, self.grams = _postings(texts) if texts else (np.empty(0, np.int32), {})
+
+    def _current(self, key):
+        if key in self.dirty:
+            return self.dirty[key]
+        i = self.rows.get(key)
+        return self.texts[i] if i is not None and not self.stale[i] else None
+
+    def _remove(self, key):
+        text = self._current(key)
+        self.dirty.pop(key, None)
+        i = self.rows.get(key)
+        if i is not None and not self.stale[i]:
+            self.stale[i] = True
+            self.n_stale += 1
+        return dict(zip(self.fields, text.split(SEP))) if text is not None else None
+
+    def _add(self, key, values):
+        self._remove(key)
+        self.dirty[key] = SEP.join(normalize(values.get(f)) for f in self.fields)
+
+    def apply(self, records):
+        for rec in records:
+            if rec["op"] == "insert":
+                self._add(_key(rec["row"][self.key_col]), rec["row"])
+            elif rec["op"] == "update":
+                key = _key(rec["id"])
+                if not any(f in rec["values"] for f in self.fields):
+                    continue
+                old = self._remove(key) or {}
+                self._add(key, dict(old, **rec["values"]))
+            else:
+                self._remove(_key(rec["id"]))
+        if len(self.dirty) + self.n_stale > DIRTY_LIMIT:
+            # Se rehacen las listas con los textos ya normalizados, sin releer la tabla
+            vivas = [(k, t) for k, t, s in zip(self.keys.tolist(), self.texts, self.stale) if not s]
+            vivas += list(self.dirty.items())
+            self._build([k for k, _ in vivas], [t for _, t in vivas])
+
+    def _filas(self, query):
+        # Filas de la construcción cuyo texto contiene query
+        if len(query) <= NGRAM:
+            return self.postings[slice(*self.grams.get(query, (0, 0)))]
+        tramos = sorted((self.grams.get(g, (0, 0)) for g in _grams(query)), key=lambda t: t[1] - t[0])
+        filas = self.postings[slice(*tramos[0])]
+        for a, b in tramos[1:]:
+            # Intersección de listas ordenadas: la corta se busca en la larga
+            lista = self.postings[a:b]
+            pos = np.minimum(np.searchsorted(lista, filas), len(lista) - 1)
+            filas = filas[lista[pos] == filas] if len(lista) else lista
+        return [i for i in filas.tolist() if query in self.texts[i]]
+
+    def lookup(self, query):
+        # Array de claves (no modificar); lo usan isin
+        query = normalize(query)
+        if not query:
+            filas = None
+            extra = list(self.dirty)
+        else:
+            filas = self._filas(query)
+            extra = [k for k, text in self.dirty.items() if query in text]
+        if filas is None:
+            base = self.keys[~self.stale] if self.n_stale else self.keys
+        else:
+            filas = np.asarray(filas, dtype=np.int32)
+            base = self.keys[filas[~self.stale[filas]] if self.n_stale else filas]
+        return np.concatenate([base, np.array(extra, dtype=base.dtype)]) if extra else base
+
+
+# Índices compartidos por todas las sesiones del proceso. _lock solo protege
+# los diccionarios; cada índice tiene su propio lock para aplicar el journal y
+# _building guarda el evento de la construcción en curso de cada fichero
+_lock = threading.Lock()
+_indexes = {}
+_building = {}
+
+
+def _table(file):
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def _entry(file, load):
+    # Índice de file; si otra sesión (o warm_index) ya lo construye, se espera a ese
+    while True:
+        with _lock:
+            entry = _indexes.get(file)
+            if entry is not None:
+                return entry
+            evento = _building.get(file)
+            if evento is None:
+                evento = _building[file] = threading.Event()
+                break
+        evento.wait()
+    try:
+        version = data_version(file)
+        key_col, fields = SEARCH_FIELDS[_table(file)]
+        entry = {"index": NgramIndex(load(), key_col, fields), "version": version, "lock": threading.Lock()}
+        with _lock:
+            _indexes[file] = entry
+        return entry
+    finally:
+        with _lock:
+            _building.pop(file, None)
+        evento.set()
+
+
+def warm_index(file, load):
+    # Lanza la construcción del índice en segundo plano si aún no existe
+    with _lock:
+        if file in _indexes or file in _building:
+            return
+    threading.Thread(target=_entry, args=(file, load), name="ppa-search", daemon=True).start()
+
+
+def matching_ids(file, query, load):
+    # load() -> DataFrame de la tabla; solo se llama si hay que construir el índice
+    while True:
+        entry = _entry(file, load)
+        with entry["lock"]:
+            records, version = changes_since(file, entry["version"])
+            if records is not None:
+                entry["index"].apply(records)
+                entry["version"] = version
+                return entry["index"].lookup(query)
+        # El journal ya no cubre la versión del índice: se descarta y se reconstruye
+        with _lock:
+            if _indexes.get(file) is entry:
+                del _indexes[file]
+
+
+def search_rows(df, file, query, load):
+    # Filtra df (ya filtrado o no) a las filas cuyo nombre contiene la consulta
+    if not query or not query.strip():
+        return df
+    key_col = SEARCH_FIELDS[_table(file)][0]
+    return df[df[key_col].isin(matching_ids(file, query, load))]
@@ -0,0 +1,73 @@
+import io
+import sys
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+# ================================
+# 🧠 ESTADO DE SESIÓN ACOTADO
+# ================================
+# Las pestañas de edición guardan estado por registro (versión abierta,
+# avisos de conflicto, widgets con key "<prefijo>_<id>", ficheros subidos).
+# Streamlit conserva ese estado toda la sesión, así que cada registro que el
+# usuario abre se queda en memoria. touch_record lleva una lista LRU de los
+# registros abiertos por tipo y, al pasar de MAX_RECORDS, borra el estado del
+# registro usado hace más tiempo. Los ficheros subidos se sueltan en cuanto
+# se han guardado (upload_key cambia de key y Streamlit descarta el anterior).
+MAX_RECORDS = 10
+LRU_KEY = "_registros_recientes"
+TOP_KEYS = 10
+
+
+def _record_keys(prefixes, record_id):
+    # Claves "<prefijo>_<id>" y "<prefijo>_<id>_<n>" (subidas con contador)
+    exactas = {f"{prefix}_{record_id}" for prefix in prefixes}
+    inicios = tuple(f"{clave}_" for clave in exactas)
+    return [k for k in list(st.session_state.keys())
+            if isinstance(k, str) and (k in exactas or k.startswith(inicios))]
+
+
+def touch_record(kind, record_id, prefixes):
+    # Marca el registro como el más reciente de su tipo y libera los más antiguos
+    recientes = st.session_state.setdefault(LRU_KEY, {}).setdefault(kind, OrderedDict())
+    recientes[record_id] = True
+    recientes.move_to_end(record_id)
+    while len(recientes) > MAX_RECORDS:
+        antiguo, _ = recientes.popitem(last=False)
+        for key in _record_keys(prefixes, antiguo):
+            del st.session_state[key]
+
+
+def upload_key(prefix, record_id):
+    # Key del file_uploader del registro; cambia tras guardar la subida
+    return f"{prefix}_{record_id}_{st.session_state.get(f'{prefix}_n_{record_id}', 0)}"
+
+
+def release_upload(prefix, record_id):
+    # La subida ya está persistida: en el siguiente rerun el uploader es otro
+    # widget y Streamlit libera el fichero del anterior
+    st.session_state[f"{prefix}_n_{record_id}"] = st.session_state.get(f"{prefix}_n_{record_id}", 0) + 1
+
+
+def _size(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, io.BytesIO):  # UploadedFile
+        return value.getbuffer().nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) \
+            else int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size(k) + _size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def session_memory():
+    # (total en bytes, tabla con las claves que más ocupan) de la sesión actual
+    tamaños = pd.DataFrame(
+        [(str(k), _size(v)) for k, v in st.session_state.items()], columns=["Clave", "Bytes"]
+    ).sort_values("Bytes", ascending=False, ignore_index=True)
+    return int(tamaños["Bytes"].sum()), tamaños.head(TOP_KEYS)
@@ -0,0 +1,328 @@
+import argparse
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+# ================================
+# 🗃️ BACKEND SQLITE (opcional)
+# ================================
+# Se activa con PPA_STORAGE=sqlite. Las tablas conservan los nombres de
+# columna de los CSV para que load_data devuelva exactamente el mismo
+# DataFrame; los filtros y KPIs se resuelven en SQL usando los índices.
+DB_FILE = os.environ.get("PPA_DB_FILE", "ppa.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clients (
+    "ID Cliente" INTEGER PRIMARY KEY,
+    "Nombre" TEXT NOT NULL,
+    "CIF/NIF" TEXT,
+    "Dirección" TEXT,
+    "Ciudad" TEXT,
+    "Provincia" TEXT,
+    "País" TEXT,
+    "Tipo" TEXT,
+    "Sector" TEXT,
+    "Notas" TEXT,
+    "Docs" TEXT,
+    "Version" INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS leads (
+    "ID Lead" INTEGER PRIMARY KEY,
+    "ID Cliente" INTEGER REFERENCES clients ("ID Cliente"),
+    "Cliente" TEXT,
+    "Contacto" TEXT,
+    "Estado" TEXT,
+    "Tecnologia" TEXT,
+    "Tipo PPA" TEXT,
+    "Duracion" INTEGER,
+    "Fecha Alta" TEXT,
+    "Capacidad" REAL,
+    "Ubicacion" TEXT,
+    "Produccion" REAL,
+    "Responsable" TEXT,
+    "Notas" TEXT,
+    "Docs" TEXT,
+    "Version" INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS offers (
+    "ID Oferta" INTEGER PRIMARY KEY,
+    "ID Lead" INTEGER REFERENCES leads ("ID Lead"),
+    "Fecha Oferta" TEXT,
+    "Precio EUR/MWh" REAL,
+    "Volumen MWh" REAL,
+    "Probabilidad (%)" INTEGER,
+    "Estado" TEXT,
+    "Notas" TEXT,
+    "Docs" TEXT,
+    "Version" INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS documents (
+    "ID Doc" INTEGER PRIMARY KEY,
+    "Hash" TEXT NOT NULL,
+    "Entidad" TEXT NOT NULL,
+    "ID Entidad" INTEGER NOT NULL,
+    "Archivo" TEXT,
+    "Tamaño" INTEGER,
+    "Mime" TEXT,
+    "Fecha Subida" TEXT,
+    "Version" INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_clients_nombre ON clients ("Nombre");
+CREATE INDEX IF NOT EXISTS idx_clients_tipo ON clients ("Tipo");
+CREATE INDEX IF NOT EXISTS idx_leads_cliente_id ON leads ("ID Cliente");
+CREATE INDEX IF NOT EXISTS idx_leads_cliente ON leads ("Cliente");
+CREATE INDEX IF NOT EXISTS idx_leads_estado ON leads ("Estado");
+CREATE INDEX IF NOT EXISTS idx_leads_responsable ON leads ("Responsable");
+CREATE INDEX IF NOT EXISTS idx_offers_lead ON offers ("ID Lead");
+CREATE INDEX IF NOT EXISTS idx_offers_estado ON offers ("Estado");
+CREATE INDEX IF NOT EXISTS idx_documents_entidad ON documents ("Entidad", "ID Entidad");
+CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents ("Hash");
+
+-- Versión por tabla: permite cachear lecturas entre procesos sin comparar datos
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO table_versions (name) VALUES ('clients'), ('leads'), ('offers'), ('documents');
+
+-- Secuencias monótonas de IDs (no reutilizan IDs aunque se borren filas)
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+TABLES = ("clients", "leads", "offers", "documents")
+KEYS = {"clients": "ID Cliente", "leads": "ID Lead", "offers": "ID Oferta", "documents": "ID Doc"}
+
+# Claves foráneas vacías en los CSV ("" o NaN) se guardan como NULL
+_FOREIGN_KEYS = {"leads": "ID Cliente", "offers": "ID Lead"}
+
+
+def _q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+_initialized = set()
+
+
+def connect(db_file=None):
+    db_file = db_file or DB_FILE
+    conn = sqlite3.connect(db_file, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA foreign_keys = ON")
+    if db_file not in _initialized:
+        conn.execute("PRAGMA journal_mode = WAL")
+        # Bases creadas antes de la columna de versión por fila
+        for t in TABLES:
+            cols = [r[1] for r in conn.execute(f"PRAGMA table_info({t})")]
+            if cols and "Version" not in cols:
+                conn.execute(f'ALTER TABLE {t} ADD COLUMN "Version" INTEGER NOT NULL DEFAULT 1')
+        conn.executescript(SCHEMA + "".join(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{t}_{op.lower()} AFTER {op} ON {t}
+            BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{t}'; END;
+            """
+            for t in TABLES for op in ("INSERT", "UPDATE", "DELETE")
+        ))
+        _initialized.add(db_file)
+    return conn
+
+
+def _clean(table, row):
+    clean = {}
+    for col, value in row.items():
+        if hasattr(value, "item"):
+            value = value.item()
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        if not isinstance(value, str) and pd.isna(value):
+            value = None
+        clean[col] = value
+    fk = _FOREIGN_KEYS.get(table)
+    if clean.get(fk) == "":
+        clean[fk] = None
+    return clean
+
+
+def table_version(table, db_file=None):
+    with closing(connect(db_file)) as conn:
+        return conn.execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()[0]
+
+
+def load_table(table, db_file=None):
+    with closing(connect(db_file)) as conn:
+        return pd.read_sql_query(f"SELECT * FROM {table}", conn)
+
+
+def insert_row(table, row, db_file=None):
+    row = _clean(table, row)
+    cols = ", ".join(_q(c) for c in row)
+    marks = ", ".join("?" for _ in row)
+    with closing(connect(db_file)) as conn, conn:
+        conn.execute(f"INSERT INTO {table} ({cols}) VALUES ({marks})", list(row.values()))
+
+
+def insert_rows(table, rows, db_file=None):
+    # Todas las filas en una sola transacción
+    rows = [_clean(table, row) for row in rows]
+    cols = list(dict.fromkeys(c for row in rows for c in row))
+    with closing(connect(db_file)) as conn, conn:
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(_q(c) for c in cols)}) VALUES ({', '.join('?' for _ in cols)})",
+            [[row.get(c) for c in cols] for row in rows],
+        )
+
+
+def update_row(table, key_col, key, values, expected_version=None, db_file=None):
+    # Devuelve la nueva versión de la fila, o None si expected_version no coincide
+    values = {c: v for c, v in _clean(table, values).items() if c != "Version"}
+    sets = ", ".join(f"{_q(c)} = ?" for c in values)
+    where = f"{_q(key_col)} = ?"
+    params = list(values.values()) + [_clean(table, {key_col: key})[key_col]]
+    if expected_version is not None:
+        where += ' AND "Version" = ?'
+        params.append(int(expected_version))
+    with closing(connect(db_file)) as conn, conn:
+        cur = conn.execute(f'UPDATE {table} SET {sets}, "Version" = "Version" + 1 WHERE {where}', params)
+        if cur.rowcount == 0:
+            exists = conn.execute(f"SELECT 1 FROM {table} WHERE {_q(key_col)} = ?", params[len(values):len(values) + 1])
+            if exists.fetchone() is None:
+                raise KeyError(f"{key_col}={key} no existe")
+            return None
+        return conn.execute(
+            f'SELECT "Version" FROM {table} WHERE {_q(key_col)} = ?', params[len(values):len(values) + 1]
+        ).fetchone()[0]
+
+
+def delete_row(table, key_col, key, db_file=None):
+    with closing(connect(db_file)) as conn, conn:
+        conn.execute(f"DELETE FROM {table} WHERE {_q(key_col)} = ?", [_clean(table, {key_col: key})[key_col]])
+
+
+def next_id(table, key_col, start=1, db_file=None, count=1):
+    with closing(connect(db_file)) as conn:
+        # BEGIN IMMEDIATE: un solo escritor asigna IDs a la vez; los lectores siguen en WAL
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM sequences WHERE name = ?", (table,)).fetchone()
+            if row is None:
+                row = conn.execute(f"SELECT MAX({_q(key_col)}) FROM {table}").fetchone()
+            new_id = max((row[0] or start - 1) + 1, start)
+            conn.execute("INSERT OR REPLACE INTO sequences (name, value) VALUES (?, ?)", (table, new_id + count - 1))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return new_id
+
+
+def _where(equals=None, contains=None, prefix=""):
+    clauses, params = [], []
+    for col, value in (equals or {}).items():
+        clauses.append(f"{prefix}{_q(col)} = ?")
+        params.append(value)
+    for col, value in (contains or {}).items():
+        # LIKE de SQLite ya es insensible a mayúsculas para ASCII
+        clauses.append(f"{prefix}{_q(col)} LIKE ? ESCAPE '\\'")
+        params.append("%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query(table, equals=None, contains=None, db_file=None):
+    where, params = _where(equals, contains)
+    with closing(connect(db_file)) as conn:
+        return pd.read_sql_query(f"SELECT * FROM {table}{where}", conn, params=params)
+
+
+def _offers_where(estado=None, cliente=None, lead_equals=None):
+    clauses, params = [], []
+    if estado:
+        clauses.append('o."Estado" = ?')
+        params.append(estado)
+    if cliente:
+        clauses.append('l."Cliente" = ?')
+        params.append(cliente)
+    lead_where, lead_params = _where(lead_equals, prefix="l.")
+    if lead_where:
+        clauses.append(lead_where[len(" WHERE "):])
+        params += lead_params
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query_offers(estado=None, cliente=None, lead_equals=None, db_file=None):
+    where, params = _offers_where(estado, cliente, lead_equals)
+    with closing(connect(db_file)) as conn:
+        return pd.read_sql_query(
+            'SELECT o.*, l."Cliente" AS "Cliente", l."Responsable" AS "Responsable", l."Estado" AS "Estado Lead" '
+            f'FROM offers o LEFT JOIN leads l ON l."ID Lead" = o."ID Lead"{where}',
+            conn, params=params,
+        )
+
+
+def lead_kpis(equals=None, db_file=None):
+    where, params = _where(equals)
+    with closing(connect(db_file)) as conn:
+        total, capacidad, produccion, responsables = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM("Capacidad"), 0), COALESCE(SUM("Produccion"), 0), '
+            f'COUNT(DISTINCT "Responsable") FROM leads{where}',
+            params,
+        ).fetchone()
+    return {"total": total, "capacidad": capacidad, "produccion": produccion, "responsables": responsables}
+
+
+def offer_kpis(estado=None, cliente=None, lead_equals=None, db_file=None):
+    where, params = _offers_where(estado, cliente, lead_equals)
+    with closing(connect(db_file)) as conn:
+        total, volumen, precio, pipeline = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(o."Volumen MWh"), 0), COALESCE(AVG(o."Precio EUR/MWh"), 0), '
+            'COALESCE(SUM(o."Precio EUR/MWh" * o."Volumen MWh" * o."Probabilidad (%)" / 100.0), 0) '
+            f'FROM offers o LEFT JOIN leads l ON l."ID Lead" = o."ID Lead"{where}',
+            params,
+        ).fetchone()
+    return {"total": total, "volumen": volumen, "precio_medio": precio, "pipeline": pipeline}
+
+
+# ================================
+# 🔁 MIGRACIÓN Y EXPORTACIÓN CSV
+# ================================
+def migrate_from_csv(csv_files, db_file=None):
+    # csv_files: {"clients": "clients.csv", ...}. Orden de carga respetando las FKs
+    with closing(connect(db_file)) as conn, conn:
+        for table in TABLES:
+            file = csv_files.get(table)
+            if not file or not os.path.exists(file):
+                continue
+            df = pd.read_csv(file)
+            cols = [c for c in df.columns if not str(c).startswith("Unnamed")]
+            rows = [tuple(_clean(table, r).values()) for r in df[cols].to_dict("records")]
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(_q(c) for c in cols)}) "
+                f"VALUES ({', '.join('?' for _ in cols)})",
+                rows,
+            )
+    return {t: table_version(t, db_file) for t in TABLES}
+
+
+def export_to_csv(csv_files, db_file=None):
+    for table, file in csv_files.items():
+        load_table(table, db_file).to_csv(file, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migración CSV ⇄ SQLite del PPA Tracker")
+    parser.add_argument("accion", choices=["migrate", "export"])
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--dir", default=".", help="Carpeta de los CSV")
+    args = parser.parse_args()
+
+    files = {t: os.path.join(args.dir, f"{t}.csv") for t in TABLES}
+    files["documents"] = os.path.join(args.dir, "docs", "documents.csv")
+    if args.accion == "migrate":
+        migrate_from_csv(files, args.db)
+        print(f"✅ CSV migrados a {args.db}")
+    else:
+        export_to_csv(files, args.db)
+        print(f"✅ Tablas exportadas a CSV en {args.dir}")
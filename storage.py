@@ -0,0 +1,729 @@
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import kpis
+import sqlite_backend
+from schema import VERSION_COL, append_rows, apply_schema, assign_values, validate
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ================================
+# 🗄️ CACHÉ DE DATOS (compartida entre sesiones)
+# ================================
+# Streamlit vuelve a ejecutar el script en cada interacción, pero los módulos
+# importados viven en el proceso: esta caché se comparte entre todas las
+# sesiones. Cada fichero se identifica por (ruta, mtime, tamaño) y solo se
+# vuelve a parsear el fichero que ha cambiado en disco.
+# Cada versión cacheada es inmutable: con copy-on-write de pandas, load_data
+# entrega a cada sesión una vista sin copia de la versión actual y una sesión
+# que modifica su DataFrame (assign_values tras guardar) solo copia los
+# bloques de columnas que toca. Cada versión nueva se obtiene de la anterior
+# aplicando solo los registros nuevos del journal: las altas se añaden al
+# final (convirtiendo solo esas filas), las ediciones parchean sus celdas y
+# las columnas que no cambian se comparten; las demás sesiones la ven en su
+# siguiente rerun sin releer disco.
+pd.set_option("mode.copy_on_write", True)
+_cache = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "journal_replays": 0, "compactions": 0, "conflicts": 0, "publicadas": 0}
+
+# Cada entrada de caché recibe una versión de datos monótona en el proceso.
+# Los tramos de journal reproducidos se guardan como (desde, hasta, registros)
+# para que las estructuras derivadas (cubo, vistas, índices) se actualicen
+# de forma incremental con changes_since en lugar de recalcularse.
+CHANGES_KEPT = 256
+_version_counter = itertools.count(1)
+_changes = {}
+
+# ================================
+# 📝 JOURNAL DE ESCRITURAS
+# ================================
+# Las altas y ediciones de una fila se añaden como registros JSON al fichero
+# "<tabla>.csv.journal" en lugar de reescribir el CSV completo. La lectura
+# reproduce el journal sobre el último snapshot (el CSV base) y, cuando el
+# journal supera JOURNAL_COMPACT_BYTES, un hilo en segundo plano lo vuelca
+# sobre el CSV base.
+JOURNAL_COMPACT_BYTES = int(os.environ.get("PPA_JOURNAL_COMPACT_BYTES", 1_000_000))
+
+_file_locks = {}
+_compacting = set()
+
+# Backend de almacenamiento: "csv" (por defecto) o "sqlite" (ver sqlite_backend.py)
+BACKEND = os.environ.get("PPA_STORAGE", "csv")
+
+# ================================
+# 🔒 CONCURRENCIA ENTRE SESIONES
+# ================================
+# Los escritores (journal, compactación, snapshots, secuencias de IDs) se
+# serializan con un bloqueo de fichero "<tabla>.csv.lock"; los lectores nunca
+# bloquean: los snapshots se sustituyen con os.replace y una lectura que
+# coincide con una compactación se repite. Cada fila lleva una columna
+# VERSION_COL (schema.py) que se incrementa en cada edición para detectar conflictos.
+
+
+class ConflictError(Exception):
+    pass
+
+
+def _table(file):
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def _file_lock(path):
+    with _lock:
+        if path not in _file_locks:
+            _file_locks[path] = threading.RLock()
+        return _file_locks[path]
+
+
+@contextmanager
+def _locked(path):
+    # RLock para los hilos de este proceso + flock para otros procesos
+    with _file_lock(path):
+        with open(path + ".lock", "a+b") as fh:
+            if fcntl:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+                else:
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomic(df, path):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _journal_path(path):
+    return path + ".journal"
+
+
+def _file_signature(file):
+    try:
+        info = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return (info.st_ino, info.st_mtime_ns, info.st_size)
+
+
+def _journal_size(path):
+    try:
+        return os.path.getsize(_journal_path(path))
+    except FileNotFoundError:
+        return 0
+
+
+def _complete_columns(df, cols):
+    for col in cols:
+        if col not in df.columns:
+            df[col] = ""
+    return df
+
+
+def _version(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, datetime, pd.Timestamp)):
+        return value.isoformat()
+    return str(value)
+
+
+def _key(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _read_journal(path, offset=0):
+    # Solo se consumen líneas completas: una escritura a medias se lee en la siguiente carga
+    try:
+        with open(_journal_path(path), "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = chunk.rfind(b"\n") + 1
+    records = []
+    for line in chunk[:end].splitlines():
+        if not line.strip():
+            continue
+        records.extend(_expand(json.loads(line)))
+    return records, offset + end
+
+
+def _expand(rec):
+    # Un alta en bloque ocupa una sola línea (se aplica entera o no se aplica)
+    if rec["op"] == "insert_many":
+        return [{"op": "insert", "row": row} for row in rec["rows"]]
+    return [rec]
+
+
+def _find(df, positions, col, key):
+    # Posición de la fila con col == key usando un índice de posiciones que
+    # puede venir de una versión más larga del mismo frame; si no coincide se
+    # busca recorriendo la columna
+    pos = positions.get(key) if positions is not None else None
+    if pos is not None and pos < len(df) and _key(df[col].iat[pos]) == key:
+        return pos
+    if positions is not None and pos is None:
+        return None
+    matches = np.flatnonzero(df[col].map(_key).to_numpy(dtype=object) == key)
+    return int(matches[-1]) if len(matches) else None
+
+
+def _apply_journal(df, records, positions=None, table=None):
+    # positions(col) -> {clave: posición} de df; sin él se construye para este tramo
+    if not records:
+        return df
+    inserts = []
+    built = {}
+    deleted = []
+    for rec in records:
+        if rec["op"] == "insert":
+            inserts.append(dict(rec["row"]))
+            continue
+        col, key = rec["col"], _key(rec["id"])
+        # Una edición puede afectar a una fila insertada en este mismo tramo del journal
+        pending = next((r for r in inserts if _key(r.get(col)) == key), None)
+        if pending is not None:
+            if rec["op"] == "delete":
+                inserts.remove(pending)
+            else:
+                pending.update(rec["values"])
+            continue
+        if col not in df:
+            continue
+        if positions is not None:
+            pos = _find(df, positions(col), col, key)
+        else:
+            if col not in built:
+                built[col] = {_key(k): i for i, k in enumerate(df[col])}
+            pos = built[col].get(key)
+        if pos is None:
+            continue
+        if rec["op"] == "delete":
+            deleted.append(df.index[pos])
+        else:
+            assign_values(df, [df.index[pos]], rec["values"])
+    if deleted:
+        df = df.drop(index=deleted).reset_index(drop=True)
+    if inserts:
+        df = append_rows(df, inserts, table)
+    return df
+
+
+def _advance(entry, records, table):
+    # (frame, índices) de la versión siguiente a entry con los registros: solo
+    # se convierten las filas insertadas o editadas y el índice de posiciones
+    # se comparte y se amplía con las claves nuevas (el frame solo crece al
+    # final). Un borrado desplaza las posiciones y deja los índices vacíos.
+    if entry["df"] is None or entry["df"].empty:
+        base = entry["df"] if entry["df"] is not None else pd.DataFrame()
+        return apply_schema(_apply_journal(base.copy(deep=False), records), table), {}
+    df = _apply_journal(entry["df"].copy(deep=False), records, lambda col: _positions(entry, col), table)
+    if any(rec["op"] == "delete" for rec in records):
+        return df, {}
+    editadas = {col for rec in records if rec["op"] == "update" for col in rec["values"]}
+    return df, {col: idx for col, idx in entry.get("index", {}).items() if col not in editadas}
+
+
+def _read_state(path):
+    base = pd.read_csv(path) if os.path.exists(path) else None
+    records, offset = _read_journal(path)
+    if base is None:
+        if not records:
+            return None, 0
+        base = pd.DataFrame()
+    return apply_schema(_apply_journal(apply_schema(base, _table(path)), records), _table(path)), offset
+
+
+def _load_sqlite(file, cols):
+    table = _table(file)
+    version = sqlite_backend.table_version(table)
+    with _lock:
+        entry = _cache.get(("sqlite", table))
+        if entry is not None and entry["signature"] == version:
+            _stats["hits"] += 1
+            return _complete_columns(entry["df"].copy(deep=False), cols)
+        _stats["misses"] += 1
+    df = apply_schema(sqlite_backend.load_table(table), table)
+    with _lock:
+        _cache[("sqlite", table)] = _new_entry(("sqlite", table), version, 0, df)
+    return _complete_columns(df.copy(deep=False), cols)
+
+
+def _new_entry(path, signature, offset, df, previous=None, records=None):
+    # Se llama con _lock adquirido. Sin tramo previo (recarga completa,
+    # compactación) el historial de cambios se reinicia.
+    entry = {"signature": signature, "offset": offset, "df": df, "version": next(_version_counter)}
+    if previous is None:
+        _changes[path] = deque(maxlen=CHANGES_KEPT)
+    else:
+        _changes.setdefault(path, deque(maxlen=CHANGES_KEPT)).append((previous["version"], entry["version"], records))
+    return entry
+
+
+def _refresh(path, retries=5):
+    # Devuelve la entrada de caché al día (sin copiar). Si el snapshot cambia
+    # mientras se lee (compactación concurrente) la lectura se repite.
+    for _ in range(retries):
+        signature = _file_signature(path)
+        journal_size = _journal_size(path)
+        with _lock:
+            previous = _cache.get(path)
+        if previous is not None and previous["signature"] == signature and previous["offset"] <= journal_size:
+            if previous["offset"] == journal_size:
+                with _lock:
+                    _stats["hits"] += 1
+                return previous
+            # Mismo snapshot, journal más largo: solo se reproducen los registros nuevos
+            records, offset = _read_journal(path, previous["offset"])
+            df, index = _advance(previous, records, _table(path))
+            stat_key = "journal_replays"
+        else:
+            previous, records, index = None, None, {}
+            df, offset = _read_state(path)
+            stat_key = "misses"
+        if _file_signature(path) != signature:
+            continue
+        with _lock:
+            current = _cache.get(path)
+            if previous is not None and current is not previous:
+                # Otra sesión ya actualizó la entrada mientras leíamos
+                if current["signature"] == signature and current["offset"] == offset:
+                    return current
+                continue
+            entry = _new_entry(path, signature, offset, df, previous, records)
+            entry["index"] = index
+            _cache[path] = entry
+            _stats[stat_key] += 1
+        return entry
+    # Demasiadas compactaciones seguidas: se lee con el bloqueo de escritura
+    with _locked(path):
+        return _refresh(path)
+
+
+def load_data(file, cols):
+    cols = list(cols) + [VERSION_COL]
+    if BACKEND == "sqlite":
+        return _load_sqlite(file, cols)
+
+    path = os.path.abspath(file)
+    if not os.path.exists(path) and not os.path.exists(_journal_path(path)):
+        return pd.DataFrame(columns=cols)
+    entry = _refresh(path)
+    if entry["df"] is None:
+        return pd.DataFrame(columns=cols)
+    # Vista sin copia de la versión compartida (copy-on-write si la sesión la modifica)
+    return _complete_columns(entry["df"].copy(deep=False), cols)
+
+
+def _append_journal(path, record):
+    # Se llama con _locked(path) adquirido
+    line = json.dumps(record, ensure_ascii=False, default=_to_json) + "\n"
+    offset = _journal_size(path)
+    with open(_journal_path(path), "a", encoding="utf-8") as f:
+        f.write(line)
+    _append_history(path, record)
+    _publish(path, offset, _journal_size(path), json.loads(line))
+    if _journal_size(path) >= JOURNAL_COMPACT_BYTES:
+        _compact_in_background(path)
+
+
+# ================================
+# 🕰️ HISTORIAL DE CAMBIOS
+# ================================
+# Cada escritura se añade también, con su fecha, a "<tabla>.csv.history".
+# A diferencia del journal, este fichero nunca se compacta: es el registro
+# de eventos que history.py usa para reconstruir las tablas a cualquier fecha.
+def write_lock(file):
+    # Bloqueo de escritura de la tabla (para leer un estado coherente con el historial)
+    return _locked(os.path.abspath(file))
+
+
+def history_path(file):
+    return os.path.abspath(file) + ".history"
+
+
+def _append_history(path, record):
+    # Se llama con _locked(path) adquirido
+    event = dict(record, ts=datetime.now().isoformat(timespec="milliseconds"))
+    with open(history_path(path), "a", encoding="utf-8") as f:
+        f.write(json.dumps(event, ensure_ascii=False, default=_to_json) + "\n")
+
+
+def _publish(path, offset, new_offset, record):
+    # Publica una edición sobre la versión cacheada sin volver a leer el
+    # journal: solo se copian (copy-on-write) las columnas de las celdas
+    # editadas. Las altas y los borrados no se publican aquí porque crean un
+    # frame nuevo; el siguiente _refresh los reproduce fuera del bloqueo de
+    # escritura (y agrupa las altas seguidas en un solo concat). Si la caché no
+    # estaba al día (escrituras de otro proceso) tampoco se publica.
+    records = _expand(record)
+    if any(rec["op"] != "update" for rec in records):
+        return
+    with _lock:
+        entry = _cache.get(path)
+    if entry is None or entry["df"] is None or entry["offset"] != offset \
+            or entry["signature"] != _file_signature(path):
+        return
+    df, index = _advance(entry, records, _table(path))
+    with _lock:
+        if _cache.get(path) is not entry:
+            return
+        nueva = _new_entry(path, entry["signature"], new_offset, df, entry, records)
+        nueva["index"] = index
+        _cache[path] = nueva
+        _stats["publicadas"] += 1
+
+
+def next_id(file, key_col, start=1, count=1):
+    # Secuencia monótona "<tabla>.csv.seq"; se inicializa con el máximo ID existente.
+    # Con count > 1 reserva un bloque de IDs consecutivos y devuelve el primero.
+    if BACKEND == "sqlite":
+        return sqlite_backend.next_id(_table(file), key_col, start, count=count)
+    path = os.path.abspath(file)
+    seq_path = path + ".seq"
+    with _locked(path):
+        try:
+            with open(seq_path, encoding="utf-8") as f:
+                last = int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            df = _refresh(path)["df"] if os.path.exists(path) or os.path.exists(_journal_path(path)) else None
+            keys = pd.to_numeric(df[key_col], errors="coerce") if df is not None and key_col in df else None
+            last = int(keys.max()) if keys is not None and keys.notna().any() else start - 1
+        new_id = max(last + 1, start)
+        tmp = f"{seq_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(new_id + count - 1))
+        os.replace(tmp, seq_path)
+    return new_id
+
+
+def insert_row(file, row):
+    row = dict(validate(_table(file), row), **{VERSION_COL: 1})
+    if BACKEND == "sqlite":
+        sqlite_backend.insert_row(_table(file), row)
+        with _locked(os.path.abspath(file)):
+            _append_history(os.path.abspath(file), {"op": "insert", "row": row})
+        return row
+    path = os.path.abspath(file)
+    with _locked(path):
+        _append_journal(path, {"op": "insert", "row": row})
+    return row
+
+
+def insert_rows(file, rows):
+    # Alta en bloque (importaciones): las filas ya vienen validadas con
+    # schema.validate_frame y se escriben en un único registro de journal
+    rows = [dict(row, **{VERSION_COL: 1}) for row in rows]
+    if not rows:
+        return 0
+    if BACKEND == "sqlite":
+        sqlite_backend.insert_rows(_table(file), rows)
+        with _locked(os.path.abspath(file)):
+            _append_history(os.path.abspath(file), {"op": "insert_many", "rows": rows})
+        return len(rows)
+    path = os.path.abspath(file)
+    with _locked(path):
+        _append_journal(path, {"op": "insert_many", "rows": rows})
+    return len(rows)
+
+
+def _stored_version(path, key_col, key):
+    # Versión guardada de una fila (None si no existe) sin reconstruir la
+    # tabla: su posición en la entrada cacheada más los registros del journal
+    # posteriores a esa entrada. Se llama con _locked(path) adquirido.
+    with _lock:
+        entry = _cache.get(path)
+    if entry is None or entry["signature"] != _file_signature(path) or entry["offset"] > _journal_size(path):
+        entry = _refresh(path)  # primera carga o compactación de otro proceso
+    key = _key(key)
+    version = None
+    df = entry["df"]
+    if df is not None and key_col in df:
+        pos = _find(df, _positions(entry, key_col), key_col, key)
+        if pos is not None:
+            version = _version(df[VERSION_COL].iat[pos]) if VERSION_COL in df else 0
+    for rec in _read_journal(path, entry["offset"])[0]:
+        if rec["op"] == "insert":
+            if _key(rec["row"].get(key_col)) == key:
+                version = _version(rec["row"].get(VERSION_COL))
+        elif rec["col"] == key_col and _key(rec["id"]) == key:
+            version = None if rec["op"] == "delete" else _version(rec["values"].get(VERSION_COL, version))
+    return version
+
+
+def update_row(file, key_col, key, values, expected_version=None):
+    # Bloqueo optimista: si expected_version no coincide con la versión
+    # guardada, otra sesión editó la fila y se lanza ConflictError.
+    values = validate(_table(file), values)
+    if BACKEND == "sqlite":
+        version = sqlite_backend.update_row(_table(file), key_col, key, values, expected_version)
+        if version is None:
+            with _lock:
+                _stats["conflicts"] += 1
+            raise ConflictError(f"{key_col}={key} fue modificado por otra sesión")
+        with _locked(os.path.abspath(file)):
+            _append_history(os.path.abspath(file), {"op": "update", "col": key_col, "id": key,
+                                                    "values": dict(values, **{VERSION_COL: version})})
+        return version
+    path = os.path.abspath(file)
+    with _locked(path):
+        current = _stored_version(path, key_col, key)
+        if current is None:
+            raise KeyError(f"{key_col}={key} no existe")
+        if expected_version is not None and _version(expected_version) != current:
+            with _lock:
+                _stats["conflicts"] += 1
+            raise ConflictError(f"{key_col}={key} fue modificado por otra sesión (versión {current})")
+        values = dict(values, **{VERSION_COL: current + 1})
+        _append_journal(path, {"op": "update", "col": key_col, "id": key, "values": values})
+    return values[VERSION_COL]
+
+
+def delete_row(file, key_col, key):
+    if BACKEND == "sqlite":
+        resultado = sqlite_backend.delete_row(_table(file), key_col, key)
+        with _locked(os.path.abspath(file)):
+            _append_history(os.path.abspath(file), {"op": "delete", "col": key_col, "id": key})
+        return resultado
+    path = os.path.abspath(file)
+    with _locked(path):
+        _append_journal(path, {"op": "delete", "col": key_col, "id": key})
+
+
+def compact(file):
+    path = os.path.abspath(file)
+    with _locked(path):
+        df, offset = _read_state(path)
+        if df is None or offset == 0:
+            return False
+        # El snapshot se sustituye de forma atómica antes de vaciar el journal
+        _write_atomic(df, path)
+        with open(_journal_path(path), "w", encoding="utf-8"):
+            pass
+        with _lock:
+            _cache[path] = _new_entry(path, _file_signature(path), 0, df)
+            _stats["compactions"] += 1
+    return True
+
+
+def _compact_in_background(path):
+    with _lock:
+        if path in _compacting:
+            return
+        _compacting.add(path)
+
+    def run():
+        try:
+            compact(path)
+        finally:
+            with _lock:
+                _compacting.discard(path)
+
+    threading.Thread(target=run, name=f"compact-{os.path.basename(path)}", daemon=True).start()
+
+
+# ================================
+# 🔑 ACCESO POR CLAVE
+# ================================
+# Índices hash valor → posición por columna (clave primaria, nombre de
+# cliente) sobre la versión compartida de cada tabla. Se construyen la primera
+# vez que se piden para esa versión y se comparten entre sesiones; como las
+# sesiones reciben vistas de esa misma versión, la posición vale para su frame.
+def _positions(entry, col):
+    # Con duplicados gana la última fila, como en drop_duplicates(keep="last").
+    # Cada índice recuerda cuántas filas cubre: las versiones siguientes (que
+    # solo añaden filas al final) lo comparten y lo amplían con las nuevas.
+    df = entry["df"]
+    if df is None or col not in df:
+        return {}
+    index = entry.setdefault("index", {}).setdefault(col, {"filas": 0, "pos": {}})
+    if index["filas"] < len(df):
+        desde = index["filas"]
+        index["pos"].update((_key(k), i) for i, k in enumerate(df[col].iloc[desde:], desde))
+        index["filas"] = len(df)
+    return index["pos"]
+
+
+def _entry(file):
+    if BACKEND == "sqlite":
+        table = _table(file)
+        with _lock:
+            entry = _cache.get(("sqlite", table))
+        if entry is None or entry["signature"] != sqlite_backend.table_version(table):
+            _load_sqlite(file, [])
+            with _lock:
+                entry = _cache[("sqlite", table)]
+        return entry
+    return _refresh(os.path.abspath(file))
+
+
+def lookup_row(df, file, col, value):
+    # Fila de df (cargado con load_data) con col == value, o None. O(1) con el
+    # índice compartido; si df es de otra versión se comprueba y, si no
+    # coincide, se busca recorriendo la columna.
+    path = os.path.abspath(file)
+    if BACKEND == "sqlite" or os.path.exists(path) or os.path.exists(_journal_path(path)):
+        pos = _positions(_entry(file), col).get(_key(value))
+        if pos is not None and pos < len(df) and _key(df[col].iat[pos]) == _key(value):
+            return df.iloc[pos]
+    matches = df[df[col] == value]
+    return matches.iloc[-1] if not matches.empty else None
+
+
+def data_version(file):
+    if BACKEND == "sqlite":
+        return sqlite_backend.table_version(_table(file))
+    path = os.path.abspath(file)
+    if not os.path.exists(path) and not os.path.exists(_journal_path(path)):
+        return 0
+    return _refresh(path)["version"]
+
+
+def versioned_load(files, load):
+    # (versiones de files, load()) con load() leído en esas versiones: se leen
+    # antes y después de cargar y, si alguna tabla ha cambiado entretanto, se
+    # repite. load debe leer las tablas en ese momento (load_data), no devolver
+    # frames cargados antes
+    while True:
+        versions = tuple(data_version(f) for f in files)
+        result = load()
+        if tuple(data_version(f) for f in files) == versions:
+            return versions, result
+
+
+def apply_changes(df, records, table=None):
+    # Aplica registros de changes_since (o eventos del historial) a una
+    # estructura derivada con las mismas columnas clave (modifica df y devuelve el resultado).
+    # Con table, las filas nuevas se normalizan según su esquema (notas vacías en lugar de NaN)
+    return _apply_journal(df, [r for rec in records for r in _expand(rec)], table=table)
+
+
+def changes_since(file, version):
+    # (registros de journal aplicados desde `version`, versión actual), o
+    # (None, versión actual) si no se pueden reconstruir y hay que recalcular
+    current = data_version(file)
+    if current == version:
+        return [], current
+    if BACKEND == "sqlite":
+        return None, current
+    path = os.path.abspath(file)
+    with _lock:
+        segments = list(_changes.get(path, ()))
+    records, cursor = [], version
+    for desde, hasta, tramo in segments:
+        if desde == cursor:
+            records.extend(tramo)
+            cursor = hasta
+    if cursor != current:
+        return None, current
+    return records, current
+
+
+# ================================
+# 🔎 FILTROS Y KPIs
+# ================================
+# Con el backend SQLite los filtros y agregados se resuelven en SQL (con
+# índices); con CSV se aplican sobre el DataFrame ya cargado en la sesión.
+def filter_data(df, file, equals=None, contains=None):
+    if BACKEND == "sqlite":
+        return apply_schema(sqlite_backend.query(_table(file), equals, contains), _table(file))
+    mask = pd.Series(True, index=df.index)
+    for col, value in (equals or {}).items():
+        mask &= df[col] == value
+    for col, value in (contains or {}).items():
+        mask &= df[col].str.contains(value, case=False, na=False, regex=False)
+    return df[mask]
+
+
+def filter_offers(joined, estado=None, cliente=None, lead_equals=None):
+    # joined es la vista materializada ofertas ⋈ leads (offer_view.py), donde
+    # el estado del lead aparece como "Estado Lead"
+    if BACKEND == "sqlite":
+        return apply_schema(sqlite_backend.query_offers(estado, cliente, lead_equals), "offers")
+    mask = pd.Series(True, index=joined.index)
+    if estado:
+        mask &= joined["Estado"] == estado
+    if cliente:
+        mask &= joined["Cliente"] == cliente
+    for col, value in (lead_equals or {}).items():
+        mask &= joined["Estado Lead" if col == "Estado" else col] == value
+    return joined[mask]
+
+
+def lead_kpis(leads_filtrados, equals=None):
+    # leads_filtrados es el resultado de filter_data con los mismos filtros
+    if BACKEND == "sqlite":
+        return sqlite_backend.lead_kpis(equals)
+    return kpis.lead_kpis(leads_filtrados)
+
+
+def offer_kpis(offers_filtrados, estado=None, cliente=None, lead_equals=None):
+    # offers_filtrados es el resultado de filter_offers con los mismos filtros
+    if BACKEND == "sqlite":
+        return sqlite_backend.offer_kpis(estado, cliente, lead_equals)
+    return kpis.offer_kpis(offers_filtrados)
+
+
+# ================================
+# 📄 PAGINACIÓN
+# ================================
+# Solo la página visible se copia y se envía al navegador. Para ordenar se
+# ordena únicamente la columna elegida y se toman las posiciones de la página.
+def page_data(df, page, page_size, sort_by=None, ascending=True):
+    start = (page - 1) * page_size
+    if not sort_by:
+        return df.iloc[start:start + page_size]
+    values = pd.Series(df[sort_by].to_numpy(), copy=False)
+    try:
+        order = values.sort_values(ascending=ascending, na_position="last", kind="stable")
+    except TypeError:  # columnas con tipos mezclados
+        order = values.astype(str).sort_values(ascending=ascending, kind="stable")
+    return df.iloc[order.index[start:start + page_size]]
+
+
+def invalidate_cache(file=None):
+    with _lock:
+        if file is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(file), None)
+
+
+def cache_stats():
+    with _lock:
+        frames = [entry["df"] for entry in _cache.values() if entry["df"] is not None]
+    # Memoria de las versiones compartidas (una por tabla, no por sesión)
+    memoria = sum(df.memory_usage(deep=False).sum() for df in frames) / 2 ** 20
+    with _lock:
+        return dict(_stats, ficheros=len(_cache), memoria_mb=round(float(memoria), 1))
@@ -0,0 +1,45 @@
+import io
+
+import bulk_import
+import storage
+from conftest import CLIENTS_FILE, LEADS_FILE, OFFERS_FILE, lead, offer, seed_pipeline
+from schema import columns
+
+FILES = {"clients": CLIENTS_FILE, "leads": LEADS_FILE, "offers": OFFERS_FILE}
+
+
+def _csv(texto):
+    fichero = io.BytesIO(texto.encode("utf-8"))
+    fichero.name = "ofertas.csv"
+    return fichero
+
+
+def _ofertas():
+    return storage.load_data(OFFERS_FILE, columns("offers"))
+
+
+def test_import_assigns_ids_from_the_offer_floor():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    validas, errores, _ = bulk_import.validate_file(_csv("ID Lead;Precio EUR/MWh\n1;40\n1;41\n"), "offers", FILES)
+    assert errores.empty
+    assert bulk_import.commit_import(validas, "offers", FILES)[0] == 2
+    assert _ofertas()["ID Oferta"].tolist() == [101, 102]
+
+
+def test_commit_rejects_ids_and_references_that_changed_after_validation():
+    seed_pipeline()
+    validas, errores, _ = bulk_import.validate_file(
+        _csv("ID Oferta,ID Lead,Precio EUR/MWh\n201,1,40\n202,3,41\n203,2,42\n"), "offers", FILES)
+    assert errores.empty
+
+    # Entre la validación y la confirmación: otra sesión da de alta la 201 y borra el lead 3
+    storage.insert_row(OFFERS_FILE, offer(201, 2))
+    storage.delete_row(LEADS_FILE, "ID Lead", 3)
+    importadas, rechazadas = bulk_import.commit_import(validas, "offers", FILES)
+
+    assert importadas == 1
+    assert rechazadas["Fila"].tolist() == [2, 3]
+    assert rechazadas["Columna"].tolist() == ["ID Oferta", "ID Lead"]
+    ofertas = _ofertas()
+    assert ofertas["ID Oferta"].tolist().count(201) == 1
+    assert 203 in ofertas["ID Oferta"].tolist()
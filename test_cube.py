@@ -0,0 +1,74 @@
+import pandas as pd
+
+import storage
+from conftest import LEADS_FILE, OFFERS_FILE, lead, pipeline_changes, seed_pipeline, tables
+from cube import LEAD_DIMS, OFFER_DIMS, PipelineCube, get_cube_view
+
+
+def _cells(frame, dims):
+    return frame.sort_values(dims, ignore_index=True)
+
+
+def test_changes_since_returns_new_records():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    version = storage.data_version(LEADS_FILE)
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "En curso"})
+    storage.insert_row(LEADS_FILE, lead(2, "Beta"))
+
+    records, actual = storage.changes_since(LEADS_FILE, version)
+    assert actual == storage.data_version(LEADS_FILE) != version
+    assert [rec["op"] for rec in records] == ["update", "insert"]
+    assert storage.changes_since(LEADS_FILE, actual) == ([], actual)
+
+
+def test_changes_since_unknown_version_asks_for_rebuild():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    version = storage.data_version(LEADS_FILE)
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "En curso"})
+    with storage._lock:
+        storage._changes.clear()  # tramos descartados (CHANGES_KEPT) o caché invalidada
+
+    records, actual = storage.changes_since(LEADS_FILE, version)
+    assert records is None and actual != version
+
+
+def test_cube_follows_journal_changes():
+    seed_pipeline()
+    get_cube_view(LEADS_FILE, OFFERS_FILE, tables)
+    pipeline_changes()
+
+    def no_rebuild():
+        raise AssertionError("el cubo debería actualizarse con changes_since")
+
+    view = get_cube_view(LEADS_FILE, OFFERS_FILE, no_rebuild)
+    esperado = PipelineCube(*tables()).frames()
+    pd.testing.assert_frame_equal(_cells(view.lead_cells, LEAD_DIMS), _cells(esperado.lead_cells, LEAD_DIMS))
+    pd.testing.assert_frame_equal(_cells(view.offer_cells, OFFER_DIMS), _cells(esperado.offer_cells, OFFER_DIMS))
+
+
+def test_cube_rebuilds_when_changes_are_lost():
+    seed_pipeline()
+    get_cube_view(LEADS_FILE, OFFERS_FILE, tables)
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "Negociación"})
+    with storage._lock:
+        storage._changes.clear()
+
+    view = get_cube_view(LEADS_FILE, OFFERS_FILE, tables)
+    assert view.leads({"Estado": "Negociación"})["Cantidad"].sum() == 1
+
+
+def test_cube_rebuild_sees_writes_made_while_loading():
+    seed_pipeline()
+    cargas = []
+
+    def load():
+        # Otra sesión escribe justo después de que se lean las tablas
+        frames = tables()
+        if not cargas:
+            storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "Negociación"})
+        cargas.append(1)
+        return frames
+
+    view = get_cube_view(LEADS_FILE, OFFERS_FILE, load)
+    assert view.leads({"Estado": "Negociación"})["Cantidad"].sum() == 1
+    assert len(cargas) == 2
@@ -0,0 +1,39 @@
+import threading
+
+import pandas as pd
+
+import exports
+
+
+def test_export_of_one_key_does_not_block_other_keys(monkeypatch, tmp_path):
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(tmp_path / "exports"))
+    monkeypatch.setattr(exports, "_exports", exports.OrderedDict())
+    escribiendo, seguir = threading.Event(), threading.Event()
+    escrituras = []
+
+    def lento(df, path):
+        escrituras.append(len(df))
+        if len(df) == 3:
+            escribiendo.set()
+            assert seguir.wait(5)
+        df.to_csv(path, index=False)
+
+    monkeypatch.setitem(exports.WRITERS, "CSV", lento)
+    grande = pd.DataFrame({"a": [1, 2, 3]})
+    rutas = []
+    hilos = [threading.Thread(target=lambda: rutas.append(exports.export_file(grande, "CSV", "grande")))
+             for _ in range(2)]
+    hilos[0].start()
+    assert escribiendo.wait(5)
+    hilos[1].start()
+
+    # Con "grande" a medio escribir, otra clave se exporta sin esperar
+    pequeño = exports.export_file(pd.DataFrame({"a": [1]}), "CSV", "pequeño")
+    assert pd.read_csv(pequeño)["a"].tolist() == [1]
+
+    seguir.set()
+    for hilo in hilos:
+        hilo.join(5)
+    # La segunda petición de "grande" reutiliza el fichero de la primera
+    assert escrituras == [3, 1]
+    assert rutas[0] == rutas[1]
@@ -0,0 +1,17 @@
+import pytest
+
+import storage
+from conftest import LEADS_FILE, lead
+from generate_data import write_dataset
+
+
+def test_write_dataset_refuses_directory_with_app_data(tmp_path):
+    assert write_dataset(tmp_path / "nuevo", 20) == {"clients": 2, "leads": 20, "offers": 30}
+    with pytest.raises(FileExistsError):
+        write_dataset(tmp_path / "nuevo", 20)
+
+    # Solo journal/secuencia/historial, sin CSV: tampoco se escribe encima
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    with pytest.raises(FileExistsError, match="leads.csv.journal"):
+        write_dataset(tmp_path, 20)
+    assert not (tmp_path / "leads.csv").exists()
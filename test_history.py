@@ -0,0 +1,90 @@
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import history
+import storage
+from conftest import LEADS_FILE, OFFERS_FILE, lead, offer
+from schema import columns
+
+LEADS_COLS = columns("leads")
+
+
+def _instante():
+    # Los eventos llevan la hora con milisegundos: se separan los instantes
+    time.sleep(0.01)
+    ahora = datetime.now()
+    time.sleep(0.01)
+    return ahora
+
+
+def _estados(df):
+    return dict(zip(df["ID Lead"].astype(int), df["Estado"].astype(str)))
+
+
+def test_as_of_replays_events_up_to_the_date():
+    storage.insert_rows(LEADS_FILE, [lead(1, "Alfa"), lead(2, "Beta")])
+    history.snapshot(LEADS_FILE, LEADS_COLS)
+    t0 = _instante()
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "En curso"})
+    storage.insert_row(LEADS_FILE, lead(3, "Gamma"))
+    t1 = _instante()
+    storage.delete_row(LEADS_FILE, "ID Lead", 2)
+    t2 = _instante()
+
+    assert _estados(history.as_of(LEADS_FILE, LEADS_COLS, t0)[0]) == {1: "Nuevo", 2: "Nuevo"}
+    assert _estados(history.as_of(LEADS_FILE, LEADS_COLS, t1)[0]) == {1: "En curso", 2: "Nuevo", 3: "Nuevo"}
+    actual = history.as_of(LEADS_FILE, LEADS_COLS, t2)[0]
+    assert _estados(actual) == _estados(storage.load_data(LEADS_FILE, LEADS_COLS))
+    assert actual.loc[actual["ID Lead"] == 3, "Notas"].iat[0] == ""
+
+
+def test_as_of_before_history_returns_first_snapshot():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    df, desde = history.as_of(LEADS_FILE, LEADS_COLS, datetime(2000, 1, 1))
+    assert _estados(df) == {1: "Nuevo"}
+    assert desde == history.snapshots(LEADS_FILE)[0][0]
+
+
+def test_as_of_starts_from_the_latest_snapshot(monkeypatch):
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    history.snapshot(LEADS_FILE, LEADS_COLS)
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "En curso"})
+    t0 = _instante()
+    monkeypatch.setattr(history, "SNAPSHOT_BYTES", 1)
+    assert history.maybe_snapshot(LEADS_FILE, LEADS_COLS) is not None
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "Negociación"})
+    t1 = _instante()
+
+    assert len(history.snapshots(LEADS_FILE)) == 2
+    assert _estados(history.as_of(LEADS_FILE, LEADS_COLS, t0)[0]) == {1: "En curso"}
+    assert _estados(history.as_of(LEADS_FILE, LEADS_COLS, t1)[0]) == {1: "Negociación"}
+
+
+def test_field_history_lists_changes_of_one_record():
+    campos = ["Precio EUR/MWh", "Probabilidad (%)"]
+    storage.insert_rows(OFFERS_FILE, [offer(101, 1), offer(102, 1)])
+    history.snapshot(OFFERS_FILE, columns("offers"))
+    storage.update_row(OFFERS_FILE, "ID Oferta", 101, {"Precio EUR/MWh": 50.0})
+    storage.update_row(OFFERS_FILE, "ID Oferta", 102, {"Precio EUR/MWh": 60.0})
+    assert history.field_history(OFFERS_FILE, "ID Oferta", 101, campos)["Cambio"].tolist() == ["snapshot", "update"]
+
+    # Las líneas nuevas del historial se indexan en la siguiente consulta
+    storage.update_row(OFFERS_FILE, "ID Oferta", 101, {"Probabilidad (%)": 80})
+    cambios = history.field_history(OFFERS_FILE, "ID Oferta", 101, campos)
+    assert cambios["Cambio"].tolist() == ["snapshot", "update", "update"]
+    assert cambios["Precio EUR/MWh"].tolist() == [45.0, 50.0, 50.0]
+    assert cambios["Probabilidad (%)"].tolist() == [50, 50, 80]
+    assert pd.api.types.is_datetime64_any_dtype(cambios["Fecha"])
+
+
+def test_field_history_of_record_created_after_snapshot():
+    storage.insert_row(OFFERS_FILE, offer(101, 1))
+    history.snapshot(OFFERS_FILE, columns("offers"))
+    storage.insert_row(OFFERS_FILE, offer(102, 1, **{"Precio EUR/MWh": 40.0}))
+    storage.delete_row(OFFERS_FILE, "ID Oferta", 102)
+
+    cambios = history.field_history(OFFERS_FILE, "ID Oferta", 102, ["Precio EUR/MWh"])
+    assert cambios["Cambio"].tolist() == ["insert", "delete"]
+    assert cambios["Precio EUR/MWh"].tolist() == [40.0, 40.0]
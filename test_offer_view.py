@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+import storage
+from conftest import LEADS_FILE, OFFERS_FILE, offer, pipeline_changes, seed_pipeline, tables
+from offer_view import _JoinedOffers, get_offer_view
+
+
+def test_offer_view_follows_journal_changes():
+    seed_pipeline()
+    antes = get_offer_view(LEADS_FILE, OFFERS_FILE, tables)
+    filas_antes = antes.frame.copy()
+    pipeline_changes()
+
+    view = get_offer_view(LEADS_FILE, OFFERS_FILE, lambda: pytest.fail("la vista debería ser incremental"))
+    esperado = _JoinedOffers(*tables())
+    pd.testing.assert_frame_equal(view.frame.sort_values("ID Oferta", ignore_index=True),
+                                  esperado.frame.sort_values("ID Oferta", ignore_index=True),
+                                  check_categorical=False, check_dtype=False)
+    for col in ["Estado", "Cliente", "Responsable", "Estado Lead"]:
+        assert view.distinct(col) == sorted(esperado.frame[col].dropna().unique())
+    # La instantánea anterior no cambia (copia al escribir)
+    pd.testing.assert_frame_equal(antes.frame, filas_antes)
+
+
+def test_offer_view_rebuild_does_not_replay_writes_made_while_loading():
+    seed_pipeline()
+    cargas = []
+
+    def load():
+        # Otra sesión da de alta una oferta justo antes de que se lean las tablas
+        if not cargas:
+            storage.insert_row(OFFERS_FILE, offer(105, 2))
+        cargas.append(1)
+        return tables()
+
+    get_offer_view(LEADS_FILE, OFFERS_FILE, load)
+    view = get_offer_view(LEADS_FILE, OFFERS_FILE, lambda: pytest.fail("la vista ya está al día"))
+    assert sorted(view.frame["ID Oferta"].tolist()) == [101, 102, 103, 104, 105]
@@ -0,0 +1,73 @@
+import pytest
+
+import search
+import storage
+from conftest import LEADS_FILE, lead, seed_pipeline, tables
+
+
+def _leads():
+    return tables()[0]
+
+
+def test_search_index_follows_journal_changes():
+    seed_pipeline()
+    assert set(search.matching_ids(LEADS_FILE, "kabel", _leads)) == {3}
+
+    storage.insert_row(LEADS_FILE, lead(4, "Cabeleira SL"))
+    storage.update_row(LEADS_FILE, "ID Lead", 2, {"Cliente": "Kabelwerk"})
+    storage.delete_row(LEADS_FILE, "ID Lead", 3)
+    no_rebuild = lambda: pytest.fail("el índice debería actualizarse con changes_since")
+
+    assert set(search.matching_ids(LEADS_FILE, "kabel", no_rebuild)) == {2}
+    assert set(search.matching_ids(LEADS_FILE, "ABEL", no_rebuild)) == {2, 4}
+    assert set(search.matching_ids(LEADS_FILE, "energia", no_rebuild)) == set()
+
+
+def test_search_short_queries_match_substrings():
+    seed_pipeline()
+    # Con menos de 3 caracteres también se busca dentro de las palabras
+    assert set(search.matching_ids(LEADS_FILE, "ab", _leads)) == {3}
+    assert set(search.matching_ids(LEADS_FILE, "é", _leads)) == {2, 3}
+    assert set(search.matching_ids(LEADS_FILE, "", _leads)) == {1, 2, 3}
+
+
+def test_search_index_is_built_once_and_rebuilt_when_changes_are_lost():
+    seed_pipeline()
+    cargas = []
+
+    def load():
+        cargas.append(1)
+        return _leads()
+
+    search.warm_index(LEADS_FILE, load)
+    assert set(search.matching_ids(LEADS_FILE, "alfa", load)) == {1}
+    assert set(search.matching_ids(LEADS_FILE, "beta", load)) == {2}
+    assert len(cargas) == 1
+
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Cliente": "Omega"})
+    with storage._lock:
+        storage._changes.clear()
+    assert set(search.matching_ids(LEADS_FILE, "omega", load)) == {1}
+    assert len(cargas) == 2
+
+
+def test_search_short_queries_follow_edits_and_compaction(monkeypatch):
+    seed_pipeline()
+    no_rebuild = lambda: pytest.fail("el índice no debería releer la tabla")
+    assert set(search.matching_ids(LEADS_FILE, "a", _leads)) == {1, 2, 3}
+
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Cliente": "Omega"})
+    storage.insert_row(LEADS_FILE, lead(4, "Zeta"))
+    storage.delete_row(LEADS_FILE, "ID Lead", 2)
+    assert set(search.matching_ids(LEADS_FILE, "ze", no_rebuild)) == {4}
+    assert set(search.matching_ids(LEADS_FILE, "a", no_rebuild)) == {1, 3, 4}
+    assert set(search.matching_ids(LEADS_FILE, "", no_rebuild)) == {1, 3, 4}
+
+    # Pasado el límite las listas se rehacen con los textos en memoria
+    monkeypatch.setattr(search, "DIRTY_LIMIT", 1)
+    storage.update_row(LEADS_FILE, "ID Lead", 3, {"Cliente": "Kabel Solar"})
+    index = search._indexes[LEADS_FILE]["index"]
+    assert set(search.matching_ids(LEADS_FILE, "sol", no_rebuild)) == {3}
+    assert not index.dirty and not index.n_stale
+    assert set(search.matching_ids(LEADS_FILE, "om", no_rebuild)) == {1}
+    assert set(search.matching_ids(LEADS_FILE, "energia", no_rebuild)) == set()
@@ -0,0 +1,125 @@
+import os
+
+import pandas as pd
+import pytest
+
+import storage
+from conftest import LEADS_FILE, OFFERS_FILE, lead, offer
+from schema import columns
+
+LEADS_COLS = columns("leads")
+
+
+def _load():
+    return storage.load_data(LEADS_FILE, LEADS_COLS)
+
+
+def _fresh():
+    # La misma tabla leída desde disco (snapshot + journal), sin la caché
+    storage.invalidate_cache()
+    return _load()
+
+
+def test_insert_update_delete_go_through_journal():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    storage.insert_rows(LEADS_FILE, [lead(2, "Beta"), lead(3, "Gamma")])
+    storage.update_row(LEADS_FILE, "ID Lead", 2, {"Estado": "En curso"})
+    storage.delete_row(LEADS_FILE, "ID Lead", 3)
+
+    assert not os.path.exists(LEADS_FILE)  # solo hay journal, sin snapshot
+    df = _load()
+    assert df["ID Lead"].tolist() == [1, 2]
+    assert df.loc[df["ID Lead"] == 2, "Estado"].iat[0] == "En curso"
+    assert df["Version"].tolist() == [1, 2]
+
+
+def test_compact_keeps_data_and_empties_journal():
+    storage.insert_rows(LEADS_FILE, [lead(1, "Alfa"), lead(2, "Beta")])
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Capacidad": 3.0})
+    antes = _load()
+
+    assert storage.compact(LEADS_FILE)
+    assert os.path.getsize(LEADS_FILE + ".journal") == 0
+    pd.testing.assert_frame_equal(_fresh(), antes, check_categorical=False)
+
+
+def test_stale_version_raises_conflict():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    assert storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "En curso"}, expected_version=1) == 2
+    conflictos = storage.cache_stats()["conflicts"]
+
+    with pytest.raises(storage.ConflictError):
+        storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "Negociación"}, expected_version=1)
+
+    df = _load()
+    assert df["Estado"].tolist() == ["En curso"]
+    assert df["Version"].tolist() == [2]
+    assert storage.cache_stats()["conflicts"] == conflictos + 1
+
+
+def test_version_check_sees_writes_not_yet_loaded():
+    # La versión se comprueba con la caché más el final del journal: una
+    # edición que aún no ha leído nadie también cuenta
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    _load()
+    storage.insert_row(LEADS_FILE, lead(2, "Beta"))
+    storage.update_row(LEADS_FILE, "ID Lead", 2, {"Estado": "En curso"}, expected_version=1)
+    with pytest.raises(storage.ConflictError):
+        storage.update_row(LEADS_FILE, "ID Lead", 2, {"Estado": "Negociación"}, expected_version=1)
+
+
+def test_update_of_missing_row_raises_key_error():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    storage.delete_row(LEADS_FILE, "ID Lead", 1)
+    with pytest.raises(KeyError):
+        storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "En curso"})
+
+
+def test_invalid_values_are_rejected_before_writing():
+    storage.insert_row(LEADS_FILE, lead(1, "Alfa"))
+    with pytest.raises(ValueError):
+        storage.update_row(LEADS_FILE, "ID Lead", 1, {"Estado": "Inventado"})
+    assert _load()["Version"].tolist() == [1]
+
+
+def test_next_id_uses_floor_and_reserves_blocks():
+    assert storage.next_id(OFFERS_FILE, "ID Oferta", start=101) == 101
+    assert storage.next_id(OFFERS_FILE, "ID Oferta", start=101, count=5) == 102
+    assert storage.next_id(OFFERS_FILE, "ID Oferta", start=101) == 107
+    storage.insert_row(OFFERS_FILE, offer(107, 1))
+    assert storage.next_id(OFFERS_FILE, "ID Oferta") == 108
+
+
+def test_cached_version_matches_full_reload():
+    # Las versiones se derivan de la anterior con los registros nuevos; deben
+    # coincidir con una lectura completa del journal
+    storage.insert_rows(LEADS_FILE, [lead(i, f"Cliente {i}") for i in range(1, 6)])
+    _load()
+    storage.insert_row(LEADS_FILE, lead(6, "Nuevo cliente", Notas="primera"))
+    storage.update_row(LEADS_FILE, "ID Lead", 2, {"Cliente": "Otro", "Capacidad": 12.5})
+    storage.update_row(LEADS_FILE, "ID Lead", 6, {"Notas": None})
+    storage.delete_row(LEADS_FILE, "ID Lead", 4)
+    incremental = _load()
+
+    # Los catálogos de las categóricas pueden conservar valores que ya no se usan
+    pd.testing.assert_frame_equal(incremental, _fresh(), check_categorical=False)
+    assert incremental["Cliente"].astype(str).tolist() == ["Cliente 1", "Otro", "Cliente 3", "Cliente 5",
+                                                           "Nuevo cliente"]
+    assert incremental.loc[incremental["ID Lead"] == 6, "Notas"].iat[0] == ""
+
+
+def test_compact_writes_exact_measures_and_integer_versions():
+    # Snapshot sin columna de versión (datos generados o anteriores a ella)
+    pd.DataFrame([lead(1, "Alfa", Capacidad=85.28)]).to_csv(LEADS_FILE, index=False)
+    _load()
+    storage.insert_row(LEADS_FILE, lead(2, "Beta", Capacidad=12.34))
+    # Los formularios reenvían los valores del frame tipado: sin ruido de float32
+    capacidad = _load()["Capacidad"].iat[0]
+    storage.update_row(LEADS_FILE, "ID Lead", 1, {"Capacidad": capacidad, "Produccion": 170.56})
+    with open(LEADS_FILE + ".journal", encoding="utf-8") as f:
+        assert '"Capacidad": 85.28,' in f.read()
+    assert storage.compact(LEADS_FILE)
+
+    guardado = pd.read_csv(LEADS_FILE)
+    assert guardado["Version"].tolist() == [1, 1] and guardado["Version"].dtype == "int64"
+    assert str(_fresh()["Version"].dtype) == "Int64"
@@ -0,0 +1,110 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# ================================
+# ⏱️ TRAZAS DE RENDIMIENTO POR RERUN
+# ================================
+# Cada rerun de la aplicación abre una traza (start_trace) y las secciones
+# principales se miden con span("nombre"). Al terminar (finish_trace) se guarda
+# un registro {fecha, vista, total_ms, spans} en memoria (últimos RECENT_KEPT,
+# para el panel de administración) y en TRACE_FILE, una línea JSON por rerun.
+# Las escrituras se agrupan cada FLUSH_EVERY registros o FLUSH_SECONDS
+# segundos, así que el coste por rerun es el de unas llamadas a perf_counter.
+# Los spans anidados cuentan también dentro del span que los contiene.
+# PPA_TRACE=0 desactiva las trazas.
+ENABLED = os.environ.get("PPA_TRACE", "1") != "0"
+TRACE_FILE = os.environ.get("PPA_TRACE_FILE", "traces.jsonl")
+RECENT_KEPT = 5000
+FLUSH_EVERY = 50
+FLUSH_SECONDS = 10
+TOTAL = "total"
+
+# Cada sesión de Streamlit ejecuta su script en su propio hilo
+_local = threading.local()
+_lock = threading.Lock()
+_recent = deque(maxlen=RECENT_KEPT)
+_buffer = []
+_state = {"last_flush": time.monotonic()}
+
+
+def start_trace():
+    _local.trace = {"inicio": time.perf_counter(), "spans": {}} if ENABLED else None
+
+
+@contextmanager
+def span(name):
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans = trace["spans"]
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - inicio) * 1000
+
+
+def finish_trace(tab):
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    if trace is None:
+        return None
+    record = {
+        "fecha": datetime.now().isoformat(timespec="milliseconds"),
+        "vista": tab,
+        "total_ms": round((time.perf_counter() - trace["inicio"]) * 1000, 2),
+        "spans": {name: round(ms, 2) for name, ms in trace["spans"].items()},
+    }
+    with _lock:
+        _recent.append(record)
+        _buffer.append(record)
+        if len(_buffer) >= FLUSH_EVERY or time.monotonic() - _state["last_flush"] > FLUSH_SECONDS:
+            _flush()
+    return record
+
+
+def _flush():
+    # Llamar con _lock tomado
+    if _buffer:
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(rec, ensure_ascii=False) + "\n" for rec in _buffer)
+        except OSError:
+            pass  # las trazas nunca deben romper la aplicación
+        _buffer.clear()
+    _state["last_flush"] = time.monotonic()
+
+
+def flush():
+    with _lock:
+        _flush()
+
+
+atexit.register(flush)
+
+
+def latency_stats():
+    # p50/p95 (ms) por vista y sección sobre los últimos reruns del proceso
+    with _lock:
+        records = list(_recent)
+    filas = [(rec["vista"], TOTAL, rec["total_ms"]) for rec in records]
+    filas += [(rec["vista"], name, ms) for rec in records for name, ms in rec["spans"].items()]
+    df = pd.DataFrame(filas, columns=["Vista", "Sección", "ms"])
+    if df.empty:
+        return pd.DataFrame(columns=["Vista", "Sección", "Reruns", "p50 (ms)", "p95 (ms)", "Máx (ms)"])
+    tiempos = df.groupby(["Vista", "Sección"], sort=True)["ms"]
+    return pd.DataFrame({
+        "Reruns": tiempos.size(),
+        "p50 (ms)": tiempos.quantile(0.5).round(1),
+        "p95 (ms)": tiempos.quantile(0.95).round(1),
+        "Máx (ms)": tiempos.max().round(1),
+    }).reset_index()